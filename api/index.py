@@ -1,21 +1,18 @@
-from flask import Flask, render_template, request, send_file, jsonify
-import pandas as pd
-import io
-import requests
-from bs4 import BeautifulSoup
-import re
-import time
-import unicodedata
-import chardet
+from flask import Flask, Response, render_template, request, send_file, jsonify
 import os
+import sys
+import threading
 
-app = Flask(__name__, template_folder='../templates')
+# Make the shared trangvang package importable from the Vercel function
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from trangvang import metrics, settings
+from trangvang.crawler import continuation_token, crawl as crawl_query, parse_continuation
+from trangvang.export import excel_file, iter_csv
+from trangvang.parsers import COLUMNS, no_data_row
+from trangvang.session import HttpClient
 
-def to_slug(text):
-    text = unicodedata.normalize('NFKD', text)
-    text = text.encode('ascii', 'ignore').decode('utf-8')
-    text = text.replace(' ', '_').replace('-', '_').lower()
-    return text
+app = Flask(__name__, template_folder='../templates')
 
 @app.route('/')
 def index():
@@ -32,6 +29,12 @@ def index():
 def health():
     return jsonify({'status': 'OK', 'message': 'Application is running'})
 
+@app.route('/metrics')
+def metrics_endpoint():
+    if not metrics.ENABLED:
+        return jsonify({'status': 'error', 'message': 'Metrics are disabled'}), 404
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/test')
 def test():
     return jsonify({
@@ -40,88 +43,52 @@ def test():
         'app_name': 'CrawlTrangVangSale'
     })
 
-# Simplified crawl function for testing
-def crawl_trangvang_simple(nganh_hang, khu_vuc, page_start=1, page_end=2):
-    """Simplified version with fewer requests for testing"""
-    results = []
-    base_url = "https://trangvangvietnam.com/"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-    }
-    
-    nganh_hang_url = to_slug(nganh_hang)
-    khu_vuc_url = to_slug(khu_vuc)
-    
-    for page in range(page_start, min(page_end + 1, page_start + 2)):  # Limit to 2 pages max
-        url = f"{base_url}srch/{khu_vuc_url}/{nganh_hang_url}.html?page={page}"
-        try:
-            resp = requests.get(url, headers=headers, timeout=10)  # Reduced timeout
-            if resp.status_code != 200:
-                continue
-                
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            company_divs = soup.select('div.div_list_cty > div.w-100.h-auto.shadow.rounded-3.bg-white.p-2.mb-3')
-            
-            for comp in company_divs[:5]:  # Limit to 5 companies per page
-                name_tag = comp.select_one('div.listings_center h2 a, div.listings_center_khongxacthuc h2 a')
-                name = name_tag.get_text(strip=True) if name_tag else 'N/A'
-                
-                # Simple phone extraction
-                phone_links = comp.select('a[href^="tel:"]')
-                phones = [link.get_text(strip=True) for link in phone_links[:2]]  # Limit to 2 phones
-                phone = ', '.join(phones) if phones else 'N/A'
-                
-                results.append({
-                    'Tên Khách Hàng': name,
-                    'Số điện thoại': phone,
-                    'Địa chỉ': 'N/A',  # Simplified
-                    'Email': 'N/A',
-                    'Website': 'N/A',
-                    'Mô tả': 'N/A'
-                })
-                
-            time.sleep(0.5)  # Reduced sleep time
-        except Exception as e:
-            print(f"Error crawling {url}: {e}")
-            continue
-            
-    return results
+_client = None
+_client_lock = threading.Lock()
+
+def serverless_client():
+    """Shared HTTP client with short timeouts and a single retry, created on first crawl"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(read_timeout=10, max_retries=1)
+        return _client
 
 @app.route('/crawl', methods=['POST'])
 def crawl():
     try:
-        nganh_hang = request.form.get('nganh_hang', 'test')
-        khu_vuc = request.form.get('khu_vuc', 'ho-chi-minh')
-        page_start = int(request.form.get('page_start', 1))
-        page_end = int(request.form.get('page_end', 2))
+        continuation = request.form.get('continuation')
+        if continuation:
+            # Pick up where the previous invocation ran out of time
+            nganh_hang, khu_vuc, page_start, page_end, first_page = parse_continuation(continuation)
+        else:
+            nganh_hang = request.form.get('nganh_hang', 'test')
+            khu_vuc = request.form.get('khu_vuc', 'ho-chi-minh')
+            page_start = int(request.form.get('page_start', 1))
+            page_end = int(request.form.get('page_end', 10))
+            first_page = page_start
         export_type = request.form.get('export_type', 'csv')
-        
-        # Use simplified crawl function
-        data = crawl_trangvang_simple(nganh_hang, khu_vuc, page_start, page_end)
-        
-        if not data:
-            data = [{
-                'Tên Khách Hàng': 'Không tìm thấy dữ liệu',
-                'Số điện thoại': 'N/A',
-                'Địa chỉ': 'N/A',
-                'Email': 'N/A',
-                'Website': 'N/A',
-                'Mô tả': 'N/A'
-            }]
-        
-        df = pd.DataFrame(data)
-        output = io.BytesIO()
-        
+
+        # Fetch as many pages as fit in the function timeout instead of a fixed page cap
+        data, plan = crawl_query(nganh_hang, khu_vuc, page_start, page_end,
+                                 deadline=settings.CRAWL_DEADLINE, client=serverless_client(),
+                                 first_page=first_page)
+        headers = {}
+        token = continuation_token(nganh_hang, khu_vuc, plan)
+        if token:
+            headers['X-Continuation-Token'] = token
+            headers['X-Next-Page'] = str(plan.next_page)
+
         if export_type == 'csv':
-            df.to_csv(output, index=False, encoding='utf-8-sig')
-            output.seek(0)
-            return send_file(output, download_name='ket_qua.csv', as_attachment=True)
+            headers['Content-Disposition'] = 'attachment; filename=ket_qua.csv'
+            return Response(iter_csv(data, COLUMNS, placeholder=no_data_row()), mimetype='text/csv',
+                            headers=headers)
         else:
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False)
-            output.seek(0)
-            return send_file(output, download_name='ket_qua.xlsx', as_attachment=True)
-            
+            output = excel_file(data, COLUMNS, placeholder=no_data_row())
+            response = send_file(output, download_name='ket_qua.xlsx', as_attachment=True)
+            response.headers.update(headers)
+            return response
+
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -1,158 +1,195 @@
-from flask import Flask, render_template, request, send_file
-import pandas as pd
-import io
-import requests
-from bs4 import BeautifulSoup
-import re
-import time
-import unicodedata
-import chardet
+from flask import Flask, Response, jsonify, render_template, request, send_file, stream_with_context
 
-app = Flask(__name__)
+from trangvang import metrics
+from trangvang.batch import BATCH_COLUMNS, crawl_batch, page_number, parse_json_queries, parse_queries
+from trangvang.cache import get_result_cache
+from trangvang.checkpoint import get_checkpoints
+from trangvang.crawler import continuation_token, crawl as crawl_query, iter_rows, parse_continuation, query_key
+from trangvang.dedup import dedup_rows
+from trangvang.export import excel_file, iter_csv, iter_excel
+from trangvang.jobs import get_manager
+from trangvang.normalize import NORMALIZED_COLUMNS, STREAM_CHUNK_SIZE, normalize_rows
+from trangvang.parsers import COLUMNS, no_data_row
+from trangvang.store import get_store
 
-def to_slug(text):
-    text = unicodedata.normalize('NFKD', text)
-    text = text.encode('ascii', 'ignore').decode('utf-8')
-    text = text.replace(' ', '_').replace('-', '_').lower()
-    return text
-
-def crawl_trangvang(nganh_hang, khu_vuc, page_start=1, page_end=10):
-    base_url = "https://trangvangvietnam.com/"
-    results = []
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
-    nganh_hang_url = to_slug(nganh_hang)
-    khu_vuc_url = to_slug(khu_vuc)
-    for page in range(page_start, page_end+1):
-        url = f"{base_url}srch/{khu_vuc_url}/{nganh_hang_url}.html?page={page}"
-        try:
-            resp = requests.get(url, headers=headers, timeout=30)
-            # Phát hiện encoding thực tế
-            detected = chardet.detect(resp.content)
-            resp.encoding = detected['encoding'] if detected['encoding'] else 'utf-8'
-            time.sleep(1)
-            if page == page_start:
-                with open('debug_trangvang.html', 'w', encoding='utf-8') as f:
-                    f.write(resp.text)
-            if resp.status_code != 200:
-                print(f"Không truy cập được {url}, status: {resp.status_code}")
-                continue
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            company_divs = soup.select('div.div_list_cty > div.w-100.h-auto.shadow.rounded-3.bg-white.p-2.mb-3')
-            print(f"Trang {page}: tìm thấy {len(company_divs)} mục")
-            if not company_divs:
-                break
-            for comp in company_divs:
-                # Tên công ty
-                name_tag = comp.select_one('div.listings_center h2 a, div.listings_center_khongxacthuc h2 a')
-                name = name_tag.get_text(strip=True) if name_tag else ''
-                
-                # Địa chỉ - cải thiện để lấy chính xác hơn
-                addresses = []
-                # Tìm địa chỉ trong logo_congty_diachi
-                address_divs = comp.select('div.logo_congty_diachi > div, div.listing_diachi_nologo > div')
-                for div in address_divs:
-                    txt = div.get_text(strip=True)
-                    # Lọc địa chỉ chính (có chứa Việt Nam, TP., Tỉnh, hoặc các từ khóa địa chỉ)
-                    if ('Việt Nam' in txt or 'TP.' in txt or 'Tỉnh' in txt or 
-                        'Quận' in txt or 'Huyện' in txt or 'Phường' in txt or 
-                        'Xã' in txt or 'ấp' in txt or 'Đường' in txt or 
-                        'Khu' in txt or 'Lô' in txt) and len(txt) > 10:
-                        addresses.append(txt)
-                
-                # Lấy địa chỉ đầu tiên làm địa chỉ chính
-                address = addresses[0] if addresses else ''
-                
-                # Số điện thoại - cải thiện để lấy tất cả số điện thoại
-                phones = []
-                
-                # Tìm tất cả số điện thoại trong div chứa thông tin liên hệ
-                phone_divs = comp.select('div.logo_congty_diachi, div.listing_diachi_nologo')
-                for phone_div in phone_divs:
-                    # Tìm tất cả thẻ a có href="tel:..."
-                    phone_links = phone_div.select('a[href^="tel:"]')
-                    for link in phone_links:
-                        phone_text = link.get_text(strip=True)
-                        if phone_text and len(phone_text) >= 8:  # Số điện thoại phải có ít nhất 8 ký tự
-                            phones.append(phone_text)
-                
-                # Loại bỏ số trùng lặp
-                phones = list(dict.fromkeys(phones))
-                phone = ', '.join(phones) if phones else ''
-                
-                # Email
-                email = ''
-                email_tag = comp.select_one('div.email_web_section a[href^="mailto:"]')
-                if email_tag:
-                    email = email_tag.get('href', '').replace('mailto:', '').strip()
-                
-                # Website
-                website = ''
-                website_tag = comp.select_one('div.email_web_section a[href^="http"]')
-                if website_tag:
-                    website = website_tag.get('href', '').strip()
-                
-                # Mô tả - cải thiện để lấy đầy đủ hơn
-                description = ''
-                desc_tag = comp.select_one('div.div_textqc small.text_qc')
-                if desc_tag:
-                    # Lấy text và giữ nguyên format
-                    description = desc_tag.get_text(separator=' ', strip=True)
-                    # Loại bỏ các ký tự HTML entities
-                    description = re.sub(r'&#\d+;', '', description)
-                    description = re.sub(r'&[a-zA-Z]+;', '', description)
-                
-                results.append({
-                    'Tên Khách Hàng': name,
-                    'Số điện thoại': phone,
-                    'Địa chỉ': address,
-                    'Email': email,
-                    'Website': website,
-                    'Mô tả': description
-                })
-        except Exception as e:
-            print(f"Lỗi khi crawl {url}: {e}")
-            continue
-    print(f"Tổng số mục tìm được: {len(results)}")
-    return results
+app = Flask(__name__)
 
 @app.route('/', methods=['GET'])
 def index():
-    return render_template('index.html')
+    return render_template('index.html', jobs_enabled=True, batch_enabled=True,
+                           normalize_enabled=True, dedup_enabled=True,
+                           store_enabled=get_store() is not None)
 
 @app.route('/health', methods=['GET'])
 def health():
     return {'status': 'OK', 'message': 'Application is running'}
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not metrics.ENABLED:
+        return jsonify({'status': 'error', 'message': 'Metrics đang tắt'}), 404
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/crawl', methods=['POST'])
 def crawl():
-    nganh_hang = request.form.get('nganh_hang')
-    khu_vuc = request.form.get('khu_vuc')
-    page_start = int(request.form.get('page_start', 1))
-    page_end = int(request.form.get('page_end', 10))
+    continuation = request.form.get('continuation')
+    if continuation:
+        try:
+            nganh_hang, khu_vuc, page_start, page_end, first_page = parse_continuation(continuation)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+    else:
+        nganh_hang = request.form.get('nganh_hang')
+        khu_vuc = request.form.get('khu_vuc')
+        page_start = int(request.form.get('page_start', 1))
+        page_end = int(request.form.get('page_end', 10))
+        first_page = page_start
     export_type = request.form.get('export_type', 'excel')
-    data = crawl_trangvang(nganh_hang, khu_vuc, page_start, page_end)
-    if not data:
-        data = [{
-            'Tên Khách Hàng': 'Không tìm thấy dữ liệu',
-            'Số điện thoại': '',
-            'Địa chỉ': '',
-            'Email': '',
-            'Website': '',
-            'Mô tả': ''
-        }]
-    df = pd.DataFrame(data)
-    output = io.BytesIO()
+    # Chỉ xuất các đơn vị mới hoặc thay đổi so với kho dữ liệu
+    incremental = request.form.get('incremental') == '1'
+    # Thêm cột số điện thoại E.164 và địa chỉ đã tách
+    normalize = request.form.get('normalize') == '1'
+    # Gộp công ty trùng (cần đọc hết kết quả nên không stream được)
+    dedup = request.form.get('dedup') == '1'
+    deadline = request.form.get('deadline')
+    if deadline:
+        # Giới hạn thời gian: tải số trang kịp trong `deadline` giây, header
+        # X-Continuation-Token dùng để gửi lại và lấy tiếp các trang còn lại
+        rows, plan = crawl_query(nganh_hang, khu_vuc, page_start, page_end, deadline=float(deadline),
+                                 store=get_store(), incremental=incremental, checkpoints=get_checkpoints(),
+                                 first_page=first_page)
+        if dedup:
+            rows = dedup_rows(rows)
+        response = export_response(rows, export_type, normalize=normalize)
+        token = continuation_token(nganh_hang, khu_vuc, plan)
+        if token:
+            response.headers['X-Continuation-Token'] = token
+            response.headers['X-Next-Page'] = str(plan.next_page)
+        return response
+    plans = []
+
+    def crawl_rows():
+        # CSV được stream từng dòng ngay khi trang tương ứng crawl xong; Excel ghi dần
+        # vào file tạm nên cả hai không giữ toàn bộ kết quả trong bộ nhớ
+        rows = iter_rows(nganh_hang, khu_vuc, page_start, page_end, on_plan=plans.append,
+                         store=get_store(), incremental=incremental, checkpoints=get_checkpoints())
+        if dedup:
+            rows = dedup_rows(rows)
+        return rows
+
+    result_cache = get_result_cache()
+    # Kết quả incremental phụ thuộc kho dữ liệu lúc crawl nên không cache
+    if result_cache is None or incremental:
+        return export_response(crawl_rows(), export_type, normalize=normalize)
+    # Nhiều người gửi cùng truy vấn gần như cùng lúc chỉ chạy một lượt crawl
+    key = (query_key(nganh_hang, khu_vuc), page_start, page_end, export_type, normalize, dedup)
+    # Chỉ lưu kết quả đầy đủ: lượt crawl có trang lỗi thì lần sau crawl lại
+    chunks, outcome = result_cache.get_or_render(
+        key, lambda: export_chunks(crawl_rows(), export_type, normalize=normalize),
+        complete=lambda: bool(plans) and not plans[0].failed_pages)
+    response = file_response(chunks, export_type)
+    response.headers['X-Result-Cache'] = outcome
+    return response
+
+@app.route('/export', methods=['GET', 'POST'])
+def export():
+    """Xuất dữ liệu đã lưu trong kho, không crawl lại"""
+    store = get_store()
+    if store is None:
+        return jsonify({'status': 'error', 'message': 'Kho dữ liệu đang tắt'}), 404
+    nganh_hang = request.values.get('nganh_hang')
+    khu_vuc = request.values.get('khu_vuc')
+    export_type = request.values.get('export_type', 'excel')
+    rows = store.iter_rows(nganh_hang, khu_vuc)
+    if request.values.get('dedup') == '1':
+        rows = dedup_rows(rows)
+    return export_response(rows, export_type, normalize=request.values.get('normalize') == '1')
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """Crawl nhiều truy vấn trong một lượt, gộp công ty trùng vào một file"""
+    data = request.get_json(silent=True)
+    try:
+        if data is not None:
+            queries = parse_json_queries(data)
+            export_type = data.get('export_type', 'excel')
+            normalize = bool(data.get('normalize'))
+        else:
+            queries = parse_queries(request.form.get('queries'),
+                                    page_number(request.form.get('page_start', 1), 'page_start'),
+                                    page_number(request.form.get('page_end', 10), 'page_end'))
+            export_type = request.form.get('export_type', 'excel')
+            normalize = request.form.get('normalize') == '1'
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if not queries:
+        return jsonify({'status': 'error', 'message': 'Chưa có truy vấn nào'}), 400
+    rows = crawl_batch(queries, store=get_store())
+    return export_response(rows, export_type, BATCH_COLUMNS, normalize)
+
+def export_chunks(rows, export_type, columns=COLUMNS, normalize=False):
+    """Nội dung file kết quả theo từng đoạn bytes (CSV từng dòng, Excel cả file), chạy lười"""
+    if normalize:
+        # CSV được stream: khối nhỏ để dòng đã chuẩn hóa được gửi ngay sau từng trang
+        rows = normalize_rows(rows, STREAM_CHUNK_SIZE) if export_type == 'csv' else normalize_rows(rows)
+        columns = columns + NORMALIZED_COLUMNS
     if export_type == 'csv':
-        df.to_csv(output, index=False, encoding='utf-8-sig')
-        output.seek(0)
-        return send_file(output, download_name='ket_qua.csv', as_attachment=True)
+        return iter_csv(rows, columns, placeholder=no_data_row())
+    return iter_excel(rows, columns, placeholder=no_data_row())
+
+def file_response(chunks, export_type):
+    if export_type == 'csv':
+        mimetype, filename = 'text/csv', 'ket_qua.csv'
     else:
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False)
-        output.seek(0)
-        return send_file(output, download_name='ket_qua.xlsx', as_attachment=True)
+        mimetype, filename = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'ket_qua.xlsx'
+    return Response(chunks, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+def export_response(rows, export_type, columns=COLUMNS, normalize=False):
+    if normalize:
+        # CSV được stream: khối nhỏ để dòng đã chuẩn hóa được gửi ngay sau từng trang
+        rows = normalize_rows(rows, STREAM_CHUNK_SIZE) if export_type == 'csv' else normalize_rows(rows)
+        columns = columns + NORMALIZED_COLUMNS
+    if export_type == 'csv':
+        return Response(stream_with_context(iter_csv(rows, columns, placeholder=no_data_row())),
+                        mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=ket_qua.csv'})
+    output = excel_file(rows, columns, placeholder=no_data_row())
+    return send_file(output, download_name='ket_qua.xlsx', as_attachment=True)
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    job = get_manager().submit(
+        request.form.get('nganh_hang'),
+        request.form.get('khu_vuc'),
+        int(request.form.get('page_start', 1)),
+        int(request.form.get('page_end', 10)),
+        request.form.get('export_type', 'excel'),
+        incremental=request.form.get('incremental') == '1',
+        dedup=request.form.get('dedup') == '1',
+        normalize=request.form.get('normalize') == '1',
+    )
+    return jsonify({
+        'job_id': job.id,
+        'status_url': f'/jobs/{job.id}',
+        'result_url': f'/jobs/{job.id}/result',
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_manager().get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Không tìm thấy job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = get_manager().get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Không tìm thấy job'}), 404
+    if job.status != 'done':
+        return jsonify({'status': job.status, 'message': 'Job chưa hoàn thành'}), 409
+    extension = job.result_path.rsplit('.', 1)[-1]
+    return send_file(job.result_path, download_name=f'ket_qua.{extension}', as_attachment=True)
 
 if __name__ == '__main__':
     app.run(debug=False) 
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""Kiểm tra hành vi của gói trangvang trên các trang mẫu trong repo và máy chủ giả lập.
+
+    python -m unittest discover -s tests -t .    (hoặc python -m pytest tests)
+
+Không gọi tới trang thật: mọi request đi tới trangvang.standin chạy trên 127.0.0.1.
+Cấu hình đọc từ biến môi trường lúc import, nên gói này đặt chúng trước khi các
+module test (tests.test_*) import trangvang.
+"""
+import atexit
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+
+DATA_DIR = tempfile.mkdtemp(prefix='trangvang-test-')
+os.environ['TRANGVANG_DATA_DIR'] = DATA_DIR
+os.environ['TRANGVANG_CACHE'] = '0'
+os.environ['TRANGVANG_PARSE_WORKERS'] = '0'
+atexit.register(shutil.rmtree, DATA_DIR, ignore_errors=True)
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_server():
+    """Máy chủ giả lập dùng chung (5 trang mỗi truy vấn); crawler.BASE_URL trỏ về nó"""
+    global _server
+    from trangvang import crawler
+    from trangvang.session import get_client
+    from trangvang.standin import StandinServer
+
+    with _server_lock:
+        if _server is None:
+            _server = StandinServer(pages=5, latency=0.01, retry_after=0)
+            crawler.BASE_URL = _server.start()
+            # Máy chủ giả lập chạy trên máy: không cần lịch sự như với trang thật
+            get_client().limiter.rate = 100
+            atexit.register(_server.stop)
+        return _server
+
+
+@contextlib.contextmanager
+def standin(**kwargs):
+    """Máy chủ giả lập riêng (độ trễ, lỗi... theo `kwargs`) trong khối with, crawler.BASE_URL trỏ về nó"""
+    from trangvang import crawler
+    from trangvang.session import get_client
+    from trangvang.standin import StandinServer
+
+    get_server()
+    limiter = get_client().limiter
+    limits = limiter.rate, limiter.max_in_flight
+    server = StandinServer(**kwargs)
+    previous = crawler.BASE_URL
+    crawler.BASE_URL = server.start()
+    try:
+        yield server
+    finally:
+        crawler.BASE_URL = previous
+        server.stop()
+        # Lỗi và timeout của máy chủ riêng làm limiter dùng chung (AdaptiveLimiter) giảm
+        # giới hạn; trả lại như cũ để các test sau không bị chậm theo
+        set_limits(limiter, *limits)
+
+
+def set_limits(limiter, rate, max_in_flight):
+    """Đặt lại số request mỗi giây và số request đồng thời của limiter cho mọi host"""
+    with limiter._lock:
+        limiter.rate = rate
+        limiter.max_in_flight = max_in_flight
+        for state in limiter._hosts.values():
+            with state['bucket'].lock:
+                state['bucket'].rate = rate
+            with state['cond']:
+                state['cond'].notify_all()
+
+
+def quiet():
+    """Context không in log của crawler ra màn hình test"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def quiet_rows(*args, **kwargs):
+    """list(iter_rows(...)) mà không in log của crawler"""
+    from trangvang import crawler
+
+    with quiet():
+        return list(crawler.iter_rows(*args, **kwargs))
+
+
+def requests_served():
+    return get_server().stats()['requests']
+
+
+def temp_path(name):
+    """Đường dẫn `name` trong một thư mục tạm mới (bị xóa khi chạy xong)"""
+    return os.path.join(tempfile.mkdtemp(dir=DATA_DIR), name)
@@ -0,0 +1,102 @@
+"""Crawl nhiều truy vấn trong một lượt (trangvang.batch) và route /batch."""
+import csv
+import io
+import unittest
+
+import app
+from tests import get_server, quiet, requests_served
+from trangvang.batch import BATCH_COLUMNS, QUERY_COLUMN, _round_robin, crawl_batch, parse_json_queries, parse_queries
+
+
+def read_csv(data):
+    return list(csv.reader(io.StringIO(data.decode('utf-8-sig'))))
+
+
+def setUpModule():
+    get_server()
+
+
+class ParseQueriesTest(unittest.TestCase):
+
+    def test_lines_with_and_without_pages(self):
+        text = 'nhựa | long an | 2-4\nin ấn | hà nội | 3\n\n  gạch | đà nẵng  \nchỉ một cột\n | thiếu ngành'
+        queries = parse_queries(text, 1, 5)
+        self.assertEqual([(q.nganh_hang, q.khu_vuc, q.plan.page_start, q.plan.page_end) for q in queries],
+                         [('nhựa', 'long an', 2, 4), ('in ấn', 'hà nội', 1, 3), ('gạch', 'đà nẵng', 1, 5)])
+        self.assertEqual(queries[0].label, 'nhựa - long an')
+
+    def test_bad_page_number_names_the_line(self):
+        with self.assertRaisesRegex(ValueError, 'Dòng 2: trang cuối'):
+            parse_queries('nhựa | long an\nnhựa | hà nội | 1-x')
+
+    def test_json_queries(self):
+        queries = parse_json_queries({'queries': [{'nganh_hang': ' nhựa ', 'khu_vuc': 'long an', 'page_end': '3'},
+                                                  {'nganh_hang': 'gạch', 'khu_vuc': 'huế', 'page_start': 2}]})
+        self.assertEqual([(q.nganh_hang, q.plan.page_start, q.plan.page_end) for q in queries],
+                         [('nhựa', 1, 3), ('gạch', 2, 10)])
+
+    def test_json_errors(self):
+        for data, message in [([], 'queries'), ({'queries': {}}, 'queries'), ({'queries': ['nhựa']}, 'object'),
+                              ({'queries': [{'nganh_hang': 'nhựa'}]}, 'thiếu nganh_hang'),
+                              ({'queries': [{'nganh_hang': 'nhựa', 'khu_vuc': ' '}]}, 'thiếu nganh_hang'),
+                              ({'queries': [{'nganh_hang': 'nhựa', 'khu_vuc': 'huế', 'page_end': 'x'}]}, 'page_end'),
+                              ({'queries': [{'nganh_hang': 'nhựa', 'khu_vuc': 'huế', 'page_start': True}]},
+                               'page_start')]:
+            with self.subTest(data=data), self.assertRaisesRegex(ValueError, message):
+                parse_json_queries(data)
+
+
+class CrawlBatchTest(unittest.TestCase):
+
+    def test_pages_are_scheduled_round_robin(self):
+        queries = parse_queries('nhựa | long an | 1-3\ngạch | huế | 1-2\nin ấn | hà nội | 1-4')
+        items = [(query.khu_vuc, page) for query, page in _round_robin(queries)]
+        self.assertEqual(items, [('long an', 2), ('huế', 2), ('hà nội', 2), ('long an', 3), ('hà nội', 3),
+                                 ('hà nội', 4)])
+
+    def test_companies_shared_between_queries_are_merged(self):
+        pages = []
+        queries = parse_queries('nhựa | long an | 1-3\nnhựa | bình dương | 1-2')
+        before = requests_served()
+        with quiet():
+            rows = crawl_batch(queries, on_page=lambda query, page, count: pages.append((query.khu_vuc, page)))
+        self.assertEqual(requests_served() - before, 5)
+        self.assertEqual(pages, [('long an', 1), ('bình dương', 1), ('long an', 2), ('bình dương', 2),
+                                 ('long an', 3)])
+        # Hai truy vấn nhận cùng các trang mẫu: mỗi công ty chỉ còn một dòng, ghi cả hai truy vấn
+        self.assertLess(len(rows), get_server().expected_rows(1, 3) + get_server().expected_rows(1, 2))
+        self.assertLessEqual(set(BATCH_COLUMNS), set(rows[0]))
+        self.assertIn('nhựa - long an', rows[0][QUERY_COLUMN])
+        self.assertIn('nhựa - bình dương', rows[0][QUERY_COLUMN])
+
+
+class BatchRouteTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = app.app.test_client()
+
+    def test_bad_requests(self):
+        for kwargs in [{'json': {'queries': [{'nganh_hang': 'nhựa'}]}},
+                       {'json': {'queries': []}},
+                       {'data': {'queries': 'nhựa | long an', 'page_end': 'mười'}},
+                       {'data': {'queries': 'nhựa | long an | a-b'}},
+                       {'data': {'queries': ''}}]:
+            with self.subTest(**kwargs):
+                resp = self.client.post('/batch', **kwargs)
+                self.assertEqual(resp.status_code, 400)
+                self.assertEqual(resp.get_json()['status'], 'error')
+
+    def test_batch_csv(self):
+        with quiet():
+            resp = self.client.post('/batch', json={'export_type': 'csv', 'queries': [
+                {'nganh_hang': 'nhựa', 'khu_vuc': 'quảng nam', 'page_end': 2},
+                {'nganh_hang': 'nhựa', 'khu_vuc': 'quảng ngãi', 'page_end': 2}]})
+            rows = read_csv(resp.get_data())
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(rows[0], BATCH_COLUMNS)
+        self.assertTrue(1 < len(rows) <= get_server().expected_rows(1, 2) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
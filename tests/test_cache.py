@@ -0,0 +1,141 @@
+"""Cache response trên đĩa: TTL, kiểm tra lại bằng 304 và xóa theo LRU (trangvang.cache.ResponseCache)."""
+import json
+import os
+import time
+import unittest
+
+from tests import quiet, standin, temp_path
+from trangvang.cache import ResponseCache
+from trangvang.fetcher import HostLimiter
+from trangvang.session import HttpClient
+
+
+class FakeResponse:
+
+    def __init__(self, url, status_code, content=b'', headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    """Client trả lần lượt các response đã định sẵn và ghi lại header của từng request"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False, expires_at=None):
+        self.requests.append(dict(headers or {}))
+        status_code, content, response_headers = self.responses.pop(0)
+        return FakeResponse(url, status_code, content, response_headers)
+
+
+URL = 'https://host/srch/long-an/nhua.html?page=1'
+VALIDATORS = {'Content-Type': 'text/html; charset=utf-8', 'ETag': '"v1"',
+              'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+
+
+def response_cache(**kwargs):
+    return ResponseCache(directory=temp_path('cache'), **kwargs)
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def test_fresh_entry_skips_the_network(self):
+        cache = response_cache(ttl=60)
+        http = HttpClient(limiter=HostLimiter(rate=1000))
+        with standin(pages=1, latency=0) as server:
+            url = f"{server.base_url}srch/long-an/nhua.html?page=1"
+            first = cache.fetch(url, http)
+            second = cache.fetch(url, http)
+            self.assertEqual(server.stats()['requests'], 1)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.cache_status, 'fresh')
+        self.assertEqual(second.headers['content-type'], 'text/html; charset=utf-8')
+        self.assertEqual(cache.stats()['fresh'], 1)
+
+    def test_expired_entry_is_revalidated(self):
+        cache = response_cache(ttl=0)
+        client = FakeClient((200, b'<html>v1</html>', VALIDATORS), (304, b'', {}))
+        cache.fetch(URL, client)
+        resp = cache.fetch(URL, client)
+        self.assertEqual(client.requests[1], {'If-None-Match': '"v1"',
+                                              'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+        self.assertEqual((resp.status_code, resp.content, resp.cache_status), (200, b'<html>v1</html>', 'revalidated'))
+        self.assertEqual(cache.stats()['revalidated'], 1)
+
+    def test_changed_page_replaces_entry(self):
+        cache = response_cache(ttl=0)
+        client = FakeClient((200, b'v1', VALIDATORS), (200, b'v2', dict(VALIDATORS, ETag='"v2"')), (304, b'', {}))
+        cache.fetch(URL, client)
+        self.assertEqual(cache.fetch(URL, client).content, b'v2')
+        self.assertEqual(cache.fetch(URL, client).content, b'v2')
+        self.assertEqual(client.requests[2]['If-None-Match'], '"v2"')
+
+    def test_revalidation_keeps_entry_fresh_again(self):
+        cache = response_cache(ttl=60)
+        client = FakeClient((200, b'v1', VALIDATORS), (304, b'', {}))
+        cache.fetch(URL, client)
+        # Entry được lưu từ 2 phút trước: đã hết hạn
+        path = cache._path(URL)
+        with open(path, 'rb') as f:
+            meta, body = json.loads(f.readline()), f.read()
+        meta['stored_at'] -= 120
+        with open(path, 'wb') as f:
+            f.write(json.dumps(meta).encode('utf-8') + b'\n' + body)
+        self.assertEqual(cache.fetch(URL, client).cache_status, 'revalidated')
+        self.assertEqual(cache.fetch(URL, client).cache_status, 'fresh')
+        self.assertEqual(len(client.requests), 2)
+
+    def test_error_responses_are_not_stored(self):
+        cache = response_cache(ttl=60)
+        client = FakeClient((503, b'', {}), (200, b'ok', VALIDATORS))
+        self.assertEqual(cache.fetch(URL, client).status_code, 503)
+        self.assertEqual(cache.fetch(URL, client).content, b'ok')
+        self.assertEqual(len(client.requests), 2)
+
+    def test_streamed_page_is_stored_once_fully_read(self):
+        cache = response_cache(ttl=60)
+        client = FakeClient((200, b'a' * 5000, VALIDATORS), (200, b'a' * 5000, VALIDATORS))
+        partial = cache.fetch(URL, client, stream=True)
+        next(partial.iter_content(1024))
+        # Chưa đọc hết: chưa có gì trong cache
+        streamed = cache.fetch(URL, client, stream=True)
+        self.assertEqual(b''.join(streamed.iter_content(1024)), b'a' * 5000)
+        resp = cache.fetch(URL, client, stream=True)
+        self.assertEqual((resp.cache_status, b''.join(resp.iter_content(1024))), ('fresh', b'a' * 5000))
+        self.assertEqual(len(client.requests), 2)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        # Nội dung ngẫu nhiên không nén được: mỗi entry khoảng 1 KB, cache chứa được 2 entry
+        bodies = {name: os.urandom(1000) for name in 'abc'}
+        cache = response_cache(ttl=60, max_bytes=2500)
+        urls = {name: f'https://host/srch/{name}.html' for name in bodies}
+        client = FakeClient(*[(200, bodies[name], VALIDATORS) for name in 'abc'] + [(200, bodies['b'], VALIDATORS)])
+        cache.fetch(urls['a'], client)
+        cache.fetch(urls['b'], client)
+        now = time.time()
+        os.utime(cache._path(urls['a']), (now - 100, now - 100))
+        os.utime(cache._path(urls['b']), (now - 50, now - 50))
+        # Đọc lại a: a thành entry mới dùng nhất, b là entry lâu không dùng nhất
+        self.assertEqual(cache.fetch(urls['a'], client).cache_status, 'fresh')
+        with quiet():
+            cache.fetch(urls['c'], client)
+        self.assertEqual(cache.stats()['evicted'], 1)
+        self.assertEqual(cache.fetch(urls['a'], client).cache_status, 'fresh')
+        self.assertEqual(cache.fetch(urls['b'], client).content, bodies['b'])
+        self.assertEqual(len(client.requests), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Thứ tự xác định encoding: header, <meta>, encoding đã biết, chardet (trangvang.charset)."""
+import unittest
+
+from trangvang.bench import load_fixtures
+from trangvang.charset import CharsetResolver
+
+HTML_HEADERS = {'Content-Type': 'text/html; charset=utf-8'}
+VIETNAMESE = 'Công ty nhựa Long An, Việt Nam. '.encode('utf-8') * 20
+
+
+class CharsetResolverTest(unittest.TestCase):
+
+    def test_header_wins_over_meta(self):
+        resolver = CharsetResolver()
+        page = b'<html><head><meta charset="windows-1258"></head></html>'
+        self.assertEqual(resolver.resolve('https://host/srch/a', HTML_HEADERS, page), ('utf-8', 'header'))
+
+    def test_meta_when_header_has_no_charset(self):
+        resolver = CharsetResolver()
+        for name, content in load_fixtures().items():
+            with self.subTest(fixture=name):
+                self.assertEqual(resolver.resolve('https://host/srch/a', {'Content-Type': 'text/html'}, content),
+                                 ('utf-8', 'meta'))
+
+    def test_unknown_header_charset_falls_through(self):
+        resolver = CharsetResolver()
+        page = b'<meta charset="windows-1258">'
+        self.assertEqual(resolver.resolve('https://host/srch/a', {'Content-Type': 'text/html; charset=bogus'}, page),
+                         ('cp1258', 'meta'))
+
+    def test_known_encoding_of_same_page_type(self):
+        resolver = CharsetResolver()
+        resolver.resolve('https://host/srch/a.html?page=1', {}, b'<meta charset="windows-1258">')
+        # Trang sau cùng kiểu (host + /srch) không có <meta>: dùng lại encoding đã biết
+        self.assertEqual(resolver.resolve('https://host/srch/b.html?page=2', {}, VIETNAMESE), ('cp1258', 'known'))
+        # Kiểu trang khác thì phải dò
+        self.assertEqual(resolver.resolve('https://host/listings/1.html', {}, VIETNAMESE), ('utf-8', 'detect'))
+
+    def test_default_when_nothing_is_known(self):
+        resolver = CharsetResolver()
+        self.assertEqual(resolver.resolve('https://host/srch/a', {}, b''), ('utf-8', 'default'))
+
+    def test_detect_reads_only_a_sample(self):
+        resolver = CharsetResolver(detect_sample_size=64)
+        # Sau mẫu 64 byte là các byte không phải utf-8: chardet không được thấy chúng
+        content = b'<html><body>' + b'a' * 100 + b'\xe0\xe1\xe2' * 1000
+        self.assertEqual(resolver.resolve('https://host/srch/a', {}, content), ('ascii', 'detect'))
+
+    def test_stats_count_each_source(self):
+        resolver = CharsetResolver()
+        resolver.resolve('https://host/srch/a', HTML_HEADERS, b'')
+        resolver.resolve('https://host/srch/a', {}, b'<meta charset="utf-8">')
+        resolver.resolve('https://host/srch/b', {}, b'')
+        self.assertEqual(resolver.stats(), {'header': 1, 'meta': 1, 'known': 1, 'detect': 0, 'default': 0})
+
+
+class ResolveStreamTest(unittest.TestCase):
+
+    def chunks(self, content, size=1024):
+        return [content[start:start + size] for start in range(0, len(content), size)]
+
+    def test_header_reads_nothing_ahead(self):
+        resolver = CharsetResolver()
+        content = VIETNAMESE * 10
+        encoding, source, prefix, rest = resolver.resolve_stream('https://host/srch/a', HTML_HEADERS,
+                                                                 self.chunks(content))
+        self.assertEqual((encoding, source, prefix), ('utf-8', 'header', b''))
+        self.assertEqual(b''.join(rest), content)
+
+    def test_meta_reads_only_the_scan_window(self):
+        resolver = CharsetResolver(meta_scan_size=2048)
+        content = load_fixtures()['debug_trangvang.html']
+        encoding, source, prefix, rest = resolver.resolve_stream('https://host/srch/a', {}, self.chunks(content))
+        self.assertEqual((encoding, source), ('utf-8', 'meta'))
+        self.assertEqual(len(prefix), 2048)
+        self.assertEqual(prefix + b''.join(rest), content)
+
+    def test_detect_reads_the_sample(self):
+        resolver = CharsetResolver(meta_scan_size=1024, detect_sample_size=4096)
+        content = VIETNAMESE * 20
+        encoding, source, prefix, rest = resolver.resolve_stream('https://host/srch/a', {}, self.chunks(content))
+        self.assertEqual((encoding, source, len(prefix)), ('utf-8', 'detect', 4096))
+        self.assertEqual(prefix + b''.join(rest), content)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""Checkpoint theo từng trang để crawl dài chạy tiếp được (trangvang.checkpoint)."""
+import time
+import unittest
+
+from tests import get_server, quiet, quiet_rows, requests_served, temp_path
+from trangvang import crawler
+from trangvang.checkpoint import CheckpointStore
+from trangvang.crawler import query_key
+from trangvang.parsers import get_parser
+
+EMPTY_INFO = {'total_results': None, 'last_page': None}
+
+
+def setUpModule():
+    get_server()
+
+
+class CheckpointStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.checkpoints = CheckpointStore(temp_path('checkpoints.sqlite3'))
+
+    def test_pages_round_trip(self):
+        rows = [{'Tên Khách Hàng': 'Nhựa Á Đông', 'Số điện thoại': '0283960568'}]
+        self.checkpoints.save_page('nhua|long-an', 1, rows, {'total_results': 20, 'last_page': 2})
+        self.checkpoints.save_page('nhua|long-an', 2, [], EMPTY_INFO)
+        self.checkpoints.save_page('nhua|ha-noi', 1, [], EMPTY_INFO)
+        self.assertEqual(self.checkpoints.load('nhua|long-an'),
+                         {1: (rows, {'total_results': 20, 'last_page': 2}), 2: ([], EMPTY_INFO)})
+
+    def test_failed_pages_are_not_loaded(self):
+        self.checkpoints.save_page('q', 1, [], EMPTY_INFO)
+        self.checkpoints.mark_failed('q', 3)
+        self.checkpoints.mark_failed('q', 2)
+        self.assertEqual(list(self.checkpoints.load('q')), [1])
+        self.assertEqual(self.checkpoints.failed_pages('q'), [2, 3])
+        # Tải lại thành công thì trang không còn lỗi
+        self.checkpoints.save_page('q', 2, [], EMPTY_INFO)
+        self.assertEqual(self.checkpoints.failed_pages('q'), [3])
+
+    def test_clear_page_range(self):
+        for page in range(1, 7):
+            self.checkpoints.save_page('q', page, [], EMPTY_INFO)
+        self.checkpoints.clear('q', 2, 4)
+        self.assertEqual(sorted(self.checkpoints.load('q')), [1, 5, 6])
+        self.checkpoints.clear('q')
+        self.assertEqual(self.checkpoints.load('q'), {})
+
+    def test_expired_checkpoints_are_dropped(self):
+        checkpoints = CheckpointStore(temp_path('checkpoints.sqlite3'), ttl=0.2)
+        checkpoints.save_page('q', 1, [], EMPTY_INFO)
+        self.assertEqual(list(checkpoints.load('q')), [1])
+        time.sleep(0.3)
+        self.assertEqual(checkpoints.load('q'), {})
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.checkpoints = CheckpointStore(temp_path('checkpoints.sqlite3'))
+
+    def test_resume_fetches_only_missing_pages(self):
+        server = get_server()
+        key = query_key('nhựa', 'long an')
+        with quiet():
+            rows = crawler.iter_rows('nhựa', 'long an', 1, 5, checkpoints=self.checkpoints)
+            for _ in range(server.expected_rows(1, 2)):
+                next(rows)
+            # Lượt crawl bị dừng giữa chừng
+            rows.close()
+        saved = sorted(self.checkpoints.load(key))
+        self.assertGreaterEqual(len(saved), 2)
+        self.assertLess(len(saved), 5)
+        before = requests_served()
+        rows = quiet_rows('nhựa', 'long an', 1, 5, checkpoints=self.checkpoints)
+        self.assertEqual(len(rows), server.expected_rows(1, 5))
+        self.assertEqual(requests_served() - before, 5 - len(saved))
+        # Chạy hết không lỗi: checkpoint được xóa
+        self.assertEqual(self.checkpoints.load(key), {})
+
+    def test_failed_page_is_fetched_again(self):
+        server = get_server()
+        parser = get_parser()
+        key = query_key('nhựa', 'hà giang')
+        for page in (1, 2, 4, 5):
+            self.checkpoints.save_page(key, page, *parser.parse_page(server.page_body(page)))
+        self.checkpoints.mark_failed(key, 3)
+        before = requests_served()
+        rows = quiet_rows('nhựa', 'hà giang', 1, 5, checkpoints=self.checkpoints)
+        self.assertEqual(requests_served() - before, 1)
+        self.assertEqual(rows, [row for page in range(1, 6) for row in parser.parse(server.page_body(page))])
+        self.assertEqual(self.checkpoints.load(key), {})
+
+    def test_finished_crawl_keeps_other_page_ranges(self):
+        key = query_key('nhựa', 'bình dương')
+        self.checkpoints.save_page(key, 30, [], EMPTY_INFO)
+        quiet_rows('nhựa', 'bình dương', 1, 3, checkpoints=self.checkpoints)
+        self.assertEqual(sorted(self.checkpoints.load(key)), [30])
+
+    def test_last_segment_clears_earlier_segments(self):
+        key = query_key('nhựa', 'cần thơ')
+        # Đoạn đầu (trang 1-2) hết thời gian để lại checkpoint, đoạn cuối chạy tiếp từ continuation token
+        self.checkpoints.save_page(key, 1, [], EMPTY_INFO)
+        self.checkpoints.save_page(key, 2, [], EMPTY_INFO)
+        quiet_rows('nhựa', 'cần thơ', 3, 5, checkpoints=self.checkpoints, first_page=1)
+        self.assertEqual(self.checkpoints.load(key), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""Crawl có giới hạn thời gian và continuation token để lấy tiếp (chế độ Deadline)."""
+import base64
+import csv
+import io
+import time
+import unittest
+
+import app
+from tests import get_server, quiet, standin
+from trangvang import crawler
+from trangvang.checkpoint import get_checkpoints
+from trangvang.crawler import CrawlPlan, Deadline, continuation_token, parse_continuation, query_key
+from trangvang.fetcher import HostLimiter
+from trangvang.session import DeadlineExceeded, HttpClient
+
+
+def read_csv(data):
+    return list(csv.reader(io.StringIO(data.decode('utf-8-sig'))))
+
+
+def setUpModule():
+    get_server()
+
+
+class ContinuationTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        plan = CrawlPlan(3, 20)
+        plan.next_page = 7
+        token = continuation_token('nhựa', 'hồ chí minh', plan)
+        self.assertEqual(parse_continuation(token), ('nhựa', 'hồ chí minh', 7, 20, 3))
+
+    def test_old_token_starts_at_its_own_page(self):
+        token = base64.urlsafe_b64encode('["nhựa", "hcm", 7, 20]'.encode('utf-8')).decode('ascii')
+        self.assertEqual(parse_continuation(token), ('nhựa', 'hcm', 7, 20, 7))
+
+    def test_no_token_when_finished(self):
+        self.assertIsNone(continuation_token('nhựa', 'hồ chí minh', CrawlPlan(1, 20)))
+
+    def test_bad_tokens_are_rejected(self):
+        wrong_shape = base64.urlsafe_b64encode(b'["nhua", 3]').decode('ascii')
+        not_a_number = base64.urlsafe_b64encode('["nhựa", "hcm", "x", 5]'.encode('utf-8')).decode('ascii')
+        for token in ('khong-phai-token', wrong_shape, not_a_number, 'đ'):
+            with self.subTest(token=token):
+                with self.assertRaises(ValueError):
+                    parse_continuation(token)
+
+
+class DeadlineTest(unittest.TestCase):
+
+    def test_reserve_is_kept_for_export(self):
+        deadline = Deadline(10, reserve=4)
+        self.assertAlmostEqual(deadline.expires_at - time.monotonic(), 6, delta=0.1)
+        self.assertFalse(deadline.expired())
+        self.assertTrue(Deadline(1, reserve=2).expired())
+
+    def test_fits_uses_time_per_page(self):
+        deadline = Deadline(1.3, reserve=0)
+        time.sleep(0.2)
+        deadline.page_done()
+        # Khoảng 0,2 giây mỗi trang, còn khoảng 1,1 giây
+        self.assertTrue(deadline.fits(pending=3))
+        self.assertFalse(deadline.fits(pending=6))
+
+    def test_request_is_given_up_instead_of_waiting_past_the_deadline(self):
+        client = HttpClient(limiter=HostLimiter(rate=1000), backoff=0.001)
+        with standin(pages=1, latency=0, throttle_rate=1.0, retry_after=30) as server:
+            url = f"{server.base_url}srch/long-an/nhua.html?page=1"
+            start = time.monotonic()
+            with self.assertRaises(DeadlineExceeded):
+                client.get(url, expires_at=time.monotonic() + 2)
+            self.assertLess(time.monotonic() - start, 1)
+            with self.assertRaises(DeadlineExceeded):
+                client.get(url, expires_at=time.monotonic() - 1)
+            self.assertEqual(server.stats()['requests'], 1)
+
+
+class DeadlineCrawlTest(unittest.TestCase):
+
+    def test_crawl_stops_before_the_deadline(self):
+        with quiet(), standin(pages=8, latency=0.5) as server:
+            start = time.monotonic()
+            rows, plan = crawler.crawl('nhựa', 'yên bái', 1, 8, deadline=2.6)
+            elapsed = time.monotonic() - start
+            expected = server.expected_rows(1, plan.next_page - 1) if plan.next_page else None
+        self.assertLess(elapsed, 2.6)
+        self.assertIsNotNone(plan.next_page)
+        self.assertEqual(len(rows), expected)
+        self.assertEqual(parse_continuation(continuation_token('nhựa', 'yên bái', plan))[2:],
+                         (plan.next_page, 8, 1))
+
+    def test_app_segments_cover_every_page(self):
+        client = app.app.test_client()
+        form = {'nganh_hang': 'nhựa', 'khu_vuc': 'sơn la', 'page_start': 1, 'page_end': 5, 'export_type': 'csv',
+                'deadline': '2.6'}
+        rows = []
+        segments = 0
+        with quiet(), standin(pages=5, latency=0.5) as server:
+            while True:
+                resp = client.post('/crawl', data=form)
+                self.assertEqual(resp.status_code, 200)
+                rows.extend(row for row in read_csv(resp.get_data())[1:] if row[0] != 'Không tìm thấy dữ liệu')
+                segments += 1
+                token = resp.headers.get('X-Continuation-Token')
+                if not token:
+                    break
+                form = {'continuation': token, 'export_type': 'csv', 'deadline': '2.6'}
+            expected = server.expected_rows(1, 5)
+        self.assertGreater(segments, 1)
+        self.assertEqual(len(rows), expected)
+        # Đoạn cuối xóa checkpoint của mọi đoạn trước
+        self.assertEqual(get_checkpoints().load(query_key('nhựa', 'sơn la')), {})
+
+    def test_bad_token_is_rejected(self):
+        resp = app.app.test_client().post('/crawl', data={'continuation': 'khong-phai-token', 'deadline': '5'})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('Continuation token', resp.get_json()['message'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Gộp công ty trùng theo số điện thoại, domain và tên gần giống (trangvang.dedup)."""
+import unittest
+
+from tests import quiet
+from trangvang.bench import load_fixtures
+from trangvang.dedup import CompanyDeduplicator, _Record, dedup_rows, is_match, name_tokens
+from trangvang.parsers import get_parser
+
+
+def fixture_rows():
+    parser = get_parser()
+    return [row for content in load_fixtures().values() for row in parser.parse(content)]
+
+
+def company(name, phone='', email='', website='', **extra):
+    return dict({'Tên Khách Hàng': name, 'Số điện thoại': phone, 'Email': email, 'Website': website}, **extra)
+
+
+def pairwise_groups(rows):
+    """Nhóm công ty khi so mọi cặp dòng, không xếp khối"""
+    records = [_Record(row) for row in rows]
+    parent = list(range(len(rows)))
+
+    def find(index):
+        while parent[index] != index:
+            index = parent[index]
+        return index
+
+    for i in range(len(rows)):
+        for j in range(i):
+            a, b = find(i), find(j)
+            if a != b and is_match(records[i], records[j]):
+                parent[max(a, b)] = min(a, b)
+    groups = {}
+    for index in range(len(rows)):
+        groups.setdefault(find(index), []).append(index)
+    return list(groups.values())
+
+
+class DeduplicatorTest(unittest.TestCase):
+
+    def groups(self, *rows):
+        dedup = CompanyDeduplicator()
+        for row in rows:
+            dedup.add(row)
+        return dedup.groups()
+
+    def test_blocking_finds_the_same_groups_as_every_pair(self):
+        rows = fixture_rows()
+        dedup = CompanyDeduplicator()
+        for row in rows:
+            dedup.add(row)
+        self.assertEqual(dedup.groups(), pairwise_groups(rows))
+        # Các trang mẫu có chung nhiều công ty
+        self.assertLess(len(dedup.groups()), len(rows))
+        self.assertLess(dedup.comparisons, len(rows) * 2)
+
+    def test_name_variants_are_merged(self):
+        self.assertEqual(self.groups(company('Công Ty TNHH Nhựa Tứ Hưng'), company('Nhựa Tứ Hưng - Cty TNHH'),
+                                     company('CÔNG TY CỔ PHẦN NHỰA TỨ HƯNG')), [[0, 1, 2]])
+        self.assertEqual(name_tokens('Công Ty TNHH Sản Xuất Nhựa Việt Nhật'), {'nhua', 'viet', 'nhat'})
+
+    def test_same_phone_in_another_format(self):
+        self.assertEqual(self.groups(company('Nhựa A', '(028) 3960 5688'), company('Khác hẳn', '+84 28 3960 5688')),
+                         [[0, 1]])
+
+    def test_shared_free_email_domain_is_not_a_match(self):
+        self.assertEqual(self.groups(company('Nhựa Minh Phát', email='minhphat@gmail.com'),
+                                     company('Bao Bì Hoàng Gia', email='hoanggia@gmail.com')), [[0], [1]])
+
+    def test_own_domain_lowers_the_name_threshold(self):
+        self.assertEqual(self.groups(company('Nhựa Đại Đồng Tiến Miền Nam', website='http://daidongtien.com.vn'),
+                                     company('Đại Đồng Tiến', email='sales@daidongtien.com.vn')), [[0, 1]])
+
+    def test_single_word_names_are_not_merged(self):
+        self.assertEqual(self.groups(company('Nhựa'), company('Nhựa')), [[0], [1]])
+
+    def test_merged_row_keeps_first_values_and_adds_new_phones(self):
+        dedup = CompanyDeduplicator()
+        dedup.add(company('Nhựa Tứ Hưng', '0283960568, 0969851551', website=''), 'nhựa - long an')
+        dedup.add(company('Cty Nhựa Tứ Hưng', '0969 851 551, 0903 000 111', website='tuhung.vn'), 'nhựa - hcm')
+        [merged] = dedup.results('Truy vấn')
+        self.assertEqual(merged['Tên Khách Hàng'], 'Nhựa Tứ Hưng')
+        self.assertEqual(merged['Số điện thoại'], '0283960568, 0969851551, 0903 000 111')
+        self.assertEqual(merged['Website'], 'tuhung.vn')
+        self.assertEqual(merged['Truy vấn'], 'nhựa - long an; nhựa - hcm')
+
+    def test_dedup_rows(self):
+        rows = fixture_rows()
+        with quiet():
+            results = dedup_rows(row for row in rows)
+        self.assertEqual(len(results), len(pairwise_groups(rows)))
+
+
+if __name__ == '__main__':
+    unittest.main()
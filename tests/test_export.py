@@ -0,0 +1,126 @@
+"""Xuất kết quả CSV và Excel theo từng dòng (trangvang.export) và /crawl trả CSV dạng stream."""
+import codecs
+import csv
+import io
+import unittest
+
+import app
+from tests import get_server, quiet, standin
+from trangvang.bench import load_fixtures
+from trangvang.export import excel_file, iter_csv, write_csv
+from trangvang.parsers import COLUMNS, get_parser, no_data_row
+
+
+def sample_rows():
+    return get_parser().parse(load_fixtures()['nhựa các công ty nhựa ở tại long an(page ).html'])
+
+
+def read_csv(data):
+    return list(csv.reader(io.StringIO(data.decode('utf-8-sig'))))
+
+
+def excel_sheet(rows, placeholder=None):
+    """Sheet của file Excel excel_file() ghi ra, đọc lại bằng openpyxl"""
+    from openpyxl import load_workbook
+
+    with excel_file(rows, placeholder=placeholder) as output:
+        return load_workbook(output).active
+
+
+class CsvExportTest(unittest.TestCase):
+
+    def test_header_chunk_starts_with_bom(self):
+        chunks = list(iter_csv(sample_rows()))
+        self.assertTrue(chunks[0].startswith(codecs.BOM_UTF8))
+        self.assertEqual(chunks[0], codecs.BOM_UTF8 + ','.join(COLUMNS).encode('utf-8') + b'\n')
+        # Không có BOM ở các đoạn sau, để nối lại vẫn là một file utf-8-sig hợp lệ
+        self.assertFalse(any(codecs.BOM_UTF8 in chunk for chunk in chunks[1:]))
+
+    def test_one_chunk_per_row(self):
+        rows = sample_rows()
+        chunks = list(iter_csv(rows))
+        self.assertEqual(len(chunks), len(rows) + 1)
+        self.assertEqual(read_csv(b''.join(chunks))[1:], [[row[column] for column in COLUMNS] for row in rows])
+
+    def test_rows_are_read_lazily(self):
+        consumed = []
+
+        def rows():
+            for row in sample_rows():
+                consumed.append(row)
+                yield row
+
+        chunks = iter_csv(rows())
+        next(chunks)
+        self.assertEqual(consumed, [])
+        next(chunks)
+        self.assertEqual(len(consumed), 1)
+
+    def test_placeholder_when_no_rows(self):
+        data = b''.join(iter_csv([], placeholder=no_data_row()))
+        self.assertEqual(read_csv(data)[1][0], 'Không tìm thấy dữ liệu')
+        self.assertEqual(len(read_csv(b''.join(iter_csv([])))), 1)
+
+    def test_extra_columns_and_missing_values(self):
+        output = io.BytesIO()
+        write_csv([{'Tên Khách Hàng': 'A'}], output, ['Tên Khách Hàng', 'Truy vấn'])
+        self.assertEqual(read_csv(output.getvalue()), [['Tên Khách Hàng', 'Truy vấn'], ['A', '']])
+
+
+class ExcelExportTest(unittest.TestCase):
+
+    def test_header_is_bold_with_borders(self):
+        sheet = excel_sheet(sample_rows())
+        self.assertEqual(sheet.title, 'Sheet1')
+        for cell in sheet[1]:
+            with self.subTest(column=cell.value):
+                self.assertTrue(cell.font.bold)
+                self.assertEqual((cell.border.left.style, cell.border.bottom.style), ('thin', 'thin'))
+                self.assertEqual(cell.alignment.horizontal, 'center')
+        self.assertEqual([cell.value for cell in sheet[1]], COLUMNS)
+        self.assertFalse(sheet['A2'].font.bold)
+
+    def test_rows_round_trip(self):
+        rows = sample_rows()
+        sheet = excel_sheet(rows)
+        values = [[value or '' for value in row] for row in sheet.iter_rows(min_row=2, values_only=True)]
+        self.assertEqual(values, [[row[column] for column in COLUMNS] for row in rows])
+
+    def test_rows_are_consumed_one_at_a_time(self):
+        # Truyền generator: write_excel không cần list các dòng
+        rows = sample_rows()
+        sheet = excel_sheet(row for row in rows)
+        self.assertEqual(sheet.max_row, len(rows) + 1)
+
+    def test_placeholder_when_no_rows(self):
+        sheet = excel_sheet([], no_data_row())
+        self.assertEqual((sheet.max_row, sheet['A2'].value), (2, 'Không tìm thấy dữ liệu'))
+        self.assertEqual(excel_sheet([]).max_row, 1)
+
+
+class CrawlStreamTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        get_server()
+        cls.client = app.app.test_client()
+
+    def test_csv_rows_are_sent_before_the_crawl_finishes(self):
+        form = {'nganh_hang': 'nhựa', 'khu_vuc': 'tây ninh', 'page_start': 1, 'page_end': 5, 'export_type': 'csv'}
+        with quiet(), standin(pages=5, latency=0.3) as server:
+            resp = self.client.post('/crawl', data=form, buffered=False)
+            chunks = resp.iter_encoded()
+            header, first_row = next(chunks), next(chunks)
+            # Dòng đầu tiên tới ngay sau trang 1, các trang sau vẫn đang tải
+            self.assertEqual(server.stats()['requests'], 1)
+            data = header + first_row + b''.join(chunks)
+            resp.close()
+            expected = server.expected_rows(1, 5)
+        self.assertTrue(resp.is_streamed)
+        self.assertEqual(resp.mimetype, 'text/csv')
+        self.assertTrue(data.startswith(codecs.BOM_UTF8))
+        self.assertEqual(len(read_csv(data)), expected + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
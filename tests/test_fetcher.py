@@ -0,0 +1,205 @@
+"""Tải trang đồng thời có giới hạn tốc độ theo host (trangvang.fetcher)."""
+import threading
+import time
+import unittest
+
+from tests import get_server, quiet, quiet_rows, requests_served, standin
+from trangvang.fetcher import AdaptiveLimiter, HostLimiter, TokenBucket, fetch_in_order
+from trangvang.parsers import get_parser
+from trangvang.session import HttpClient
+
+
+def setUpModule():
+    get_server()
+
+
+class FetchInOrderTest(unittest.TestCase):
+
+    def test_results_keep_item_order(self):
+        # Item đầu chậm nhất: các item sau xong trước nhưng vẫn được trả về sau nó
+        def fetch(item):
+            time.sleep(0.01 * (10 - item))
+            return item * 10
+
+        results = list(fetch_in_order(range(10), fetch, workers=4))
+        self.assertEqual([item for item, result, error in results], list(range(10)))
+        self.assertEqual([result for item, result, error in results], [item * 10 for item in range(10)])
+        self.assertTrue(all(error is None for item, result, error in results))
+
+    def test_requeued_item_keeps_its_place(self):
+        calls = {}
+        lock = threading.Lock()
+
+        def fetch(item):
+            with lock:
+                calls[item] = calls.get(item, 0) + 1
+                attempt = calls[item]
+            if item == 3 and attempt < 3:
+                raise OSError('tạm thời lỗi')
+            return item
+
+        def requeue(item, result, error):
+            return error is not None
+
+        results = list(fetch_in_order(range(6), fetch, workers=2, requeue=requeue))
+        self.assertEqual([item for item, result, error in results], list(range(6)))
+        self.assertEqual(results[3], (3, 3, None))
+        self.assertEqual(calls[3], 3)
+
+    def test_requeue_stops_after_max_requeues(self):
+        calls = []
+
+        def fetch(item):
+            calls.append(item)
+            raise OSError('luôn lỗi')
+
+        results = list(fetch_in_order([1], fetch, requeue=lambda *args: True, max_requeues=2))
+        self.assertEqual(len(results), 1)
+        self.assertIsInstance(results[0][2], OSError)
+        self.assertEqual(len(calls), 3)
+
+    def test_stopping_early_bounds_extra_work(self):
+        calls = []
+
+        def fetch(item):
+            calls.append(item)
+            return item
+
+        fetched = fetch_in_order(range(1000), fetch, workers=2)
+        next(fetched)
+        fetched.close()
+        self.assertLessEqual(len(calls), 2 * 2 + 1)
+
+
+class LimiterTest(unittest.TestCase):
+
+    def test_token_bucket_rate(self):
+        bucket = TokenBucket(rate=50, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # Token đầu có sẵn, 5 token sau mỗi token chờ 1/50 giây
+        self.assertGreaterEqual(time.monotonic() - start, 5 / 50 * 0.9)
+
+    def test_token_bucket_burst(self):
+        bucket = TokenBucket(rate=1, burst=3)
+        start = time.monotonic()
+        for _ in range(3):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_host_limiter_caps_requests_in_flight(self):
+        limiter = HostLimiter(rate=1000, max_in_flight=2)
+        lock = threading.Lock()
+        state = {'now': 0, 'peak': 0}
+
+        def fetch(item):
+            with limiter.limit('http://host/page'):
+                with lock:
+                    state['now'] += 1
+                    state['peak'] = max(state['peak'], state['now'])
+                time.sleep(0.02)
+                with lock:
+                    state['now'] -= 1
+
+        list(fetch_in_order(range(12), fetch, workers=6))
+        self.assertEqual(state['peak'], 2)
+
+    def test_hosts_are_limited_separately(self):
+        limiter = HostLimiter(rate=5, burst=1)
+        start = time.monotonic()
+        # Mỗi host có token đầu riêng, không phải chờ nhau
+        for host in ('a', 'b', 'c'):
+            with limiter.limit(f'http://{host}/page'):
+                pass
+        self.assertLess(time.monotonic() - start, 0.15)
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+
+    def test_adaptive_limiter_decreases_on_throttle(self):
+        limiter = AdaptiveLimiter(rate=4.0, max_in_flight=4, cooldown=60)
+        with quiet():
+            limiter.record('http://host/a', status=429, latency=0.1)
+            self.assertEqual((limiter.rate, limiter.max_in_flight), (2.0, 2))
+            # Các response của cùng một đợt bị chặn không giảm tiếp trong thời gian cooldown
+            limiter.record('http://host/a', status=503, latency=0.1)
+            self.assertEqual((limiter.rate, limiter.max_in_flight), (2.0, 2))
+        self.assertEqual(limiter.stats()['last_change'], 'giảm: status 429 (host)')
+
+    def test_adaptive_limiter_increases_after_healthy_responses(self):
+        limiter = AdaptiveLimiter(rate=2.0, max_in_flight=2, increase_after=5, rate_step=0.5)
+        with quiet():
+            for _ in range(4):
+                limiter.record('http://host/a', status=200, latency=0.1)
+            self.assertEqual((limiter.rate, limiter.max_in_flight), (2.0, 2))
+            limiter.record('http://host/a', status=200, latency=0.1)
+        self.assertEqual((limiter.rate, limiter.max_in_flight), (2.5, 3))
+
+    def test_adaptive_limiter_respects_bounds(self):
+        limiter = AdaptiveLimiter(rate=0.5, max_in_flight=1, cooldown=0)
+        with quiet():
+            limiter.record('http://host/a', error=OSError('reset'))
+        self.assertEqual((limiter.rate, limiter.max_in_flight), (0.5, 1))
+        limiter = AdaptiveLimiter(rate=8.0, max_in_flight=8, increase_after=1)
+        limiter.record('http://host/a', status=200, latency=0.1)
+        # Đã ở giới hạn trên: không đổi gì
+        self.assertEqual((limiter.rate, limiter.max_in_flight, len(limiter.changes)), (8.0, 8, 0))
+
+    def test_latency_spike_decreases(self):
+        limiter = AdaptiveLimiter(rate=4.0, max_in_flight=4, cooldown=0, increase_after=100)
+        with quiet():
+            for _ in range(20):
+                limiter.record('http://host/a', status=200, latency=0.2)
+            self.assertEqual(limiter.rate, 4.0)
+            for _ in range(5):
+                limiter.record('http://host/a', status=200, latency=3.0)
+        self.assertLess(limiter.rate, 4.0)
+        self.assertIn('latency tăng', limiter.stats()['last_change'])
+
+    def test_server_error_resets_healthy_streak(self):
+        limiter = AdaptiveLimiter(rate=2.0, max_in_flight=2, increase_after=3)
+        limiter.record('http://host/a', status=200, latency=0.1)
+        limiter.record('http://host/a', status=200, latency=0.1)
+        limiter.record('http://host/a', status=500, latency=0.1)
+        limiter.record('http://host/a', status=200, latency=0.1)
+        self.assertEqual(limiter.rate, 2.0)
+
+    def test_throttled_crawl_slows_down_and_keeps_every_page(self):
+        limiter = AdaptiveLimiter(rate=50.0, max_in_flight=6, rate_bounds=(5.0, 50.0), cooldown=0)
+        client = HttpClient(limiter=limiter, backoff=0.001)
+        with quiet(), standin(pages=6, latency=0.01, throttle_rate=0.3, retry_after=0, seed=3) as server:
+            rows = quiet_rows('nhựa', 'điện biên', 1, 6, client=client)
+            stats = server.stats()
+            expected = server.expected_rows(1, 6)
+        self.assertGreater(stats['statuses'].get('429', 0), 0)
+        self.assertEqual(len(rows), expected)
+        self.assertLess(limiter.rate, 50.0)
+        self.assertTrue(any(reason.startswith('giảm: status 429') for when, rate, in_flight, reason in limiter.changes))
+
+
+class ConcurrentCrawlTest(unittest.TestCase):
+
+    def test_pages_are_fetched_concurrently(self):
+        with standin(pages=6, latency=0.2) as server:
+            start = time.monotonic()
+            rows = quiet_rows('nhựa', 'long an', 1, 6)
+            elapsed = time.monotonic() - start
+            self.assertEqual(len(rows), server.expected_rows(1, 6))
+            self.assertGreater(server.stats()['max_in_flight'], 1)
+        # Tải lần lượt mất ít nhất 6 x 0.2 giây
+        self.assertLess(elapsed, 6 * 0.2)
+
+    def test_rows_follow_page_order(self):
+        server = get_server()
+        before = requests_served()
+        rows = quiet_rows('nhựa', 'hà nội', 1, 5)
+        self.assertEqual(requests_served() - before, 5)
+        # Trang xong trước vẫn được trả về sau các trang đứng trước nó
+        parser = get_parser()
+        expected = [row for page in range(1, 6) for row in parser.parse(server.page_body(page))]
+        self.assertEqual(rows, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
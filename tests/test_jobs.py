@@ -0,0 +1,124 @@
+"""Crawl chạy nền: job, tiến độ và file kết quả lưu trên đĩa (trangvang.jobs, /jobs)."""
+import csv
+import io
+import json
+import os
+import time
+import unittest
+
+import app
+from tests import get_server, quiet, temp_path
+from trangvang.jobs import JobManager
+from trangvang.normalize import NORMALIZED_COLUMNS
+from trangvang.parsers import COLUMNS
+
+
+def wait(manager, job_id, timeout=15):
+    """Chờ job chạy xong (done hoặc failed), trả về Job"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job.status in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'Job {job_id} chưa xong sau {timeout} giây')
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return list(csv.reader(f))
+
+
+def setUpModule():
+    get_server()
+
+
+class JobManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = temp_path('jobs')
+        self.manager = JobManager(self.directory, workers=1)
+
+    def test_job_runs_in_background_and_saves_result(self):
+        with quiet():
+            job = self.manager.submit('nhựa', 'bình phước', 1, 5, 'csv')
+            self.assertIn(job.status, ('queued', 'running', 'done'))
+            job = wait(self.manager, job.id)
+        self.assertEqual(job.status, 'done', job.error)
+        expected = get_server().expected_rows(1, 5)
+        self.assertEqual((job.pages_done, job.pages_total, job.rows), (5, 5, expected))
+        self.assertEqual(job.plan['page_stop'], 5)
+        rows = read_csv(job.result_path)
+        self.assertEqual((rows[0], len(rows)), (COLUMNS, expected + 1))
+
+    def test_plan_limits_pages_total(self):
+        with quiet():
+            job = wait(self.manager, self.manager.submit('nhựa', 'bình định', 1, 40, 'csv').id)
+        self.assertEqual((job.status, job.pages_total, job.pages_done), ('done', 5, 5))
+
+    def test_options_are_applied(self):
+        with quiet():
+            plain = wait(self.manager, self.manager.submit('nhựa', 'vĩnh long', 1, 5, 'csv').id)
+            job = wait(self.manager, self.manager.submit('nhựa', 'vĩnh long', 1, 5, 'csv',
+                                                         dedup=True, normalize=True).id)
+        self.assertEqual(job.status, 'done', job.error)
+        rows = read_csv(job.result_path)
+        self.assertEqual(rows[0], COLUMNS + NORMALIZED_COLUMNS)
+        # Máy chủ giả lập xoay vòng các trang mẫu: sau khi gộp trùng còn ít dòng hơn
+        self.assertLess(len(rows), len(read_csv(plain.result_path)))
+
+    def test_excel_result(self):
+        from openpyxl import load_workbook
+
+        with quiet():
+            job = wait(self.manager, self.manager.submit('nhựa', 'bến tre', 1, 2).id)
+        self.assertTrue(job.result_path.endswith('.xlsx'))
+        workbook = load_workbook(job.result_path, read_only=True)
+        rows = list(workbook.active.iter_rows(values_only=True))
+        workbook.close()
+        self.assertEqual((list(rows[0]), len(rows)), (COLUMNS, get_server().expected_rows(1, 2) + 1))
+
+    def test_jobs_are_reloaded_after_restart(self):
+        with quiet():
+            job = wait(self.manager, self.manager.submit('nhựa', 'cà mau', 1, 2, 'csv').id)
+        # Job đang chạy khi process dừng
+        with open(os.path.join(self.directory, 'dang-chay.json'), 'w', encoding='utf-8') as f:
+            json.dump(dict(job.to_dict(), job_id='dang-chay', status='running', finished_at=None), f)
+        with quiet():
+            reloaded = JobManager(self.directory, workers=1)
+        done = reloaded.get(job.id)
+        self.assertEqual((done.status, done.result_path, done.rows), ('done', job.result_path, job.rows))
+        interrupted = reloaded.get('dang-chay')
+        self.assertEqual(interrupted.status, 'failed')
+        self.assertIn('gián đoạn', interrupted.error)
+
+
+class JobRoutesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = app.app.test_client()
+
+    def test_submit_poll_and_download(self):
+        form = {'nganh_hang': 'nhựa', 'khu_vuc': 'hậu giang', 'page_start': 1, 'page_end': 3, 'export_type': 'csv'}
+        with quiet():
+            resp = self.client.post('/jobs', data=form)
+            self.assertEqual(resp.status_code, 202)
+            created = resp.get_json()
+            job = wait(app.get_manager(), created['job_id'])
+        self.assertEqual(job.status, 'done', job.error)
+        status = self.client.get(created['status_url']).get_json()
+        self.assertEqual((status['status'], status['pages_done'], status['params']['export_type']), ('done', 3, 'csv'))
+        result = self.client.get(created['result_url'])
+        self.assertEqual(result.status_code, 200)
+        rows = list(csv.reader(io.StringIO(result.data.decode('utf-8-sig'))))
+        self.assertEqual(len(rows), get_server().expected_rows(1, 3) + 1)
+        result.close()
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get('/jobs/khong-co').status_code, 404)
+        self.assertEqual(self.client.get('/jobs/khong-co/result').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
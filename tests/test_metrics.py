@@ -0,0 +1,103 @@
+"""Số liệu định dạng text Prometheus (trangvang.metrics) và route /metrics."""
+import threading
+import unittest
+
+import app
+from tests import get_server, quiet_rows
+from trangvang import metrics
+
+
+def observed(stage):
+    """Số lần trangvang_stage_seconds đã ghi nhận bước `stage`"""
+    state = metrics.STAGE_SECONDS._values.get((stage,))
+    return state[2] if state else 0
+
+
+class MetricFormatTest(unittest.TestCase):
+
+    def metric(self, cls, *args, **kwargs):
+        """Metric chỉ dùng trong test: bỏ khỏi danh sách render() khi test xong"""
+        metric = cls(*args, **kwargs)
+        self.addCleanup(metrics._METRICS.remove, metric)
+        return metric
+
+    def test_counter(self):
+        counter = self.metric(metrics.Counter, 'test_requests_total', 'Số request', ['status'])
+        counter.inc(status=200)
+        counter.inc(2, status=200)
+        counter.inc(status=503)
+        self.assertEqual(counter.render(), ['# HELP test_requests_total Số request',
+                                            '# TYPE test_requests_total counter',
+                                            'test_requests_total{status="200"} 3',
+                                            'test_requests_total{status="503"} 1'])
+
+    def test_gauge_without_labels(self):
+        gauge = self.metric(metrics.Gauge, 'test_in_flight', 'Đang chạy')
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        self.assertEqual(gauge.render()[1:], ['# TYPE test_in_flight gauge', 'test_in_flight 1'])
+        gauge.set(2.5)
+        self.assertEqual(gauge.render()[-1], 'test_in_flight 2.5')
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.metric(metrics.Histogram, 'test_seconds', 'Thời gian', ['stage'], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(value, stage='fetch')
+        self.assertEqual(histogram.render()[1:], [
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{stage="fetch",le="0.1"} 1',
+            'test_seconds_bucket{stage="fetch",le="1.0"} 3',
+            'test_seconds_bucket{stage="fetch",le="+Inf"} 4',
+            'test_seconds_sum{stage="fetch"} 4.25',
+            'test_seconds_count{stage="fetch"} 4',
+        ])
+
+    def test_label_values_are_escaped(self):
+        counter = self.metric(metrics.Counter, 'test_errors_total', 'Lỗi', ['message'])
+        counter.inc(message='a "b"\\c\nd')
+        self.assertEqual(counter.render()[-1], 'test_errors_total{message="a \\"b\\"\\\\c\\nd"} 1')
+
+    def test_concurrent_increments(self):
+        counter = self.metric(metrics.Counter, 'test_concurrent_total', 'Đếm từ nhiều thread')
+
+        def work():
+            for _ in range(1000):
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.render()[-1], 'test_concurrent_total 8000')
+
+    def test_captured_stages_are_recorded_later(self):
+        before = observed('test-stage')
+        with metrics.capture_stages() as stages:
+            with metrics.timer('test-stage'):
+                pass
+        self.assertEqual([stage for stage, seconds in stages], ['test-stage'])
+        self.assertEqual(observed('test-stage'), before)
+        metrics.record_stages(stages)
+        self.assertEqual(observed('test-stage'), before + 1)
+
+
+class MetricsRouteTest(unittest.TestCase):
+
+    def test_metrics_after_a_crawl(self):
+        get_server()
+        quiet_rows('nhựa', 'lào cai', 1, 2)
+        resp = app.app.test_client().get('/metrics')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers['Content-Type'], metrics.CONTENT_TYPE)
+        text = resp.get_data(as_text=True)
+        for line in ['# TYPE trangvang_stage_seconds histogram', 'trangvang_stage_seconds_count{stage="fetch"}',
+                     'trangvang_stage_seconds_count{stage="parse"}', 'trangvang_http_responses_total{status="200"}',
+                     'trangvang_pages_total ', 'trangvang_crawls_in_flight 0']:
+            self.assertIn(line, text)
+        self.assertTrue(text.endswith('\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Chuẩn hóa số điện thoại, địa chỉ và cả tập kết quả trước khi xuất (trangvang.normalize)."""
+import unittest
+
+from trangvang import normalize
+from trangvang.bench import _normalize_row, load_fixtures
+from trangvang.normalize import NORMALIZED_COLUMNS, normalize_rows, province_key, split_address, to_e164
+from trangvang.parsers import get_parser
+
+
+def fixture_rows():
+    parser = get_parser()
+    return [row for content in load_fixtures().values() for row in parser.parse(content)]
+
+
+class PhoneTest(unittest.TestCase):
+
+    def test_to_e164(self):
+        for phone, expected in [('(028) 3960 5688', '+842839605688'), ('0969.851.551', '+84969851551'),
+                                ('+84 969 851 551', '+84969851551'), ('84969851551', '+84969851551'),
+                                ('(08) 38772042', '+842838772042'), ('(04) 38260000', '+842438260000'),
+                                ('1900 1234', ''), ('1800 588 888', ''), ('38772042', ''), ('', '')]:
+            with self.subTest(phone=phone):
+                self.assertEqual(to_e164(phone), expected)
+
+    def test_area_code_for_local_numbers(self):
+        self.assertEqual(to_e164('38772042', '272'), '+8427238772042')
+        self.assertEqual(to_e164('3877204', '28'), '+84283877204')
+        # Số đã có đầu 0 không bị thêm mã vùng
+        self.assertEqual(to_e164('0969 851 551', '272'), '+84969851551')
+        self.assertEqual(to_e164('1900 1234', '272'), '')
+
+
+class AddressTest(unittest.TestCase):
+
+    def test_split_address(self):
+        for address, expected in [
+            ('VPGD: 462 & 466 Hồng Bàng, P. 16, Q. 11,TP. Hồ Chí Minh, Việt Nam',
+             ('462 & 466 Hồng Bàng', 'Phường 16', 'Quận 11', 'Hồ Chí Minh')),
+            ('Số 31 Nguyễn Thiệp, Phường Đồng Xuân, Quận Hoàn Kiếm,Hà Nội, Việt Nam',
+             ('Số 31 Nguyễn Thiệp', 'Phường Đồng Xuân', 'Quận Hoàn Kiếm', 'Hà Nội')),
+            ('287/2A Ấp Phú An, X. Hòa Đông, H. Củ Chi,TP. Hồ Chí Minh, Việt Nam',
+             ('287/2A Ấp Phú An', 'Xã Hòa Đông', 'Huyện Củ Chi', 'Hồ Chí Minh')),
+            ('176 Bình Phú, Đường Số 32, Phường 10, Quận 6,TP. Hồ Chí Minh',
+             ('176 Bình Phú, Đường Số 32', 'Phường 10', 'Quận 6', 'Hồ Chí Minh')),
+            ('Cần Thơ,TP. Cần Thơ, Việt Nam', ('Cần Thơ', '', '', 'Cần Thơ')),
+            ('KCN Đức Hòa, Tỉnh Long An', ('KCN Đức Hòa', '', '', 'Long An')),
+        ]:
+            with self.subTest(address=address):
+                self.assertEqual(split_address(address), expected)
+
+    def test_unknown_province_is_not_split(self):
+        for address in ('NGÀNH:Khuy, Nút, Cúc (Kim Loại, Nhựa, Gỗ) - Sản Xuất và Bán Buôn', 'Việt Nam', '', None):
+            with self.subTest(address=address):
+                self.assertEqual(split_address(address), ('', '', '', ''))
+
+    def test_province_key(self):
+        self.assertEqual(province_key('TP. Hồ Chí Minh'), 'ho chi minh')
+        self.assertEqual(province_key('TP.HCM'), 'ho chi minh')
+        self.assertEqual(province_key('Tỉnh Bà Rịa - Vũng Tàu'), 'ba ria vung tau')
+
+
+class NormalizeRowsTest(unittest.TestCase):
+
+    def test_same_as_row_by_row(self):
+        rows = fixture_rows()
+        # Khối nhỏ để cả memo lẫn việc chia khối đều được dùng tới
+        self.assertEqual(list(normalize_rows(rows, chunk_size=7)), [_normalize_row(row) for row in rows])
+
+    def test_columns_and_area_code_from_address(self):
+        row = {'Tên Khách Hàng': 'A', 'Số điện thoại': '38772042, 0969 851 551, 0969.851.551',
+               'Địa chỉ': 'Số 1 Lê Lợi, P. Bến Nghé, Q. 1,TP. Hồ Chí Minh, Việt Nam', 'Địa chỉ bổ sung': '',
+               'Email': ' Info@Example.COM', 'Website': 'HTTP://WWW.Example.com/Trang-Chu'}
+        result = next(normalize_rows([row]))
+        self.assertEqual(list(result)[-len(NORMALIZED_COLUMNS):], NORMALIZED_COLUMNS)
+        self.assertEqual(result['Điện thoại (E.164)'], '+842838772042, +84969851551')
+        self.assertEqual((result['Email'], result['Website']), ('info@example.com', 'http://www.example.com/Trang-Chu'))
+        self.assertEqual(result['Quận/Huyện'], 'Quận 1')
+
+    def test_extra_address_when_address_column_is_not_an_address(self):
+        row = {'Số điện thoại': '', 'Địa chỉ': 'NGÀNH:Nhựa - Sản Xuất',
+               'Địa chỉ bổ sung': 'Xưởng: 12 Quốc Lộ 1A, Huyện Bến Lức, Long An, Việt Nam Văn phòng: 5 Lê Lợi'}
+        result = next(normalize_rows([row]))
+        self.assertEqual((result['Quận/Huyện'], result['Tỉnh/Thành phố']), ('Huyện Bến Lức', 'Long An'))
+
+    def test_chunks_are_streamed(self):
+        consumed = []
+
+        def rows():
+            for row in fixture_rows():
+                consumed.append(row)
+                yield row
+
+        next(normalize_rows(rows(), chunk_size=3))
+        self.assertEqual(len(consumed), 3)
+
+    def test_memo_is_bounded(self):
+        memo = {}
+        calls = []
+
+        def func(value):
+            calls.append(value)
+            return value * 2
+
+        self.assertEqual(normalize._map_unique(memo, func, [1, 2, 1, 3, 2], max_size=2), [2, 4, 2, 6, 4])
+        # 3 làm memo đầy nên bị xóa: 2 được tính lại
+        self.assertEqual(calls, [1, 2, 3, 2])
+        self.assertLessEqual(len(memo), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Engine phân tích lxml so với cách trích xuất cũ bằng BeautifulSoup trên các trang mẫu (trangvang.parsers)."""
+import unittest
+
+from trangvang.bench import load_fixtures
+from trangvang.parsers import (COLUMNS, DETAIL_URL, clean_text, get_parser, is_address, is_phone, no_data_row,
+                               page_info)
+
+# Số đơn vị và phân trang của từng trang mẫu
+EXPECTED_PAGES = {
+    'debug_trangvang.html': (38, {'last_page': 7, 'total_results': 257}),
+    'debugtrangvàng.html': (38, {'last_page': 27, 'total_results': 1000}),
+    'nhựa các công ty nhựa ở tại long an(page ).html': (5, {'last_page': 2, 'total_results': 20}),
+    'nhựa ở hồ chí minh - danh sách các công ty nhựa ở hồ chí minh.html': (38, {'last_page': 27, 'total_results': 1000}),
+}
+
+
+class ParserParityTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fixtures = load_fixtures()
+
+    def test_lxml_matches_beautifulsoup_on_every_fixture(self):
+        lxml_parser, bs4_parser = get_parser('lxml'), get_parser('bs4')
+        for name, content in self.fixtures.items():
+            with self.subTest(fixture=name):
+                self.assertEqual(lxml_parser.parse_page(content), bs4_parser.parse_page(content))
+
+    def test_listing_counts_and_paging(self):
+        parser = get_parser()
+        for name, (count, info) in EXPECTED_PAGES.items():
+            with self.subTest(fixture=name):
+                rows, page = parser.parse_page(self.fixtures[name])
+                self.assertEqual((len(rows), page), (count, info))
+                self.assertTrue(all(row['Tên Khách Hàng'] for row in rows))
+
+    def test_known_listing(self):
+        row = get_parser().parse(self.fixtures['nhựa các công ty nhựa ở tại long an(page ).html'])[0]
+        self.assertEqual(list(row), COLUMNS + [DETAIL_URL])
+        self.assertEqual(row['Tên Khách Hàng'], 'Công Ty Cổ Phần Nhựa Cơ Khí Khuôn Mẫu Liên Anh')
+        self.assertEqual(row['Số điện thoại'], '(0272) 3849959')
+        self.assertEqual(row['Địa chỉ'],
+                         'Khu Công Nghiệp Hoàng Gia, ấp Mới 2, X. Mỹ Hạnh Nam, H. Đức Hòa,Long An, Việt Nam')
+        self.assertEqual(row['Email'], 'lienanh.mai@gmail.com')
+        self.assertEqual(row[DETAIL_URL], 'https://trangvangvietnam.com/listings/1117083/'
+                                          'cong-ty-co-phan-nhua-co-khi-khuon-mau-lien-anh.html')
+
+    def test_listing_with_several_phones_and_addresses(self):
+        row = get_parser().parse(self.fixtures['debugtrangvàng.html'])[0]
+        self.assertEqual(row['Số điện thoại'], '0938 930 416, 0937 959 208, 0909 613 114')
+        self.assertEqual(row['Địa chỉ bổ sung'],
+                         '42A Đường Thạnh Lộc 57, Phường Thạnh Lộc, Quận 12,TP. Hồ Chí Minh, Việt Nam')
+        self.assertEqual(row['Website'], 'http://phulieumayanbinh.com')
+
+    def test_page_without_listings(self):
+        empty = b'<html><head><meta charset="utf-8"></head><body><div class="div_list_cty"></div></body></html>'
+        for name in ('lxml', 'bs4'):
+            with self.subTest(parser=name):
+                self.assertEqual(get_parser(name).parse_page(empty),
+                                 ([], {'last_page': None, 'total_results': None}))
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            get_parser('html5lib')
+
+
+class HelperTest(unittest.TestCase):
+
+    def test_clean_text(self):
+        self.assertEqual(clean_text('  Nhựa&nbsp; &#7893;Long\n\tAn  '), 'Nhựa Long An')
+        self.assertEqual(clean_text(None), '')
+
+    def test_is_phone(self):
+        self.assertTrue(is_phone('(0272) 3849959'))
+        self.assertFalse(is_phone('Gửi Email'))
+        self.assertFalse(is_phone('123'))
+
+    def test_is_address(self):
+        self.assertTrue(is_address('ấp 4, Đường 830, X. Lương Bình'))
+        self.assertFalse(is_address('Việt Nam'))
+
+    def test_page_info(self):
+        self.assertEqual(page_info(['Trang đầu', '1', ' 2 ', '27', 'Tiếp'], '(1.000 kết quả được tìm thấy)'),
+                         {'last_page': 27, 'total_results': 1000})
+        self.assertEqual(page_info([], None), {'last_page': None, 'total_results': None})
+
+    def test_no_data_row(self):
+        self.assertEqual(no_data_row()['Tên Khách Hàng'], 'Không tìm thấy dữ liệu')
+
+
+if __name__ == '__main__':
+    unittest.main()
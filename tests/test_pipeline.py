@@ -0,0 +1,74 @@
+"""Phân tích trang trên process pool (trangvang.pipeline) cho kết quả như phân tích ngay trong thread."""
+import multiprocessing
+import types
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from tests import get_server, quiet
+from trangvang.bench import load_fixtures
+from trangvang.crawler import iter_page_rows, parse_pages
+from trangvang.parsers import get_parser
+from trangvang.pipeline import parse_in_pool
+
+
+def fetched(contents, encoding='utf-8'):
+    """(page, url, resp) như fetch_pages trả về, cho các trang có sẵn"""
+    for page, content in enumerate(contents, 1):
+        yield page, f'http://host/srch/a.html?page={page}', types.SimpleNamespace(content=content, encoding=encoding)
+
+
+class ParseInPoolTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn'))
+        cls.contents = list(load_fixtures().values()) * 2
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def test_same_rows_in_page_order(self):
+        for name in ('lxml', 'bs4'):
+            with self.subTest(parser=name):
+                inline = list(parse_pages(fetched(self.contents), get_parser(name)))
+                pooled = list(parse_in_pool(fetched(self.contents), name, self.pool, max_pending=4))
+                self.assertEqual([page for page, rows, info in pooled], list(range(1, len(self.contents) + 1)))
+                self.assertEqual(pooled, inline)
+
+    def test_pending_pages_are_bounded(self):
+        consumed = []
+
+        def pages():
+            for item in fetched(self.contents):
+                consumed.append(item[0])
+                yield item
+
+        results = parse_in_pool(pages(), 'lxml', self.pool, max_pending=3)
+        next(results)
+        # Trang 4 chỉ được lấy sau khi kết quả trang 1 đã trả về cho người gọi
+        self.assertEqual(consumed, [1, 2, 3])
+        self.assertEqual(len(list(results)), len(self.contents) - 1)
+
+    def test_failed_page_is_skipped(self):
+        with quiet():
+            pages = list(fetched(self.contents[:2])) + [(3, 'http://host/srch/x', types.SimpleNamespace(
+                content=self.contents[0], encoding='khong-co-encoding-nay'))]
+            results = list(parse_in_pool(iter(pages), 'lxml', self.pool, max_pending=2))
+        self.assertEqual([page for page, rows, info in results], [1, 2])
+
+
+class PooledCrawlTest(unittest.TestCase):
+
+    def test_crawl_with_parse_workers_matches_inline(self):
+        server = get_server()
+        with quiet():
+            inline = list(iter_page_rows('nhựa', 'lâm đồng', 1, 5, parse_workers=0))
+            pooled = list(iter_page_rows('nhựa', 'lâm đồng', 1, 5, parse_workers=2))
+        self.assertEqual([page for page, rows in pooled], [1, 2, 3, 4, 5])
+        self.assertEqual(sum(len(rows) for page, rows in pooled), server.expected_rows(1, 5))
+        self.assertEqual(pooled, inline)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""Kế hoạch crawl từ khối phân trang của trang đầu (trangvang.crawler.CrawlPlan)."""
+import unittest
+
+from tests import get_server, quiet_rows, requests_served
+from trangvang.bench import load_fixtures
+from trangvang.crawler import CrawlPlan
+from trangvang.parsers import get_parser
+
+
+def setUpModule():
+    get_server()
+
+
+class CrawlPlanTest(unittest.TestCase):
+
+    def test_last_page_from_paging_block(self):
+        plan = CrawlPlan(1, 10)
+        plan.update(1, {'total_results': 95, 'last_page': 4}, 25)
+        self.assertEqual((plan.page_stop, plan.pages_total), (4, 4))
+
+    def test_last_page_from_result_count(self):
+        plan = CrawlPlan(1, 10)
+        plan.update(1, {'total_results': 45, 'last_page': None}, 20)
+        self.assertEqual(plan.page_stop, 3)
+
+    def test_page_end_still_limits(self):
+        plan = CrawlPlan(2, 3)
+        plan.update(2, {'total_results': 500, 'last_page': 25}, 20)
+        self.assertEqual((plan.page_stop, plan.pages_total), (3, 2))
+
+    def test_unknown_paging_keeps_requested_range(self):
+        plan = CrawlPlan(1, 7)
+        plan.update(1, {'total_results': None, 'last_page': None}, 0)
+        self.assertEqual(plan.page_stop, 7)
+
+    def test_last_page_never_before_current_page(self):
+        plan = CrawlPlan(5, 10)
+        plan.update(5, {'total_results': 40, 'last_page': 2}, 20)
+        self.assertEqual((plan.page_stop, plan.pages_total), (5, 1))
+
+    def test_plan_from_sample_pages(self):
+        parser = get_parser()
+        fixtures = load_fixtures()
+        for name, page_stop in [('nhựa các công ty nhựa ở tại long an(page ).html', 2),
+                                ('debug_trangvang.html', 7), ('debugtrangvàng.html', 20)]:
+            with self.subTest(fixture=name):
+                rows, info = parser.parse_page(fixtures[name])
+                plan = CrawlPlan(1, 20)
+                plan.update(1, info, len(rows))
+                self.assertEqual(plan.page_stop, page_stop)
+                self.assertEqual(plan.to_dict()['per_page'], len(rows))
+
+    def test_crawl_stops_at_real_last_page(self):
+        plans = []
+        before = requests_served()
+        rows = quiet_rows('nhựa', 'hồ chí minh', 1, 40, on_plan=plans.append)
+        self.assertEqual(len(rows), get_server().expected_rows(1, 5))
+        self.assertEqual(plans[0].page_stop, 5)
+        self.assertEqual(requests_served() - before, 5)
+
+    def test_empty_first_page_stops_the_crawl(self):
+        # Sau trang cuối máy chủ giả lập trả trang rỗng: không tải tiếp các trang sau
+        before = requests_served()
+        self.assertEqual(quiet_rows('nhựa', 'an giang', 8, 12), [])
+        self.assertEqual(requests_served() - before, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
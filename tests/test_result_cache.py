@@ -0,0 +1,184 @@
+"""Cache file kết quả của /crawl (trangvang.cache.ResultCache) và Excel gửi theo từng khối."""
+import csv
+import io
+import threading
+import time
+import unittest
+
+import app
+from tests import get_server, quiet, requests_served
+from trangvang.bench import load_fixtures
+from trangvang.cache import ResultCache
+from trangvang.export import EXCEL_BLOCK_SIZE, iter_excel
+from trangvang.parsers import get_parser
+
+
+def render_counter(chunks=(b'a', b'b', b'c')):
+    """render() trả về `chunks`, kèm list ghi lại số lần được gọi"""
+    calls = []
+
+    def render():
+        calls.append(1)
+        return iter(chunks)
+
+    return render, calls
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def test_hit_after_miss(self):
+        cache = ResultCache(ttl=60, max_bytes=1024)
+        render, calls = render_counter()
+        chunks, outcome = cache.get_or_render('k', render)
+        self.assertEqual((b''.join(chunks), outcome), (b'abc', 'miss'))
+        chunks, outcome = cache.get_or_render('k', render)
+        self.assertEqual((b''.join(chunks), outcome), (b'abc', 'hit'))
+        self.assertEqual(len(calls), 1)
+
+    def test_expired_result_is_rendered_again(self):
+        cache = ResultCache(ttl=0.1, max_bytes=1024)
+        render, calls = render_counter()
+        b''.join(cache.get_or_render('k', render)[0])
+        time.sleep(0.15)
+        chunks, outcome = cache.get_or_render('k', render)
+        self.assertEqual((b''.join(chunks), outcome, len(calls)), (b'abc', 'miss', 2))
+
+    def test_least_recently_used_result_is_evicted(self):
+        cache = ResultCache(ttl=60, max_bytes=6)
+        for key in ('a', 'b'):
+            b''.join(cache.get_or_render(key, render_counter()[0])[0])
+        self.assertEqual(cache.get_or_render('a', render_counter()[0])[1], 'hit')
+        b''.join(cache.get_or_render('c', render_counter()[0])[0])
+        self.assertEqual(cache.stats()['evicted'], 1)
+        self.assertEqual(cache.get_or_render('a', render_counter()[0])[1], 'hit')
+        self.assertEqual(cache.get_or_render('b', render_counter()[0])[1], 'miss')
+
+    def test_concurrent_requests_render_once(self):
+        cache = ResultCache(ttl=60, max_bytes=1024)
+        render, calls = render_counter()
+        first, outcome = cache.get_or_render('k', render)
+        self.assertEqual(outcome, 'miss')
+        waiter, outcome = cache.get_or_render('k', render)
+        self.assertEqual(outcome, 'coalesced')
+        received = []
+        thread = threading.Thread(target=lambda: received.append(b''.join(waiter)))
+        thread.start()
+        self.assertEqual(b''.join(first), b'abc')
+        thread.join(5)
+        self.assertEqual(received, [b'abc'])
+        self.assertEqual(len(calls), 1)
+
+    def test_close_releases_waiters(self):
+        cache = ResultCache(ttl=60, max_bytes=1024)
+        render, calls = render_counter()
+        first, outcome = cache.get_or_render('k', render)
+        waiter, outcome = cache.get_or_render('k', render)
+        received = []
+        thread = threading.Thread(target=lambda: received.append(b''.join(waiter)))
+        thread.start()
+        # Client của request đầu ngắt kết nối trước khi nhận hết
+        next(first)
+        first.close()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(received, [b'abc'])
+        self.assertEqual(len(calls), 2)
+
+    def test_incomplete_result_is_not_stored(self):
+        cache = ResultCache(ttl=60, max_bytes=1024)
+        render, calls = render_counter()
+        chunks, outcome = cache.get_or_render('k', render, complete=lambda: False)
+        self.assertEqual(b''.join(chunks), b'abc')
+        chunks, outcome = cache.get_or_render('k', render)
+        self.assertEqual(outcome, 'miss')
+
+    def test_oversized_result_is_streamed_not_stored(self):
+        cache = ResultCache(ttl=60, max_bytes=2)
+        render, calls = render_counter()
+        first, outcome = cache.get_or_render('k', render)
+        waiter, outcome = cache.get_or_render('k', render)
+        self.assertEqual(b''.join(first), b'abc')
+        self.assertEqual(b''.join(waiter), b'abc')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_waiter_renders_itself_after_timeout(self):
+        cache = ResultCache(ttl=60, max_bytes=1024, wait_timeout=0.1)
+        render, calls = render_counter()
+        first, outcome = cache.get_or_render('k', render)
+        waiter, outcome = cache.get_or_render('k', render)
+        with quiet():
+            self.assertEqual(b''.join(waiter), b'abc')
+        self.assertEqual(len(calls), 2)
+        first.close()
+
+
+class ExcelBlocksTest(unittest.TestCase):
+
+    def test_file_is_sent_in_bounded_blocks(self):
+        from openpyxl import load_workbook
+
+        parser = get_parser()
+        # Đủ dòng để file Excel lớn hơn vài khối
+        rows = [row for content in load_fixtures().values() for row in parser.parse(content)] * 20
+        blocks = list(iter_excel(rows))
+        self.assertGreater(len(blocks), 2)
+        self.assertTrue(all(len(block) <= EXCEL_BLOCK_SIZE for block in blocks))
+        self.assertTrue(all(len(block) == EXCEL_BLOCK_SIZE for block in blocks[:-1]))
+        sheet = load_workbook(io.BytesIO(b''.join(blocks)), read_only=True).active
+        self.assertEqual(sum(1 for row in sheet.iter_rows(values_only=True)), len(rows) + 1)
+        sheet.parent.close()
+
+    def test_nothing_is_written_before_iteration(self):
+        consumed = []
+
+        def rows():
+            consumed.append(1)
+            yield {'Tên Khách Hàng': 'A'}
+
+        blocks = iter_excel(rows(), block_size=100)
+        self.assertEqual(consumed, [])
+        self.assertEqual(len(next(blocks)), 100)
+        self.assertEqual(consumed, [1])
+        blocks.close()
+
+
+class CrawlResultCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        get_server()
+        cls.client = app.app.test_client()
+
+    def post(self, **form):
+        data = dict({'nganh_hang': 'nhựa', 'khu_vuc': 'thanh hóa', 'page_start': 1, 'page_end': 3,
+                     'export_type': 'csv'}, **form)
+        with quiet():
+            resp = self.client.post('/crawl', data=data)
+            body = resp.get_data()
+        return resp, body
+
+    def test_second_request_is_served_from_cache(self):
+        first, body = self.post()
+        self.assertEqual(first.headers['X-Result-Cache'], 'miss')
+        before = requests_served()
+        second, cached = self.post()
+        self.assertEqual(second.headers['X-Result-Cache'], 'hit')
+        self.assertEqual(requests_served(), before)
+        self.assertEqual(cached, body)
+        self.assertEqual(len(list(csv.reader(io.StringIO(cached.decode('utf-8-sig'))))),
+                         get_server().expected_rows(1, 3) + 1)
+
+    def test_options_are_part_of_the_key(self):
+        self.post(khu_vuc='nghệ an')
+        self.assertEqual(self.post(khu_vuc='nghệ an', normalize='1')[0].headers['X-Result-Cache'], 'miss')
+        self.assertEqual(self.post(khu_vuc='nghệ an', export_type='excel')[0].headers['X-Result-Cache'], 'miss')
+        self.assertEqual(self.post(khu_vuc='nghệ an', page_end=2)[0].headers['X-Result-Cache'], 'miss')
+
+    def test_incremental_crawl_is_not_cached(self):
+        resp, body = self.post(khu_vuc='hà tĩnh', incremental='1')
+        self.assertNotIn('X-Result-Cache', resp.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Dòng kết quả gọn (CompactRow) và RowBuffer ghi tạm ra đĩa (trangvang.rows)."""
+import unittest
+
+from tests import get_server, quiet
+from trangvang import crawler
+from trangvang.bench import load_fixtures
+from trangvang.dedup import dedup_rows
+from trangvang.export import iter_csv
+from trangvang.parsers import COLUMNS, ROW_FIELDS, get_parser
+from trangvang.rows import CompactRow, RowBuffer
+
+
+def fixture_rows():
+    parser = get_parser()
+    return [row for content in load_fixtures().values() for row in parser.parse(content)]
+
+
+class CompactRowTest(unittest.TestCase):
+
+    def test_reads_like_the_original_dict(self):
+        row = fixture_rows()[0]
+        compact = CompactRow.from_row(row)
+        self.assertEqual(compact.to_dict(), row)
+        self.assertEqual(dict(compact), row)
+        self.assertEqual(compact['Email'], row['Email'])
+        self.assertEqual(compact[0], row[ROW_FIELDS[0]])
+        self.assertEqual(compact.get('Mã số thuế', '-'), '-')
+        self.assertIn('Website', compact)
+        self.assertNotIn('Mã số thuế', compact)
+        self.assertEqual(list(compact.keys()), ROW_FIELDS)
+        with self.assertRaises(KeyError):
+            compact['Mã số thuế']
+
+    def test_missing_and_none_values_become_empty(self):
+        compact = CompactRow.from_row({'Tên Khách Hàng': 'A', 'Email': None})
+        self.assertEqual((compact['Email'], compact['Website']), ('', ''))
+
+    def test_works_with_export_and_dedup(self):
+        rows = fixture_rows()
+        compact = [CompactRow.from_row(row) for row in rows]
+        self.assertEqual(b''.join(iter_csv(compact)), b''.join(iter_csv(rows)))
+        with quiet():
+            self.assertEqual([dict(row) for row in dedup_rows(compact)], dedup_rows(rows))
+
+
+class RowBufferTest(unittest.TestCase):
+
+    def test_spills_old_rows_and_keeps_order(self):
+        rows = fixture_rows()
+        buffer = RowBuffer(spill_after=10)
+        self.addCleanup(buffer.close)
+        buffer.extend(rows)
+        self.assertEqual(len(buffer), len(rows))
+        self.assertEqual(buffer.spilled, len(rows) // 10 * 10)
+        self.assertLess(len(buffer._rows), 10)
+        # Duyệt lại được nhiều lần, mỗi lần đúng thứ tự đã thêm
+        for _ in range(2):
+            read = list(buffer)
+            self.assertEqual([row.to_dict() for row in read], rows)
+            self.assertTrue(all(isinstance(row, CompactRow) for row in read))
+
+    def test_no_spill_when_disabled(self):
+        buffer = RowBuffer(spill_after=0)
+        buffer.extend(fixture_rows())
+        self.assertEqual((buffer.spilled, buffer._file), (0, None))
+        self.assertEqual(len(list(buffer)), len(buffer))
+
+    def test_close_removes_everything(self):
+        buffer = RowBuffer(spill_after=5)
+        buffer.extend(fixture_rows()[:12])
+        buffer.close()
+        self.assertEqual((len(buffer), list(buffer)), (0, []))
+
+
+class CrawlSpillTest(unittest.TestCase):
+
+    def test_crawl_rows_are_the_same_with_spill(self):
+        server = get_server()
+        with quiet():
+            kept = crawler.crawl('nhựa', 'thái bình', 1, 5, spill_after=0)[0]
+            spilled = crawler.crawl('nhựa', 'thái bình', 1, 5, spill_after=7)[0]
+        self.addCleanup(spilled.close)
+        self.assertEqual(len(spilled), server.expected_rows(1, 5))
+        self.assertGreater(spilled.spilled, 0)
+        self.assertEqual(list(spilled), list(kept))
+        self.assertEqual(b''.join(iter_csv(spilled, COLUMNS)), b''.join(iter_csv(kept, COLUMNS)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Session HTTP dùng chung: giữ kết nối, retry có backoff và Retry-After (trangvang.session)."""
+import socket
+import time
+import unittest
+from email.utils import formatdate
+
+from tests import standin
+from trangvang.fetcher import HostLimiter
+from trangvang.session import HttpClient, parse_retry_after
+
+
+def page_url(server, page=1):
+    return f"{server.base_url}srch/long-an/nhua.html?page={page}"
+
+
+def client(**kwargs):
+    """HttpClient riêng, không đụng tới giới hạn tải dùng chung của các test khác"""
+    kwargs.setdefault('backoff', 0.001)
+    return HttpClient(limiter=HostLimiter(rate=1000), **kwargs)
+
+
+class RetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertEqual(parse_retry_after('-5'), 0.0)
+
+    def test_http_date(self):
+        self.assertAlmostEqual(parse_retry_after(formatdate(time.time() + 30, usegmt=True)), 30, delta=2)
+        self.assertEqual(parse_retry_after(formatdate(time.time() - 30, usegmt=True)), 0.0)
+
+    def test_missing_or_invalid(self):
+        for value in (None, '', 'sau một lát'):
+            with self.subTest(value=value):
+                self.assertIsNone(parse_retry_after(value))
+
+
+class HttpClientTest(unittest.TestCase):
+
+    def test_keeps_connection_alive(self):
+        http = client()
+        with standin(pages=3, latency=0) as server:
+            for page in (1, 2, 3):
+                self.assertEqual(http.get(page_url(server, page)).status_code, 200)
+        stats = http.stats()
+        self.assertEqual((stats['connections_opened'], stats['connections_reused']), (1, 2))
+        self.assertIn('gzip', http.session.headers['Accept-Encoding'])
+
+    def test_retries_server_errors_then_returns_last_response(self):
+        http = client(max_retries=2)
+        with standin(latency=0, error_rate=1.0) as server:
+            resp = http.get(page_url(server))
+            self.assertEqual(server.stats()['statuses'], {'503': 3})
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(http.stats()['retries'], 2)
+
+    def test_waits_for_retry_after(self):
+        http = client(max_retries=1)
+        with standin(latency=0, throttle_rate=1.0, retry_after=1) as server:
+            start = time.monotonic()
+            resp = http.get(page_url(server))
+            elapsed = time.monotonic() - start
+            self.assertEqual(server.stats()['requests'], 2)
+        self.assertEqual(resp.status_code, 429)
+        self.assertGreaterEqual(elapsed, 0.95)
+
+    def test_retry_after_is_capped_by_max_backoff(self):
+        http = client(max_retries=1, max_backoff=0.05)
+        with standin(latency=0, throttle_rate=1.0, retry_after=30) as server:
+            start = time.monotonic()
+            http.get(page_url(server))
+            self.assertLess(time.monotonic() - start, 1)
+
+    def test_connection_errors_are_retried_then_raised(self):
+        import requests
+
+        # Cổng vừa được cấp rồi đóng lại: không có gì lắng nghe
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        http = client(max_retries=2)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            http.get(f'http://127.0.0.1:{port}/srch/long-an/nhua.html')
+        stats = http.stats()
+        self.assertEqual((stats['requests'], stats['retries'], stats['errors']), (3, 2, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
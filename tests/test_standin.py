@@ -0,0 +1,68 @@
+"""Máy chủ giả lập Trang Vàng mà các test khác dùng thay trang thật (trangvang.standin)."""
+import json
+import unittest
+import urllib.error
+import urllib.request
+
+from trangvang.parsers import get_parser
+from trangvang.standin import EMPTY_PAGE, StandinServer
+
+
+def get(url):
+    """(status, header, nội dung) của một request GET"""
+    try:
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        with e:
+            return e.code, e.headers, e.read()
+
+
+class StandinServerTest(unittest.TestCase):
+
+    def start(self, **kwargs):
+        server = StandinServer(latency=0, **kwargs)
+        server.start()
+        self.addCleanup(server.stop)
+        return server
+
+    def test_paging_matches_configured_pages(self):
+        server = self.start(pages=3)
+        parser = get_parser()
+        rows, info = parser.parse_page(server.page_body(1))
+        self.assertEqual(info, {'last_page': 3, 'total_results': server.expected_rows(1, 3)})
+        self.assertEqual(server.page_body(4), EMPTY_PAGE)
+        self.assertEqual(server.expected_rows(3, 10), server.expected_rows(3, 3))
+        # Link tới trang nguồn được trỏ về máy chủ giả lập
+        self.assertNotIn(b'https://trangvangvietnam.com/', server.page_body(2))
+
+    def test_search_pages_and_stats(self):
+        server = self.start(pages=2)
+        status, headers, body = get(f"{server.base_url}srch/long-an/nhua.html?page=2")
+        self.assertEqual((status, body), (200, server.page_body(2)))
+        self.assertEqual(headers['Content-Type'], 'text/html; charset=utf-8')
+        self.assertEqual(get(f"{server.base_url}khong-co")[0], 404)
+        status, headers, body = get(f"{server.base_url}__stats")
+        self.assertEqual(json.loads(body), {'requests': 2, 'statuses': {'200': 1, '404': 1}, 'max_in_flight': 1})
+
+    def test_throttled_responses_carry_retry_after(self):
+        server = self.start(throttle_rate=1.0, retry_after=7)
+        status, headers, body = get(f"{server.base_url}srch/long-an/nhua.html")
+        self.assertEqual((status, headers['Retry-After']), (429, '7'))
+        server.throttle_rate, server.error_rate = 0.0, 1.0
+        status, headers, body = get(f"{server.base_url}srch/long-an/nhua.html")
+        self.assertEqual((status, headers['Retry-After']), (503, None))
+        self.assertEqual(server.stats()['statuses'], {'429': 1, '503': 1})
+
+    def test_faults_are_reproducible_with_a_seed(self):
+        def statuses():
+            server = self.start(throttle_rate=0.3, error_rate=0.2, seed=5)
+            return [get(f"{server.base_url}srch/a/b.html")[0] for _ in range(10)]
+
+        first = statuses()
+        self.assertEqual(statuses(), first)
+        self.assertEqual(set(first), {200, 429, 503})
+
+
+if __name__ == '__main__':
+    unittest.main()
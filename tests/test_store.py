@@ -0,0 +1,101 @@
+"""Kho công ty SQLite: gộp trùng theo khóa chuẩn hóa và crawl lại tăng dần (trangvang.store)."""
+import csv
+import io
+import unittest
+
+import app
+from tests import get_server, quiet_rows, temp_path
+from trangvang.crawler import query_key
+from trangvang.bench import load_fixtures
+from trangvang.parsers import COLUMNS, get_parser
+from trangvang.store import CompanyStore, content_hash, row_keys
+
+
+def fixture_rows(name='debug_trangvang.html'):
+    return get_parser().parse(load_fixtures()[name])
+
+
+def setUpModule():
+    get_server()
+
+
+class CompanyStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = CompanyStore(temp_path('companies.sqlite3'))
+
+    def test_row_keys_are_normalized(self):
+        row = {'Tên Khách Hàng': 'Công Ty TNHH Nhựa Á Đông', 'Số điện thoại': '(028) 3960 5688, 0969.851.551',
+               'Email': ' Info@Example.com ', 'Website': 'http://www.example.com/'}
+        self.assertEqual(row_keys(row), [('phone', '02839605688'), ('phone', '0969851551'),
+                                         ('email', 'info@example.com'), ('website', 'example.com'),
+                                         ('name', 'cong ty tnhh nhua a dong')])
+
+    def test_content_hash_ignores_extra_columns(self):
+        row = fixture_rows()[0]
+        self.assertEqual(content_hash(row), content_hash(dict(row, **{'Mã số thuế': '0301234567'})))
+        self.assertNotEqual(content_hash(row), content_hash(dict(row, Email='khac@example.com')))
+
+    def test_upsert_statuses(self):
+        rows = fixture_rows()[:3]
+        self.assertEqual(self.store.upsert_many(rows), ['new'] * 3)
+        self.assertEqual(self.store.upsert_many(rows), ['unchanged'] * 3)
+        changed = dict(rows[0], Email='moi@example.com')
+        self.assertEqual(self.store.upsert_many([changed]), ['changed'])
+        self.assertEqual(self.store.count(), 3)
+
+    def test_same_company_matched_by_any_key(self):
+        row = fixture_rows()[0]
+        self.store.upsert_many([row])
+        # Tên khác, cùng số điện thoại: vẫn là công ty đã có
+        renamed = dict(row, **{'Tên Khách Hàng': 'Tên mới', 'Email': ''})
+        self.assertEqual(self.store.upsert_many([renamed]), ['changed'])
+        self.assertEqual(self.store.count(), 1)
+
+    def test_company_with_several_cards_is_unchanged_on_recrawl(self):
+        # Cùng một công ty (vd Nhựa Tứ Hưng) hiện trên nhiều trang mẫu với nội dung thẻ khác nhau
+        parser = get_parser()
+        rows = [row for content in load_fixtures().values() for row in parser.parse(content)]
+        variants = {}
+        for row in rows:
+            variants.setdefault(row_keys(row)[0], set()).add(content_hash(row))
+        self.assertTrue(any(len(hashes) > 1 for hashes in variants.values()))
+        self.store.upsert_many(rows)
+        self.assertEqual(set(self.store.upsert_many(rows)), {'unchanged'})
+
+    def test_rows_by_query(self):
+        rows = fixture_rows()
+        self.store.upsert_many(rows[:2], query_key('nhựa', 'long an'))
+        self.store.upsert_many(rows[2:5], query_key('nhựa', 'hồ chí minh'))
+        self.assertEqual(len(list(self.store.iter_rows())), 5)
+        saved = list(self.store.iter_rows('nhựa', 'long an'))
+        self.assertEqual([row['Tên Khách Hàng'] for row in saved], [row['Tên Khách Hàng'] for row in rows[:2]])
+        self.assertEqual(list(saved[0]), COLUMNS)
+
+    def test_incremental_recrawl_exports_nothing_new(self):
+        # Máy chủ giả lập xoay vòng các trang mẫu nên ngay lượt đầu đã có đơn vị lặp lại
+        first = quiet_rows('nhựa', 'đồng nai', 1, 5, store=self.store, incremental=True)
+        self.assertTrue(0 < len(first) < get_server().expected_rows(1, 5))
+        self.assertEqual(quiet_rows('nhựa', 'đồng nai', 1, 5, store=self.store, incremental=True), [])
+
+    def test_full_crawl_still_fills_the_store(self):
+        rows = quiet_rows('nhựa', 'kiên giang', 1, 2, store=self.store)
+        self.assertEqual(len(rows), get_server().expected_rows(1, 2))
+        self.assertEqual(len(list(self.store.iter_rows('nhựa', 'kiên giang'))), self.store.count())
+
+
+class ExportRouteTest(unittest.TestCase):
+
+    def test_export_reads_the_store_without_crawling(self):
+        client = app.app.test_client()
+        quiet_rows('nhựa', 'sóc trăng', 1, 2, store=app.get_store())
+        before = get_server().stats()['requests']
+        resp = client.get('/export', query_string={'nganh_hang': 'nhựa', 'khu_vuc': 'sóc trăng', 'export_type': 'csv'})
+        rows = list(csv.reader(io.StringIO(resp.get_data().decode('utf-8-sig'))))
+        self.assertEqual(rows[0], COLUMNS)
+        self.assertEqual(len(rows) - 1, len(list(app.get_store().iter_rows('nhựa', 'sóc trăng'))))
+        self.assertEqual(get_server().stats()['requests'], before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Phân tích trang trong lúc tải (parse_stream, TRANGVANG_STREAM_PARSE=1) cho kết quả như phân tích cả trang."""
+import unittest
+from unittest import mock
+
+from tests import get_server, quiet_rows
+from trangvang import settings
+from trangvang.bench import load_fixtures
+from trangvang.parsers import get_parser
+
+CHUNK_SIZES = (7, 100, 1024, 16 * 1024, 10 ** 7)
+
+
+def chunked(content, size):
+    return [content[start:start + size] for start in range(0, len(content), size)]
+
+
+class ParseStreamTest(unittest.TestCase):
+
+    def test_same_rows_and_paging_as_parse_page(self):
+        parser = get_parser('lxml')
+        for fixture, content in load_fixtures().items():
+            expected = parser.parse_page(content)
+            for size in CHUNK_SIZES:
+                with self.subTest(fixture=fixture, chunk_size=size):
+                    stream = parser.parse_stream(iter(chunked(content, size)))
+                    rows = list(stream)
+                    self.assertEqual((rows, stream.info), expected)
+
+    def test_bs4_reads_the_whole_page_first(self):
+        parser = get_parser('bs4')
+        for fixture, content in load_fixtures().items():
+            with self.subTest(fixture=fixture):
+                stream = parser.parse_stream(iter(chunked(content, 1024)))
+                rows = list(stream)
+                self.assertEqual((rows, stream.info), parser.parse_page(content))
+
+    def test_literal_ampersand_split_between_chunks(self):
+        parser = get_parser('lxml')
+        content = load_fixtures()['debug_trangvang.html']
+        # Cắt ngay sau mỗi dấu '&' của trang (vd '462 & 466 Hồng Bàng')
+        cuts = [0] + [index + 1 for index in range(len(content)) if content[index:index + 1] == b'&'] + [len(content)]
+        self.assertGreater(len(cuts), 2)
+        chunks = [content[start:end] for start, end in zip(cuts, cuts[1:])]
+        self.assertEqual(list(parser.parse_stream(iter(chunks))), parser.parse(content))
+
+    def test_rows_come_before_the_page_is_fully_read(self):
+        content = load_fixtures()['debug_trangvang.html']
+        chunks = chunked(content, 1024)
+        read = []
+
+        def source():
+            for chunk in chunks:
+                read.append(chunk)
+                yield chunk
+
+        rows = iter(get_parser('lxml').parse_stream(source()))
+        next(rows)
+        self.assertLess(len(read), len(chunks) // 2)
+
+    def test_empty_page(self):
+        stream = get_parser('lxml').parse_stream(iter([b'']))
+        self.assertEqual(list(stream), [])
+        self.assertEqual(stream.info, get_parser('lxml').parse_page(b'')[1])
+
+
+class StreamedCrawlTest(unittest.TestCase):
+
+    def test_streamed_crawl_matches_normal_crawl(self):
+        server = get_server()
+        for name in ('lxml', 'bs4'):
+            with self.subTest(parser=name):
+                normal = quiet_rows('nhựa', 'gia lai', 1, 5, name)
+                with mock.patch.object(settings, 'STREAM_PARSE', True):
+                    streamed = quiet_rows('nhựa', 'gia lai', 1, 5, name)
+                self.assertEqual(len(streamed), server.expected_rows(1, 5))
+                self.assertEqual(streamed, normal)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1 @@
+"""Các thành phần dùng chung cho crawler Trang Vàng (tải trang, giới hạn tốc độ...)."""
@@ -0,0 +1,167 @@
+"""Crawl nhiều truy vấn (ngành hàng × khu vực) trong một lượt và gộp thành một kết quả.
+
+Trang của mọi truy vấn được xếp xen kẽ (round-robin) vào cùng một hàng đợi tải,
+nên truy vấn nhiều trang không chặn các truy vấn khác; tốc độ tới trang nguồn
+vẫn do LIMITER dùng chung quyết định. Công ty trùng giữa các truy vấn được gộp
+bằng CompanyDeduplicator (kể cả tên viết hơi khác), cột 'Truy vấn' ghi các truy
+vấn đã gặp.
+"""
+from .cache import get_cache
+from .crawler import (CrawlPlan, fetch_pages, parse_pages, parse_stage, print_stats, query_key, search_url,
+                      stream_parser)
+from .dedup import CompanyDeduplicator
+from .metrics import CRAWLS_IN_FLIGHT
+from .parsers import COLUMNS, get_parser
+from .session import get_client
+
+QUERY_COLUMN = 'Truy vấn'
+BATCH_COLUMNS = COLUMNS + [QUERY_COLUMN]
+
+
+class BatchQuery:
+    """Một truy vấn trong lượt crawl nhiều truy vấn"""
+
+    def __init__(self, nganh_hang, khu_vuc, page_start=1, page_end=10):
+        self.nganh_hang = nganh_hang
+        self.khu_vuc = khu_vuc
+        self.key = query_key(nganh_hang, khu_vuc)
+        self.label = f"{nganh_hang} - {khu_vuc}"
+        self.plan = CrawlPlan(page_start, page_end)
+        # Đã gặp trang rỗng, không tải thêm trang nào của truy vấn này
+        self.done = False
+
+    def url(self, page):
+        return search_url(self.nganh_hang, self.khu_vuc, page)
+
+
+def page_number(value, name):
+    """Số trang từ form/JSON; ValueError (kèm tên trường) nếu không phải số nguyên"""
+    if isinstance(value, bool):
+        raise ValueError(f"{name} không phải số trang: {value!r}")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} không phải số trang: {value!r}")
+
+
+def parse_queries(text, page_start=1, page_end=10):
+    """Đọc danh sách truy vấn, mỗi dòng 'ngành hàng | khu vực | trang đầu-trang cuối'.
+
+    Phần trang có thể bỏ (dùng page_start/page_end) hoặc chỉ ghi một số trang cuối.
+    Dòng thiếu ngành hàng hoặc khu vực bị bỏ qua; số trang sai thì ném ValueError.
+    """
+    queries = []
+    for number, line in enumerate((text or '').splitlines(), 1):
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            continue
+        start, end = page_start, page_end
+        if len(parts) > 2 and parts[2]:
+            bounds = parts[2].split('-', 1)
+            if len(bounds) == 2:
+                start = page_number(bounds[0].strip(), f"Dòng {number}: trang đầu")
+                end = page_number(bounds[1].strip(), f"Dòng {number}: trang cuối")
+            else:
+                end = page_number(bounds[0].strip(), f"Dòng {number}: trang cuối")
+        queries.append(BatchQuery(parts[0], parts[1], start, end))
+    return queries
+
+
+def parse_json_queries(data):
+    """Đọc truy vấn từ body JSON {"queries": [{"nganh_hang", "khu_vuc", "page_start", "page_end"}, ...]}.
+
+    Ném ValueError nếu body sai dạng, truy vấn thiếu ngành hàng/khu vực hoặc số trang sai.
+    """
+    items = data.get('queries', []) if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        raise ValueError('Body JSON phải có dạng {"queries": [...]}')
+    queries = []
+    for number, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            raise ValueError(f"Truy vấn {number} phải là object JSON")
+        nganh_hang, khu_vuc = item.get('nganh_hang'), item.get('khu_vuc')
+        if not isinstance(nganh_hang, str) or not isinstance(khu_vuc, str) \
+                or not nganh_hang.strip() or not khu_vuc.strip():
+            raise ValueError(f"Truy vấn {number} thiếu nganh_hang hoặc khu_vuc")
+        queries.append(BatchQuery(nganh_hang.strip(), khu_vuc.strip(),
+                                  page_number(item.get('page_start', 1), f"Truy vấn {number}: page_start"),
+                                  page_number(item.get('page_end', 10), f"Truy vấn {number}: page_end")))
+    return queries
+
+
+def _round_robin(queries):
+    """(query, page) xen kẽ giữa các truy vấn: trang thứ hai của mọi truy vấn, rồi trang thứ ba...
+
+    Sinh lười nên truy vấn vừa gặp trang rỗng không được xếp thêm trang.
+    """
+    offset = 1
+    while True:
+        scheduled = False
+        for query in queries:
+            page = query.plan.page_start + offset
+            if query.done or page > query.plan.page_stop:
+                continue
+            scheduled = True
+            yield query, page
+        if not scheduled:
+            return
+        offset += 1
+
+
+def crawl_batch(queries, parser=None, workers=8, store=None, on_plan=None, on_page=None, parse_workers=None):
+    """Crawl mọi truy vấn trên một nhóm worker dùng chung, trả về danh sách công ty đã gộp trùng.
+
+    Trang đầu của mọi truy vấn được tải trước để lập CrawlPlan cho từng truy vấn
+    (`on_plan(query)`), sau đó các trang còn lại được tải xen kẽ.
+    `on_page(query, page, so_dong)` được gọi sau mỗi trang. Có `store` thì mỗi
+    trang được ghi vào kho với khóa truy vấn của nó.
+    """
+    parser = get_parser(parser)
+    client = get_client()
+    cache = get_cache()
+    dedup = CompanyDeduplicator()
+    total = 0
+
+    def handle(query, page, rows):
+        nonlocal total
+        print(f"[{query.label}] Trang {page}: tìm thấy {len(rows)} mục")
+        if on_page is not None:
+            on_page(query, page, len(rows))
+        if not rows:
+            query.done = True
+            return
+        if store is not None:
+            store.upsert_many(rows, query.key)
+        total += len(rows)
+        for row in rows:
+            dedup.add(row, query.label)
+
+    CRAWLS_IN_FLIGHT.inc()
+    try:
+        firsts = [query for query in queries if query.plan.page_start <= query.plan.page_end]
+        parsed = {}
+        pages = fetch_pages(firsts, lambda query: query.url(query.plan.page_start), workers, client, cache,
+                            stream_parser(parser))
+        for query, rows, info in parse_pages(pages, parser):
+            query.plan.update(query.plan.page_start, info, len(rows))
+            parsed[query] = rows
+        for query in firsts:
+            if on_plan is not None:
+                on_plan(query)
+            if query in parsed:
+                handle(query, query.plan.page_start, parsed[query])
+
+        items = _round_robin(queries)
+        pages = fetch_pages(items, lambda item: item[0].url(item[1]), workers, client, cache,
+                            stream_parser(parser))
+        for (query, page), rows, info in parse_stage(pages, parser, parse_workers):
+            # Trang đã được tải trước khi truy vấn gặp trang rỗng
+            if not query.done:
+                handle(query, page, rows)
+    finally:
+        CRAWLS_IN_FLIGHT.dec()
+        print_stats(client, cache)
+
+    results = dedup.results(QUERY_COLUMN)
+    print(f"Tổng số mục tìm được: {total}, sau khi gộp trùng: {len(results)} ({dedup.comparisons} lần so sánh)")
+    return results
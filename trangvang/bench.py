@@ -0,0 +1,372 @@
+"""Benchmark bộ phân tích trên các trang mẫu có sẵn trong repo.
+
+Với mỗi engine (lxml, bs4): số trang/giây, số đơn vị/giây, thời gian của từng
+bước (dựng cây, chọn đơn vị, trích từng trường) và bộ nhớ đỉnh. Kết quả được so
+với baseline đã lưu: thoát với mã 1 nếu throughput giảm quá ngưỡng hoặc các
+dòng trích xuất được khác baseline.
+
+    python -m trangvang.bench                  # chạy và so với baseline
+    python -m trangvang.bench --save           # ghi lại baseline
+    python -m trangvang.bench --parser lxml --threshold 0.3
+    python -m trangvang.bench --workers 1 2 4  # thêm throughput qua process pool
+    python -m trangvang.bench --normalize      # chuẩn hóa từng dòng so với normalize_rows
+    python -m trangvang.bench --stream         # phân tích theo từng khúc so với cả trang
+
+Engine lxml trích mọi trường trong một lần duyệt cây con nên chỉ có thời gian
+chung cho bước trích xuất.
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from .crawler import STREAM_CHUNK_SIZE
+from .parsers import (LISTING_SELECTOR, LISTINGS_XPATH, NAME_SELECTOR, PARSERS, _escape_literal_charrefs,
+                      _extract_listing, extract_addresses, extract_contact_info, extract_description,
+                      extract_phones, get_parser)
+from .normalize import (AREA_CODES, NORMALIZED_COLUMNS, lower_host, normalize_email, normalize_rows,
+                        province_key, split_address, to_e164)
+from .pipeline import parse_in_pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = (
+    'debug_trangvang.html',
+    'debugtrangvàng.html',
+    'nhựa các công ty nhựa ở tại long an(page ).html',
+    'nhựa ở hồ chí minh - danh sách các công ty nhựa ở hồ chí minh.html',
+)
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+# Throughput thấp hơn baseline quá tỷ lệ này thì coi là chậm đi
+DEFAULT_THRESHOLD = 0.25
+
+
+def load_fixtures(root=ROOT):
+    """Nội dung (bytes) các trang mẫu theo tên file"""
+    fixtures = {}
+    for name in FIXTURES:
+        with open(os.path.join(root, name), 'rb') as f:
+            fixtures[name] = f.read()
+    return fixtures
+
+
+def rows_digest(rows):
+    data = json.dumps(rows, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def throughput(parser_name, fixtures, rounds=5):
+    """Lấy vòng nhanh nhất trong `rounds` vòng phân tích toàn bộ trang mẫu"""
+    parser = get_parser(parser_name)
+    best = None
+    listings = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        listings = sum(len(parser.parse(content, 'utf-8')) for content in fixtures.values())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        'pages_per_sec': round(len(fixtures) / best, 2),
+        'listings_per_sec': round(listings / best, 1),
+        'ms_per_page': round(best * 1000 / len(fixtures), 3),
+    }
+
+
+def pool_throughput(parser_name, fixtures, workers, repeat=8):
+    """Số trang/giây khi phân tích trên process pool `workers` process (pipeline của crawler)"""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    pages = [(index, name, SimpleNamespace(content=content, encoding='utf-8'))
+             for index, (name, content) in enumerate(list(fixtures.items()) * repeat)]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        # Khởi động process và nạp engine trước khi đo
+        list(parse_in_pool(pages[:workers], parser_name, pool, workers * 2))
+        start = time.perf_counter()
+        parsed = list(parse_in_pool(iter(pages), parser_name, pool, workers * 2))
+        elapsed = time.perf_counter() - start
+    return round(len(parsed) / elapsed, 2)
+
+
+def _normalize_row(row):
+    """Chuẩn hóa từng dòng một, không nhớ giá trị đã gặp (để so với normalize_rows)"""
+    parts = split_address(row['Địa chỉ'])
+    if not parts[3] and row['Địa chỉ bổ sung']:
+        parts = split_address(row['Địa chỉ bổ sung'].split('Việt Nam', 1)[0])
+    area_code = AREA_CODES.get(province_key(parts[3]))
+    numbers = (to_e164(phone, area_code) for phone in row['Số điện thoại'].split(','))
+    phones = ', '.join(dict.fromkeys(number for number in numbers if number))
+    row = dict(row, Email=normalize_email(row['Email']), Website=lower_host(row['Website']))
+    row.update(zip(NORMALIZED_COLUMNS, (phones,) + parts))
+    return row
+
+
+def normalize_throughput(fixtures, copies=200, rounds=3):
+    """Số dòng/giây khi chuẩn hóa các dòng của trang mẫu (lặp lại `copies` lần, như khi
+    cùng công ty xuất hiện ở nhiều trang/truy vấn): từng dòng một và normalize_rows"""
+    parser = get_parser()
+    rows = [row for content in fixtures.values() for row in parser.parse(content, 'utf-8')] * copies
+    result = {}
+    for name, func in (('per_row', lambda: [_normalize_row(row) for row in rows]),
+                       ('batch', lambda: list(normalize_rows(rows)))):
+        best = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            output = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        result[name] = {'rows_per_sec': round(len(rows) / best), 'digest': rows_digest(output)}
+    return result
+
+
+def _chunks(content, chunk_size):
+    return (content[start:start + chunk_size] for start in range(0, len(content), chunk_size))
+
+
+def stream_stats(fixtures, chunk_size=STREAM_CHUNK_SIZE, rounds=5):
+    """Phân tích theo từng khúc `chunk_size` byte so với phân tích cả trang (engine lxml):
+    ms mỗi trang tới dòng đầu tiên và tới hết trang, lấy vòng nhanh nhất"""
+    parser = get_parser('lxml')
+    result = {}
+    for name in ('batch', 'stream'):
+        best = None
+        for _ in range(rounds):
+            first = total = 0.0
+            output = []
+            for content in fixtures.values():
+                start = time.perf_counter()
+                if name == 'batch':
+                    rows = parser.parse(content, 'utf-8')
+                    # Cả trang phải phân tích xong mới có dòng đầu tiên
+                    first += time.perf_counter() - start
+                else:
+                    rows = []
+                    for row in parser.parse_stream(_chunks(content, chunk_size), 'utf-8'):
+                        if not rows:
+                            first += time.perf_counter() - start
+                        rows.append(row)
+                total += time.perf_counter() - start
+                output.extend(rows)
+            if best is None or total < best[1]:
+                best = (first, total)
+        result[name] = {
+            'ms_to_first_row': round(best[0] * 1000 / len(fixtures), 3),
+            'ms_per_page': round(best[1] * 1000 / len(fixtures), 3),
+            'memory': peak_memory('lxml', stream=name == 'stream'),
+            'digest': rows_digest(output),
+        }
+    return result
+
+
+def _timed(costs, stage, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    costs[stage] = costs.get(stage, 0.0) + time.perf_counter() - start
+    return result
+
+
+def _bs4_stages(content, costs):
+    from bs4 import BeautifulSoup
+
+    text = _timed(costs, 'decode', content.decode, 'utf-8', 'replace')
+    soup = _timed(costs, 'parse', BeautifulSoup, text, 'html.parser')
+    comps = _timed(costs, 'select', soup.select, LISTING_SELECTOR)
+    for comp in comps:
+        _timed(costs, 'name', comp.select_one, NAME_SELECTOR)
+        _timed(costs, 'phones', extract_phones, comp)
+        _timed(costs, 'addresses', extract_addresses, comp)
+        _timed(costs, 'email+website', extract_contact_info, comp)
+        _timed(costs, 'description', extract_description, comp)
+
+
+def _lxml_stages(content, costs):
+    from lxml import etree
+    from lxml import html as lxml_html
+
+    parser = lxml_html.HTMLParser(encoding='utf-8')
+    content = _timed(costs, 'escape', _escape_literal_charrefs, content)
+    root = _timed(costs, 'parse', etree.fromstring, content, parser)
+    comps = _timed(costs, 'select', LISTINGS_XPATH, root)
+    for comp in comps:
+        _timed(costs, 'extract', _extract_listing, comp)
+
+
+_STAGES = {'bs4': _bs4_stages, 'lxml': _lxml_stages}
+
+
+def stage_costs(parser_name, fixtures, rounds=3):
+    """Thời gian trung bình (ms mỗi trang) của từng bước trong pipeline"""
+    costs = {}
+    for _ in range(rounds):
+        for content in fixtures.values():
+            _STAGES[parser_name](content, costs)
+    pages = rounds * len(fixtures)
+    return {stage: round(seconds * 1000 / pages, 3) for stage, seconds in costs.items()}
+
+
+def peak_memory(parser_name, stream=False):
+    """Bộ nhớ đỉnh khi phân tích một lượt trang mẫu, đo trong process riêng.
+
+    tracemalloc chỉ thấy bộ nhớ Python; cây của libxml2 nằm ngoài nên đo thêm
+    mức tăng RSS đỉnh so với lúc vừa nạp xong trang mẫu. `stream` thì phân tích
+    bằng parse_stream theo từng khúc.
+    """
+    command = [sys.executable, '-m', 'trangvang.bench', '--memory-probe', parser_name]
+    proc = subprocess.run(command + ['--stream'] if stream else command, cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip())
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _memory_probe(parser_name, stream=False):
+    import resource
+
+    fixtures = load_fixtures()
+    parser = get_parser(parser_name)
+    # Trang rỗng để nạp trước module import lười (bs4) mà không tính cây của trang mẫu
+    parser.parse(b'<html><body></body></html>', 'utf-8')
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    for content in fixtures.values():
+        if stream:
+            list(parser.parse_stream(_chunks(content, STREAM_CHUNK_SIZE), 'utf-8'))
+        else:
+            parser.parse(content, 'utf-8')
+    python_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'python_peak_kb': round(python_peak / 1024, 1),
+        # ru_maxrss tính bằng KB trên Linux
+        'rss_growth_kb': rss_after - rss_before,
+    }))
+
+
+def run(parsers, rounds=5, workers=()):
+    """Chạy benchmark, trả về dict kết quả (cùng dạng với baseline)"""
+    fixtures = load_fixtures()
+    result = {'parsers': {}}
+    for name in parsers:
+        parser = get_parser(name)
+        digests = {}
+        for fixture, content in fixtures.items():
+            rows = parser.parse(content, 'utf-8')
+            digests[fixture] = {'listings': len(rows), 'digest': rows_digest(rows)}
+        stats = throughput(name, fixtures, rounds)
+        stats['stages_ms_per_page'] = stage_costs(name, fixtures)
+        stats['memory'] = peak_memory(name)
+        stats['rows'] = digests
+        if workers:
+            stats['pool_pages_per_sec'] = {str(count): pool_throughput(name, fixtures, count) for count in workers}
+        result['parsers'][name] = stats
+    return result
+
+
+def compare(result, baseline, threshold=DEFAULT_THRESHOLD):
+    """Danh sách lỗi khi so với baseline (rỗng nếu đạt)"""
+    failures = []
+    for name, stats in result['parsers'].items():
+        base = baseline.get('parsers', {}).get(name)
+        if base is None:
+            print(f"Chưa có baseline cho engine {name}")
+            continue
+        for fixture, rows in stats['rows'].items():
+            expected = base['rows'].get(fixture)
+            if expected is not None and rows != expected:
+                failures.append(f"{name}: dòng trích xuất từ '{fixture}' khác baseline "
+                                f"({rows['listings']} so với {expected['listings']} đơn vị)")
+        for metric in ('pages_per_sec', 'listings_per_sec'):
+            floor = base[metric] * (1 - threshold)
+            if stats[metric] < floor:
+                failures.append(f"{name}: {metric} = {stats[metric]} thấp hơn baseline {base[metric]} "
+                                f"quá {threshold:.0%}")
+    return failures
+
+
+def print_report(result, baseline=None):
+    for name, stats in result['parsers'].items():
+        base = (baseline or {}).get('parsers', {}).get(name, {})
+        print(f"== {name}")
+        for metric in ('pages_per_sec', 'listings_per_sec', 'ms_per_page'):
+            note = f" (baseline {base[metric]})" if metric in base else ''
+            print(f"  {metric:18} {stats[metric]}{note}")
+        print('  ms mỗi trang theo bước: '
+              + ', '.join(f"{stage} {ms}" for stage, ms in stats['stages_ms_per_page'].items()))
+        if 'pool_pages_per_sec' in stats:
+            print('  trang/giây qua process pool: '
+                  + ', '.join(f"{count} process {rate}" for count, rate in stats['pool_pages_per_sec'].items()))
+        memory = stats['memory']
+        print(f"  bộ nhớ đỉnh: Python {memory['python_peak_kb']} KB, RSS tăng {memory['rss_growth_kb']} KB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--parser', action='append', choices=sorted(PARSERS),
+                        help='engine cần đo (mặc định: tất cả)')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='mức giảm throughput tối đa so với baseline (0.25 = 25%%)')
+    parser.add_argument('--workers', type=int, nargs='*', default=(),
+                        help='đo thêm throughput qua process pool với các số process này')
+    parser.add_argument('--normalize', action='store_true',
+                        help='chỉ đo chuẩn hóa: từng dòng một so với normalize_rows')
+    parser.add_argument('--stream', action='store_true',
+                        help='chỉ đo phân tích theo từng khúc (parse_stream) so với phân tích cả trang')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help='ghi kết quả lần này làm baseline')
+    parser.add_argument('--memory-probe', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.memory_probe:
+        _memory_probe(args.memory_probe, args.stream)
+        return 0
+    if args.stream:
+        result = stream_stats(load_fixtures(), rounds=args.rounds)
+        for name, stats in result.items():
+            memory = stats['memory']
+            print(f"  {name:8} dòng đầu tiên sau {stats['ms_to_first_row']} ms, cả trang {stats['ms_per_page']} ms, "
+                  f"bộ nhớ đỉnh: Python {memory['python_peak_kb']} KB, RSS tăng {memory['rss_growth_kb']} KB")
+        same = result['stream']['digest'] == result['batch']['digest']
+        print('OK: hai cách cho cùng kết quả' if same else 'FAIL: parse_stream khác kết quả phân tích cả trang')
+        return 0 if same else 1
+    if args.normalize:
+        result = normalize_throughput(load_fixtures(), rounds=args.rounds)
+        for name, stats in result.items():
+            print(f"  {name:8} {stats['rows_per_sec']} dòng/giây")
+        same = result['per_row']['digest'] == result['batch']['digest']
+        print('OK: hai cách cho cùng kết quả' if same else 'FAIL: normalize_rows khác kết quả từng dòng')
+        return 0 if same else 1
+
+    result = run(args.parser or sorted(PARSERS), args.rounds, args.workers)
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print_report(result)
+        print(f"Đã lưu baseline vào {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    except OSError:
+        print_report(result)
+        print(f"Không có baseline ở {args.baseline}, chạy với --save để tạo")
+        return 1
+    print_report(result, baseline)
+    failures = compare(result, baseline, args.threshold)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print('OK: không chậm đi quá ngưỡng, dòng trích xuất giữ nguyên')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
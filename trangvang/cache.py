@@ -0,0 +1,451 @@
+"""Cache response HTTP trên đĩa, cache file kết quả trong bộ nhớ và lưu trang thô để debug.
+
+Mỗi entry là một file: một dòng JSON metadata rồi tới body nén zlib. Entry còn
+hạn được trả ngay không cần mạng; entry hết hạn được kiểm tra lại bằng
+If-None-Match / If-Modified-Since. Khi vượt dung lượng cho phép thì xóa các
+entry lâu không dùng nhất (LRU theo mtime, được cập nhật mỗi lần đọc).
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from . import settings
+from .metrics import RESULT_CACHE, RESULT_CACHE_BYTES
+
+# Các header cần giữ lại để xác định encoding và kiểm tra lại entry
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+_UNSAFE_RE = re.compile(r'[^\w.-]+')
+
+
+def cache_key(url):
+    """Tên file cho một URL: phần URL đã slug (dễ đọc) + hash ngắn để không trùng"""
+    readable = _UNSAFE_RE.sub('_', url.split('://', 1)[-1])[:100]
+    return f"{readable}-{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}"
+
+
+class CachedResponse:
+    """Response đọc từ cache, có các thuộc tính requests.Response mà crawler dùng"""
+
+    def __init__(self, url, status_code, headers, content, cache_status):
+        from requests.structures import CaseInsensitiveDict
+
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.encoding = None
+        # 'fresh' (không gọi mạng) hoặc 'revalidated' (server trả 304)
+        self.cache_status = cache_status
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class _StoringResponse:
+    """Response đang tải theo từng khúc (stream=True); đọc hết thì nội dung được ghi vào cache.
+
+    Các khúc được nén ngay khi đọc nên không giữ lại trang thô.
+    """
+
+    def __init__(self, resp, store):
+        self.resp = resp
+        self.url = resp.url
+        self.status_code = resp.status_code
+        self.headers = resp.headers
+        self._store = store
+
+    def iter_content(self, chunk_size=1):
+        compressor = zlib.compressobj(6)
+        parts = []
+        for chunk in self.resp.iter_content(chunk_size):
+            parts.append(compressor.compress(chunk))
+            yield chunk
+        parts.append(compressor.flush())
+        self._store(b''.join(parts))
+
+    def close(self):
+        self.resp.close()
+
+
+class ResponseCache:
+    """Cache response trên đĩa có TTL, kiểm tra lại có điều kiện và giới hạn dung lượng"""
+
+    def __init__(self, directory=settings.CACHE_DIR, ttl=settings.CACHE_TTL,
+                 max_bytes=settings.CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        self._counts = {'fresh': 0, 'revalidated': 0, 'miss': 0, 'stored': 0, 'evicted': 0}
+
+    def _path(self, url):
+        return os.path.join(self.directory, cache_key(url) + '.cache')
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def _read(self, url):
+        path = self._path(url)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                body = zlib.decompress(f.read())
+            # Đánh dấu vừa dùng để LRU giữ lại entry này
+            os.utime(path)
+        except (OSError, ValueError, zlib.error):
+            return None, None
+        return meta, body
+
+    def _write(self, url, meta, body):
+        self._write_compressed(url, meta, zlib.compress(body, 6))
+
+    def _write_compressed(self, url, meta, compressed):
+        path = self._path(url)
+        data = json.dumps(meta).encode('utf-8') + b'\n' + compressed
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Không ghi được cache {path}: {e}")
+            return
+        self._count('stored')
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data) - old_size
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith('.cache'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict(self):
+        """Xóa entry lâu không dùng nhất cho tới khi dưới max_bytes"""
+        with self._lock:
+            if self._size is not None and self._size <= self.max_bytes:
+                return
+            entries = self._entries()
+            self._size = sum(size for _, size, _ in entries)
+            if self._size <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._size -= size
+                self._counts['evicted'] += 1
+                if self._size <= self.max_bytes:
+                    break
+
+    def fetch(self, url, client, stream=False, expires_at=None):
+        """Lấy trang qua cache: entry còn hạn thì không gọi mạng, hết hạn thì kiểm tra lại.
+
+        Với `stream` trang mới được tải theo từng khúc (resp.iter_content) và chỉ được
+        ghi vào cache khi đã đọc hết. `expires_at` được chuyển cho client.get.
+        """
+        meta, body = self._read(url)
+        if meta is not None and time.time() - meta['stored_at'] < self.ttl:
+            self._count('fresh')
+            return CachedResponse(url, meta['status'], meta['headers'], body, 'fresh')
+
+        headers = {}
+        if meta is not None:
+            if meta['headers'].get('ETag'):
+                headers['If-None-Match'] = meta['headers']['ETag']
+            if meta['headers'].get('Last-Modified'):
+                headers['If-Modified-Since'] = meta['headers']['Last-Modified']
+        resp = client.get(url, headers=headers, stream=stream, expires_at=expires_at)
+
+        if resp.status_code == 304 and meta is not None:
+            resp.close()
+            self._count('revalidated')
+            meta['stored_at'] = time.time()
+            self._write(url, meta, body)
+            return CachedResponse(url, meta['status'], meta['headers'], body, 'revalidated')
+
+        self._count('miss')
+        if resp.status_code == 200:
+            stored = {name: resp.headers[name] for name in STORED_HEADERS if name in resp.headers}
+            meta = {'url': url, 'status': 200, 'headers': stored, 'stored_at': time.time()}
+            if stream:
+                return _StoringResponse(resp, lambda compressed: self._write_compressed(url, meta, compressed))
+            self._write(url, meta, resp.content)
+        return resp
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+class PageCapture:
+    """Lưu trang thô vào thư mục debug, giữ tối đa max_pages file mới nhất"""
+
+    def __init__(self, directory, max_pages=settings.CAPTURE_MAX_PAGES):
+        self.directory = directory
+        self.max_pages = max_pages
+        self._lock = threading.Lock()
+
+    def save(self, url, content):
+        path = os.path.join(self.directory, cache_key(url) + '.html')
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(content)
+                names = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                         if name.endswith('.html')]
+                names.sort(key=os.path.getmtime)
+                for old in names[:-self.max_pages]:
+                    os.remove(old)
+            except OSError as e:
+                print(f"Không lưu được trang debug {path}: {e}")
+
+
+class _Flight:
+    """Một lần render đang chạy, các request giống hệt chờ kết quả của nó"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.body = None
+        self.error = None
+        # Kết quả quá lớn để giữ trong cache: request đang chờ tự render
+        self.uncacheable = False
+
+
+class _Render:
+    """Các đoạn bytes của request render: giữ lại từng đoạn, xong thì lưu vào cache và báo cho request đang chờ.
+
+    Là iterator có close() (không phải generator) để request đang chờ vẫn được
+    báo cả khi response bị đóng trước khi bắt đầu gửi. Quá max_bytes của cache
+    thì thôi giữ các đoạn (chỉ stream tiếp cho client) và báo ngay cho các request
+    đang chờ tự render.
+    """
+
+    def __init__(self, cache, key, flight, chunks, complete=None):
+        self._cache = cache
+        self._key = key
+        self._flight = flight
+        self._chunks = iter(chunks)
+        self._complete = complete
+        self._parts = []
+        self._size = 0
+        self._finished = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            # Kết quả thiếu (vd có trang lỗi) vẫn được gửi cho các request đang chờ nhưng không lưu
+            store = self._complete is None or self._complete()
+            self._finish(b''.join(self._parts), store)
+            raise
+        except Exception as e:
+            self._flight.error = e
+            self._finish(None)
+            raise
+        if not self._finished:
+            self._size += len(chunk)
+            if self._size > self._cache.max_bytes:
+                self._flight.uncacheable = True
+                self._finish(None)
+            else:
+                self._parts.append(chunk)
+        return chunk
+
+    def _finish(self, body, store=True):
+        if not self._finished:
+            self._finished = True
+            self._parts = []
+            self._cache._finish(self._key, self._flight, body, store)
+
+    def close(self):
+        # Client ngắt kết nối giữa chừng: không lưu, các request đang chờ tự render lại
+        close = getattr(self._chunks, 'close', None)
+        if close is not None:
+            close()
+        self._finish(None)
+
+
+class ResultCache:
+    """Cache file kết quả (bytes) trong bộ nhớ: LRU, có TTL và giới hạn dung lượng.
+
+    Nhiều request cùng khóa tới cùng lúc chỉ render một lần (single-flight):
+    request đầu tiên vừa stream kết quả cho client của nó vừa giữ lại các đoạn
+    bytes, các request còn lại chờ rồi nhận đúng bytes đó. Request đầu bị hủy
+    giữa chừng (client ngắt kết nối), kết quả quá max_bytes hoặc chờ quá
+    `wait_timeout` giây thì các request đang chờ tự render lại.
+    """
+
+    def __init__(self, ttl=settings.RESULT_CACHE_TTL, max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+                 wait_timeout=settings.RESULT_CACHE_WAIT):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._size = 0
+        self._counts = {'hit': 0, 'miss': 0, 'coalesced': 0, 'stored': 0, 'evicted': 0}
+
+    def _count(self, outcome):
+        self._counts[outcome] += 1
+        RESULT_CACHE.inc(outcome=outcome)
+
+    def _drop(self, key):
+        body, stored_at = self._entries.pop(key)
+        self._size -= len(body)
+        RESULT_CACHE_BYTES.set(self._size)
+
+    def get_or_render(self, key, render, complete=None):
+        """(các đoạn bytes, 'hit' | 'miss' | 'coalesced') của kết quả ứng với `key`.
+
+        `render()` trả về iterator các đoạn bytes và chỉ được gọi khi không có
+        kết quả còn hạn cũng như không có lần render nào đang chạy cho `key`.
+        `complete()` được gọi khi render xong; trả về False thì kết quả không được
+        lưu vào cache (vd lượt crawl có trang lỗi).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.time() - entry[1] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._count('hit')
+                    return iter([entry[0]]), 'hit'
+                self._drop(key)
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._count('coalesced')
+                return self._wait(key, flight, render, complete), 'coalesced'
+            flight = self._flights[key] = _Flight()
+            self._count('miss')
+        try:
+            chunks = render()
+        except Exception as e:
+            flight.error = e
+            self._finish(key, flight, None)
+            raise
+        return _Render(self, key, flight, chunks, complete), 'miss'
+
+    def _wait(self, key, flight, render, complete):
+        if not flight.done.wait(self.wait_timeout):
+            # Request đầu chạy quá lâu (hoặc bị treo): không chờ nữa, tự render
+            print(f"Chờ kết quả đang render quá {self.wait_timeout:g} giây, tự render lại")
+            yield from render()
+            return
+        if flight.error is not None:
+            raise flight.error
+        if flight.uncacheable:
+            yield from render()
+            return
+        if flight.body is None:
+            # Request đầu bị hủy trước khi render xong
+            chunks, outcome = self.get_or_render(key, render, complete)
+            yield from chunks
+            return
+        yield flight.body
+
+    def _finish(self, key, flight, body, store=True):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if body is not None:
+                flight.body = body
+                if store:
+                    self._store(key, body)
+        flight.done.set()
+
+    def _store(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (body, time.time())
+        self._size += len(body)
+        self._count('stored')
+        while self._size > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self._count('evicted')
+        RESULT_CACHE_BYTES.set(self._size)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, entries=len(self._entries), bytes=self._size)
+
+
+_cache = None
+_capture = None
+_result_cache = None
+_lock = threading.Lock()
+
+
+def get_cache():
+    """ResponseCache dùng chung theo cấu hình, hoặc None nếu đã tắt"""
+    global _cache
+    if not settings.CACHE_ENABLED:
+        return None
+    with _lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+
+def get_result_cache():
+    """ResultCache dùng chung của process, hoặc None nếu đã tắt"""
+    global _result_cache
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    with _lock:
+        if _result_cache is None:
+            _result_cache = ResultCache()
+        return _result_cache
+
+
+def get_capture():
+    """PageCapture dùng chung nếu đã đặt TRANGVANG_CAPTURE_DIR, ngược lại None"""
+    global _capture
+    if not settings.CAPTURE_DIR:
+        return None
+    with _lock:
+        if _capture is None:
+            _capture = PageCapture(settings.CAPTURE_DIR)
+        return _capture
@@ -0,0 +1,119 @@
+"""Xác định encoding của trang mà không chạy chardet trên toàn bộ nội dung.
+
+Thứ tự ưu tiên: charset trong header Content-Type, <meta charset> ở đầu trang,
+encoding đã biết của cùng host/đường dẫn, cuối cùng mới dò bằng chardet trên
+một mẫu nhỏ. Mỗi lần xác định đều ghi lại đã đi nhánh nào.
+"""
+import codecs
+import re
+import threading
+from urllib.parse import urlsplit
+
+# Số byte đầu trang dùng để tìm <meta charset> và để chardet dò
+META_SCAN_SIZE = 4096
+DETECT_SAMPLE_SIZE = 32 * 1024
+
+SOURCES = ('header', 'meta', 'known', 'detect', 'default')
+
+_HEADER_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.I)
+
+
+def _codec_name(name):
+    """Tên chuẩn của encoding, hoặc None nếu Python không hỗ trợ"""
+    if isinstance(name, bytes):
+        name = name.decode('ascii', 'ignore')
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+
+def url_pattern(url):
+    """Nhóm các URL cùng kiểu trang: host + đoạn đầu của đường dẫn (vd trangvangvietnam.com/srch)"""
+    parts = urlsplit(url)
+    return f"{parts.netloc}/{parts.path.lstrip('/').split('/', 1)[0]}"
+
+
+def _read_prefix(chunks, prefix, size):
+    """Đọc thêm từ `chunks` cho tới khi `prefix` đủ `size` byte hoặc hết nội dung"""
+    parts = [prefix]
+    length = len(prefix)
+    while length < size:
+        chunk = next(chunks, None)
+        if chunk is None:
+            break
+        parts.append(chunk)
+        length += len(chunk)
+    return b''.join(parts)
+
+
+class CharsetResolver:
+    """Xác định encoding cho từng trang và nhớ kết quả theo host/đường dẫn"""
+
+    def __init__(self, meta_scan_size=META_SCAN_SIZE, detect_sample_size=DETECT_SAMPLE_SIZE):
+        self.meta_scan_size = meta_scan_size
+        self.detect_sample_size = detect_sample_size
+        self._known = {}
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(SOURCES, 0)
+
+    def resolve(self, url, headers, content):
+        """Trả về (encoding, nguồn) với nguồn là một trong SOURCES"""
+        encoding, source = self._resolve(url, headers, content)
+        with self._lock:
+            self._counts[source] += 1
+            if source in ('header', 'meta', 'detect'):
+                self._known[url_pattern(url)] = encoding
+        return encoding, source
+
+    def resolve_stream(self, url, headers, chunks):
+        """Như resolve cho trang đang tải theo từng khúc: chỉ đọc trước số byte cần để quyết định.
+
+        Trả về (encoding, nguồn, các byte đã đọc trước, iterator các khúc còn lại).
+        """
+        chunks = iter(chunks)
+        prefix = b''
+        if not self._header_encoding(headers):
+            prefix = _read_prefix(chunks, prefix, self.meta_scan_size)
+            with self._lock:
+                known = url_pattern(url) in self._known
+            if not known and not _META_CHARSET_RE.search(prefix[:self.meta_scan_size]):
+                prefix = _read_prefix(chunks, prefix, self.detect_sample_size)
+        encoding, source = self.resolve(url, headers, prefix)
+        return encoding, source, prefix, chunks
+
+    def _header_encoding(self, headers):
+        match = _HEADER_CHARSET_RE.search(headers.get('Content-Type', '') if headers else '')
+        return _codec_name(match.group(1)) if match else None
+
+    def _resolve(self, url, headers, content):
+        encoding = self._header_encoding(headers)
+        if encoding:
+            return encoding, 'header'
+
+        match = _META_CHARSET_RE.search(content[:self.meta_scan_size])
+        encoding = _codec_name(match.group(1)) if match else None
+        if encoding:
+            return encoding, 'meta'
+
+        with self._lock:
+            encoding = self._known.get(url_pattern(url))
+        if encoding:
+            return encoding, 'known'
+
+        import chardet
+
+        detected = chardet.detect(content[:self.detect_sample_size])
+        encoding = _codec_name(detected['encoding']) if detected['encoding'] else None
+        if encoding:
+            return encoding, 'detect'
+        return 'utf-8', 'default'
+
+    def stats(self):
+        """Số trang đã đi qua từng nhánh"""
+        with self._lock:
+            return dict(self._counts)
+
+
+RESOLVER = CharsetResolver()
@@ -0,0 +1,103 @@
+"""Checkpoint theo từng trang cho các lượt crawl dài.
+
+Mỗi trang crawl xong (kể cả trang rỗng) được ghi ngay vào SQLite cùng các dòng
+và page_info của nó; trang tải lỗi được ghi là 'failed'. Gửi lại cùng truy vấn
+thì các trang đã có được đọc lại từ checkpoint, chỉ các trang còn thiếu hoặc
+lỗi được tải lại. Khi lượt crawl chạy hết mà không còn trang lỗi, checkpoint
+của các trang nó đã đi qua bị xóa, kể cả các đoạn trước nếu nó chạy tiếp bằng
+continuation token (lượt crawl cùng truy vấn ở khoảng trang khác vẫn giữ phần
+của mình); checkpoint hết hạn sau TRANGVANG_CHECKPOINT_TTL giây.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from . import settings
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS crawl_pages (
+    query TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    rows TEXT,
+    info TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (query, page)
+);
+'''
+
+
+class CheckpointStore:
+    """Checkpoint các trang đã crawl, dùng chung giữa các thread (một kết nối, có khóa)"""
+
+    def __init__(self, path=settings.CHECKPOINT_PATH, ttl=settings.CHECKPOINT_TTL):
+        self.path = path
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def load(self, query):
+        """Các trang đã xong của truy vấn: {page: (rows, page_info)}; bỏ checkpoint đã hết hạn"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM crawl_pages WHERE updated_at < ?', (time.time() - self.ttl,))
+            cursor = self._conn.execute(
+                "SELECT page, rows, info FROM crawl_pages WHERE query = ? AND status = 'done'", (query,))
+            return {page: (json.loads(rows), json.loads(info)) for page, rows, info in cursor}
+
+    def failed_pages(self, query):
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT page FROM crawl_pages WHERE query = ? AND status = 'failed' ORDER BY page", (query,))
+            return [page for page, in cursor]
+
+    def save_page(self, query, page, rows, info):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO crawl_pages (query, page, status, rows, info, updated_at) "
+                "VALUES (?, ?, 'done', ?, ?, ?)",
+                (query, page, json.dumps(rows, ensure_ascii=False), json.dumps(info), time.time()))
+
+    def mark_failed(self, query, page):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO crawl_pages (query, page, status, updated_at) VALUES (?, ?, 'failed', ?)",
+                (query, page, time.time()))
+
+    def clear(self, query, page_start=None, page_end=None):
+        """Xóa checkpoint của truy vấn, chỉ trong khoảng trang [page_start, page_end] nếu có"""
+        sql = 'DELETE FROM crawl_pages WHERE query = ?'
+        params = [query]
+        if page_start is not None:
+            sql += ' AND page >= ?'
+            params.append(page_start)
+        if page_end is not None:
+            sql += ' AND page <= ?'
+            params.append(page_end)
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+
+_checkpoints = None
+_checkpoints_lock = threading.Lock()
+
+
+def get_checkpoints():
+    """CheckpointStore dùng chung theo cấu hình, hoặc None nếu đã tắt hay không mở được"""
+    global _checkpoints
+    if not settings.CHECKPOINTS_ENABLED:
+        return None
+    with _checkpoints_lock:
+        if _checkpoints is None:
+            try:
+                _checkpoints = CheckpointStore()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Không mở được checkpoint {settings.CHECKPOINT_PATH}: {e}")
+                return None
+        return _checkpoints
@@ -0,0 +1,532 @@
+"""Phần tải trang kết quả tìm kiếm dùng chung cho các crawler Trang Vàng."""
+import base64
+import itertools
+import json
+import time
+import unicodedata
+
+from . import settings
+from .cache import get_cache, get_capture
+from .charset import RESOLVER
+from .fetcher import fetch_in_order
+from .metrics import CRAWLS_IN_FLIGHT, ERRORS, LISTINGS, PAGES, REQUEUED, timer
+from .parsers import get_parser
+from .pipeline import get_pool, parse_in_pool
+from .rows import RowBuffer, report_memory, update_peak_rss
+from .session import RETRY_STATUSES, DeadlineExceeded, get_client
+
+BASE_URL = settings.BASE_URL
+
+# Số byte mỗi lần đọc khi tải và phân tích trang theo từng khúc (TRANGVANG_STREAM_PARSE=1)
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def to_slug(text):
+    text = unicodedata.normalize('NFKD', text)
+    text = text.encode('ascii', 'ignore').decode('utf-8')
+    text = text.replace(' ', '_').replace('-', '_').lower()
+    return text
+
+
+def search_url(nganh_hang, khu_vuc, page):
+    """Tạo URL trang kết quả tìm kiếm theo ngành hàng, khu vực và số trang"""
+    return f"{BASE_URL}srch/{to_slug(khu_vuc)}/{to_slug(nganh_hang)}.html?page={page}"
+
+
+def query_key(nganh_hang, khu_vuc):
+    """Khóa của một truy vấn tìm kiếm, theo cùng slug với URL"""
+    return f"{to_slug(khu_vuc)}/{to_slug(nganh_hang)}"
+
+
+def fetch_page(url, client=None, resolver=RESOLVER, cache=None, expires_at=None):
+    """Tải một trang qua cache (nếu có) và session dùng chung, rồi xác định encoding.
+
+    resp.charset_source cho biết encoding lấy từ đâu (header, meta, known, detect, default).
+    `expires_at` (time.monotonic()) giới hạn timeout và thời gian chờ thử lại của client.
+    """
+    client = client or get_client()
+    with timer('fetch'):
+        if cache is not None:
+            resp = cache.fetch(url, client, expires_at=expires_at)
+        else:
+            resp = client.get(url, expires_at=expires_at)
+    with timer('decode'):
+        resp.encoding, resp.charset_source = resolver.resolve(url, resp.headers, resp.content)
+    return resp
+
+
+class StreamedPage:
+    """Trang đã được tải và phân tích cùng lúc: chỉ giữ status, header và kết quả phân tích"""
+
+    def __init__(self, url, status_code, headers):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.encoding = None
+        self.charset_source = None
+        self.rows = None
+        self.info = None
+        self.error = None
+        # Trang thô chỉ được giữ khi cần lưu lại (TRANGVANG_CAPTURE_DIR)
+        self.content = None
+
+    def result(self):
+        """(rows, page_info) như parse_page; ném lại lỗi phân tích nếu có"""
+        if self.error is not None:
+            raise self.error
+        return self.rows, self.info
+
+
+def fetch_streamed(url, parser, client=None, resolver=RESOLVER, cache=None, keep_content=False, expires_at=None):
+    """Tải một trang theo từng khúc và đưa ngay vào parser.parse_stream, trả về StreamedPage.
+
+    Encoding được xác định từ header hoặc vài KB đầu trang, không cần chờ cả trang.
+    Lỗi mạng giữa chừng được ném ra như fetch_page; lỗi phân tích được giữ lại
+    trong page.error để parse_pages báo như khi phân tích cả trang.
+    """
+    client = client or get_client()
+    with timer('fetch'):
+        if cache is not None:
+            resp = cache.fetch(url, client, stream=True, expires_at=expires_at)
+        else:
+            resp = client.get(url, stream=True, expires_at=expires_at)
+    page = StreamedPage(url, resp.status_code, resp.headers)
+    try:
+        chunks = resp.iter_content(STREAM_CHUNK_SIZE)
+        body = []
+        if keep_content:
+            chunks = (body.append(chunk) or chunk for chunk in chunks)
+        if resp.status_code == 200:
+            with timer('decode'):
+                page.encoding, page.charset_source, prefix, chunks = resolver.resolve_stream(
+                    url, resp.headers, chunks)
+            stream = parser.parse_stream(itertools.chain([prefix], chunks), page.encoding)
+            try:
+                page.rows = list(stream)
+                page.info = stream.info
+            except OSError:
+                raise
+            except Exception as e:
+                page.error = e
+        if keep_content:
+            # Đọc nốt phần còn lại (trang lỗi, hoặc phân tích dừng giữa chừng) để lưu đủ trang
+            for _ in chunks:
+                pass
+            page.content = b''.join(body)
+    finally:
+        resp.close()
+    return page
+
+
+class CrawlPlan:
+    """Khoảng trang sẽ crawl, chốt lại sau khi đọc khối phân trang của trang đầu"""
+
+    def __init__(self, page_start, page_end):
+        self.page_start = page_start
+        self.page_end = page_end
+        self.last_page = None
+        self.total_results = None
+        self.per_page = None
+        # Trang đầu tiên chưa tải vì hết thời gian (chế độ Deadline), None nếu đã tải hết
+        self.next_page = None
+        # Trang đầu của cả lượt crawl khi lượt này chạy tiếp từ continuation token
+        self.first_page = page_start
+        # Các trang tải hoặc phân tích lỗi trong lượt crawl này
+        self.failed_pages = []
+
+    def update(self, page, info, count):
+        """Cập nhật từ page_info của trang đầu (`count` là số đơn vị trên trang đó)"""
+        self.total_results = info['total_results']
+        self.per_page = count
+        last_page = info['last_page']
+        if last_page is None and count and self.total_results is not None:
+            # Không có khối phân trang: suy ra từ tổng số kết quả
+            last_page = -(-self.total_results // count)
+        if last_page is not None:
+            self.last_page = max(last_page, page)
+
+    @property
+    def page_stop(self):
+        """Trang cuối cùng sẽ tải: page_end, bị giới hạn bởi trang cuối thật nếu đã biết"""
+        if self.last_page is None:
+            return self.page_end
+        return min(self.page_end, self.last_page)
+
+    @property
+    def pages_total(self):
+        return max(self.page_stop - self.page_start + 1, 0)
+
+    def to_dict(self):
+        return {
+            'page_start': self.page_start,
+            'page_end': self.page_end,
+            'page_stop': self.page_stop,
+            'last_page': self.last_page,
+            'total_results': self.total_results,
+            'per_page': self.per_page,
+            'pages_total': self.pages_total,
+            'next_page': self.next_page,
+        }
+
+
+class Deadline:
+    """Hạn thời gian của một lượt crawl, cho môi trường serverless có timeout.
+
+    Trang chỉ được đưa vào hàng đợi tải khi ước tính kịp xong trước hạn, chừa
+    `reserve` giây cho bước xuất file. Thời gian mỗi trang lấy từ khoảng cách
+    giữa các trang vừa tải xong (đã tính cả số request song song lẫn giới hạn
+    tốc độ), trước đó là thời gian tải trang đầu.
+    """
+
+    def __init__(self, seconds, reserve=settings.EXPORT_RESERVE):
+        now = time.monotonic()
+        self.expires_at = now + seconds - reserve
+        self.per_page = None
+        # Đã có request phải bỏ dở vì không kịp trước hạn
+        self.gave_up = False
+        self._last = now
+
+    def expired(self):
+        """Đã quá hạn, hoặc đã có request không kịp xong trước hạn"""
+        return self.gave_up or time.monotonic() >= self.expires_at
+
+    def page_done(self):
+        """Ghi nhận một trang vừa tải xong"""
+        now = time.monotonic()
+        gap = now - self._last
+        self._last = now
+        self.per_page = gap if self.per_page is None else 0.7 * self.per_page + 0.3 * gap
+
+    def fits(self, pending):
+        """Một trang mới xếp sau `pending` trang đang tải có kịp xong trước hạn không"""
+        return time.monotonic() + (self.per_page or 0.0) * (pending + 1) <= self.expires_at
+
+
+def is_throttled(resp, error):
+    """Trang bị server giới hạn, lỗi tạm thời hoặc timeout: nên tải lại sau thay vì bỏ"""
+    if error is not None:
+        # Lỗi của requests (timeout, kết nối) đều là OSError
+        return isinstance(error, OSError)
+    return resp.status_code in RETRY_STATUSES
+
+
+def fetch_pages(items, url_of, workers=8, client=None, cache=None, parser=None, deadline=None):
+    """Tải song song trang của từng item (URL là url_of(item)), trả về (item, url, resp)
+    theo đúng thứ tự của `items`.
+
+    Trang bị giới hạn (429/5xx) hoặc timeout được đưa lại hàng đợi vài lần, sau
+    đó mới bị bỏ qua như các trang lỗi khác. Số request thực sự chạy cùng lúc do
+    LIMITER quyết định, `workers` chỉ là trần. Người gọi dừng vòng lặp (gặp
+    trang rỗng) thì các trang chưa tải sẽ bị hủy. Trang thô chỉ được lưu lại
+    khi bật TRANGVANG_CAPTURE_DIR. Có `parser` (TRANGVANG_STREAM_PARSE=1) thì mỗi
+    trang được phân tích ngay trong lúc tải, resp là StreamedPage. Có `deadline`
+    (Deadline) thì mỗi request không chạy hay chờ thử lại quá hạn, và khi đã quá
+    hạn thì trang lỗi không được đưa lại hàng đợi nữa.
+    """
+    client = client or get_client()
+    capture = get_capture()
+
+    expires_at = deadline.expires_at if deadline is not None else None
+
+    def fetch(item):
+        if parser is not None:
+            return fetch_streamed(url_of(item), parser, client, cache=cache, keep_content=capture is not None,
+                                  expires_at=expires_at)
+        return fetch_page(url_of(item), client, cache=cache, expires_at=expires_at)
+
+    def requeue(item, resp, error):
+        if isinstance(error, DeadlineExceeded):
+            deadline.gave_up = True
+        if not is_throttled(resp, error) or (deadline is not None and deadline.expired()):
+            return False
+        REQUEUED.inc()
+        print(f"Đưa lại vào hàng đợi {url_of(item)}: {error or f'status {resp.status_code}'}")
+        return True
+
+    results = fetch_in_order(items, fetch, workers, requeue=requeue)
+    try:
+        for item, resp, error in results:
+            url = url_of(item)
+            if error is not None:
+                ERRORS.inc(stage='fetch')
+                print(f"Lỗi khi crawl {url}: {error}")
+                continue
+            if capture is not None:
+                capture.save(url, resp.content)
+            if resp.status_code != 200:
+                ERRORS.inc(stage='status')
+                print(f"Không truy cập được {url}, status: {resp.status_code}")
+                continue
+            yield item, url, resp
+    finally:
+        results.close()
+
+
+def iter_pages(nganh_hang, khu_vuc, pages, workers=8, client=None, cache=None, parser=None, deadline=None):
+    """Tải song song các trang trong `pages` của một truy vấn, trả về (page, url, resp) theo thứ tự"""
+    return fetch_pages(pages, lambda page: search_url(nganh_hang, khu_vuc, page), workers, client, cache, parser,
+                       deadline)
+
+
+def stream_parser(parser):
+    """Engine dùng để phân tích trong lúc tải nếu bật TRANGVANG_STREAM_PARSE, ngược lại None"""
+    return parser if settings.STREAM_PARSE else None
+
+
+def print_stats(client, cache=None):
+    """In thống kê HTTP, encoding và cache sau một lượt crawl"""
+    print(f"HTTP: {client.stats()}")
+    print(f"Giới hạn tải: {client.limiter.stats()}")
+    print(f"Encoding: {RESOLVER.stats()}")
+    if cache is not None:
+        print(f"Cache: {cache.stats()}")
+
+
+def parse_pages(pages, parser):
+    """Phân tích các trang đã tải, trả về (page, rows, page_info); trang lỗi bị bỏ qua"""
+    for page, url, resp in pages:
+        try:
+            if isinstance(resp, StreamedPage):
+                rows, info = resp.result()
+            else:
+                rows, info = parser.parse_page(resp.content, resp.encoding)
+        except Exception as e:
+            ERRORS.inc(stage='parse')
+            print(f"Lỗi khi crawl {url}: {e}")
+            continue
+        # Không giữ trang thô (vài trăm KB) trong lúc người gọi xử lý các dòng
+        resp = None
+        PAGES.inc()
+        LISTINGS.inc(len(rows))
+        yield page, rows, info
+
+
+def parse_stage(pages, parser, parse_workers=None):
+    """parse_pages ngay trong thread hiện tại, hoặc trên process pool khi parse_workers > 0.
+
+    Trang đã phân tích trong lúc tải (TRANGVANG_STREAM_PARSE=1) không cần qua pool.
+    """
+    if parse_workers is None:
+        parse_workers = settings.PARSE_WORKERS
+    if parse_workers > 0 and not settings.STREAM_PARSE:
+        return parse_in_pool(pages, parser.name, get_pool(parse_workers), parse_workers * 2)
+    return parse_pages(pages, parser)
+
+
+def iter_page_rows(nganh_hang, khu_vuc, page_start=1, page_end=10, parser=None, on_plan=None,
+                   workers=8, client=None, parse_workers=None, checkpoints=None, deadline=None):
+    """Sinh (page, rows) theo thứ tự trang, tải trang đầu trước để lập kế hoạch.
+
+    Khối phân trang của trang đầu cho biết trang cuối thật, nên các trang còn lại
+    được đưa vào hàng đợi tải song song ngay mà không vượt quá trang cuối.
+    `on_plan(plan)` được gọi một lần với CrawlPlan trước trang đầu tiên. Không
+    đọc được phân trang (trang đầu lỗi, giao diện đổi) thì tải hết khoảng đã
+    yêu cầu như trước. Với `parse_workers` (mặc định TRANGVANG_PARSE_WORKERS) > 0,
+    các trang sau trang đầu được phân tích trên process pool. Có `checkpoints`
+    (CheckpointStore) thì trang đã crawl ở lượt trước được đọc lại thay vì tải,
+    trang mới xong được ghi ngay và trang lỗi được đánh dấu để lượt sau tải lại.
+    Có `deadline` (Deadline) thì chỉ tải các trang kịp trong hạn; trang đầu tiên
+    không kịp (chưa tải, hoặc chưa tải xong khi hết hạn) được ghi vào plan.next_page
+    và các trang sau nó bị bỏ để lượt sau tải tiếp từ đó.
+    """
+    parser = get_parser(parser)
+    client = client or get_client()
+    cache = get_cache()
+    plan = CrawlPlan(page_start, page_end)
+    key = query_key(nganh_hang, khu_vuc)
+    done = checkpoints.load(key) if checkpoints is not None else {}
+    if done:
+        print(f"Checkpoint: đã có {len(done)} trang, chỉ tải các trang còn thiếu")
+
+    def finished(page, rows, info):
+        if checkpoints is not None and page not in done:
+            checkpoints.save_page(key, page, rows, info)
+        return page, rows
+
+    def failed(page):
+        plan.failed_pages.append(page)
+        if checkpoints is not None:
+            checkpoints.mark_failed(key, page)
+
+    progress = {'scheduled': 0, 'fetched': 0}
+
+    def schedule(pages):
+        """Các trang cần tải, dừng ở trang đầu tiên không còn kịp trước hạn"""
+        for page in pages:
+            if deadline is not None and not deadline.fits(progress['scheduled'] - progress['fetched']):
+                plan.next_page = page
+                print(f"Sắp hết thời gian: dừng trước trang {page}")
+                return
+            progress['scheduled'] += 1
+            yield page
+
+    def fetched():
+        progress['fetched'] += 1
+        if deadline is not None:
+            deadline.page_done()
+
+    try:
+        first = None
+        if page_start <= page_end:
+            if page_start in done:
+                first = (page_start,) + done[page_start]
+            else:
+                first = next(parse_pages(iter_pages(nganh_hang, khu_vuc, [page_start], workers, client, cache,
+                                                    stream_parser(parser), deadline), parser), None)
+                fetched()
+                if first is None and deadline is not None and deadline.expired():
+                    plan.next_page = page_start
+                    print(f"Hết thời gian khi tải trang {page_start}")
+                elif first is None:
+                    failed(page_start)
+        if first is not None:
+            plan.update(first[0], first[2], len(first[1]))
+        print(f"Kế hoạch crawl: {plan.to_dict()}")
+        if on_plan is not None:
+            on_plan(plan)
+        if first is None and plan.next_page is not None:
+            return
+        if first is not None:
+            yield finished(*first)
+            if not first[1]:
+                return
+        # Trang rỗng đã gặp ở lượt trước là điểm dừng, không tải các trang sau nó
+        stop = min([page for page, (rows, info) in done.items() if not rows] + [plan.page_stop])
+        rest = range(page_start + 1, stop + 1)
+        pages = iter_pages(nganh_hang, khu_vuc, schedule(page for page in rest if page not in done),
+                           workers, client, cache, stream_parser(parser), deadline)
+        parsed = parse_stage(pages, parser, parse_workers)
+        try:
+            # Trang lỗi không có trong `parsed`: so với trang kế tiếp để biết trang nào bị bỏ
+            pending = next(parsed, None)
+            for page in rest:
+                if page in done:
+                    yield page, done[page][0]
+                elif pending is not None and pending[0] == page:
+                    fetched()
+                    yield finished(*pending)
+                    pending = next(parsed, None)
+                elif plan.next_page is not None and page >= plan.next_page:
+                    # Hết thời gian, các trang từ đây chưa được tải
+                    break
+                elif deadline is not None and deadline.expired():
+                    # Trang chưa tải xong khi hết hạn: lượt sau tải tiếp từ trang này
+                    plan.next_page = page
+                    print(f"Hết thời gian khi tải trang {page}, dừng ở đây")
+                    break
+                else:
+                    failed(page)
+        finally:
+            parsed.close()
+    finally:
+        print_stats(client, cache)
+
+
+def iter_rows(nganh_hang, khu_vuc, page_start=1, page_end=10, parser=None, on_page=None,
+              store=None, incremental=False, on_plan=None, checkpoints=None, deadline=None, client=None,
+              first_page=None):
+    """Sinh từng dòng kết quả ngay khi trang chứa nó được phân tích xong.
+
+    Dừng ở trang cuối theo khối phân trang, hoặc ở trang đầu tiên không còn
+    đơn vị nào. `on_plan(plan)` nhận CrawlPlan sau trang đầu, `on_page(page, so_dong)`
+    được gọi sau mỗi trang để báo tiến độ. Có `store` thì mỗi trang được ghi vào
+    kho; thêm `incremental=True` thì chỉ trả về đơn vị mới hoặc thay đổi, và dừng
+    ở trang đầu tiên mà mọi đơn vị đều đã có sẵn. Có `checkpoints` thì lượt crawl
+    bị gián đoạn chạy tiếp từ trang còn thiếu khi gửi lại cùng truy vấn
+    (không dùng với `incremental`, vì trang đọc lại đều đã có trong kho).
+    Khi chạy hết mà không còn trang lỗi, checkpoint từ `first_page` (trang đầu của
+    cả lượt crawl khi chạy tiếp bằng continuation token, mặc định page_start) tới
+    trang cuối được xóa. `deadline` và `client` được chuyển cho iter_page_rows.
+    """
+    key = query_key(nganh_hang, khu_vuc)
+    if first_page is None or first_page > page_start:
+        first_page = page_start
+    if incremental:
+        checkpoints = None
+    plans = []
+
+    def remember(plan):
+        plan.first_page = first_page
+        plans.append(plan)
+        if on_plan is not None:
+            on_plan(plan)
+
+    pages = iter_page_rows(nganh_hang, khu_vuc, page_start, page_end, parser, remember, client=client,
+                           checkpoints=checkpoints, deadline=deadline)
+    CRAWLS_IN_FLIGHT.inc()
+    try:
+        last = page_start
+        for page, rows in pages:
+            last = page
+            print(f"Trang {page}: tìm thấy {len(rows)} mục")
+            if on_page is not None:
+                on_page(page, len(rows))
+            if not rows:
+                break
+            if store is not None:
+                statuses = store.upsert_many(rows, key)
+                if incremental:
+                    rows = [row for row, status in zip(rows, statuses) if status != 'unchanged']
+                    if not rows:
+                        print(f"Trang {page}: mọi đơn vị đã có sẵn, dừng crawl")
+                        break
+            yield from rows
+        if checkpoints is not None and not (plans and plans[0].next_page):
+            # Crawl đã chạy hết: giữ checkpoint nếu còn trang lỗi để lượt sau chỉ tải lại các trang đó.
+            # Chỉ xét các trang của lượt crawl này (kể cả các đoạn trước khi chạy tiếp bằng
+            # continuation token), không đụng tới lượt crawl cùng truy vấn ở khoảng trang khác
+            failed = [page for page in checkpoints.failed_pages(key) if first_page <= page <= last]
+            if failed:
+                print(f"Các trang lỗi sẽ được tải lại khi gửi lại truy vấn: {failed}")
+            else:
+                checkpoints.clear(key, first_page, last)
+    finally:
+        CRAWLS_IN_FLIGHT.dec()
+        pages.close()
+        update_peak_rss()
+
+
+def crawl(nganh_hang, khu_vuc, page_start=1, page_end=10, parser=None, deadline=None, spill_after=None, **kwargs):
+    """Crawl một truy vấn, trả về (rows, plan); các tham số khác như iter_rows.
+
+    Với `deadline` (giây) chỉ tải số trang kịp trong khoảng thời gian đó; nếu còn
+    trang chưa tải thì plan.next_page là trang tiếp theo, xem continuation_token.
+    `rows` là RowBuffer các CompactRow (đọc như dict), quá `spill_after` dòng
+    (mặc định TRANGVANG_SPILL_ROWS) thì phần cũ nằm trong file tạm.
+    """
+    plans = []
+    budget = Deadline(deadline) if deadline else None
+    rows = RowBuffer(spill_after)
+    rows.extend(iter_rows(nganh_hang, khu_vuc, page_start, page_end, parser, on_plan=plans.append,
+                          deadline=budget, **kwargs))
+    print(f"Tổng số mục tìm được: {len(rows)}")
+    report_memory(rows)
+    return rows, plans[0] if plans else CrawlPlan(page_start, page_end)
+
+
+def continuation_token(nganh_hang, khu_vuc, plan):
+    """Token để crawl tiếp từ plan.next_page, hoặc None nếu đã crawl hết.
+
+    Token giữ cả trang đầu của lượt crawl ban đầu, để đoạn cuối cùng xóa được
+    checkpoint của mọi đoạn trước.
+    """
+    if plan.next_page is None:
+        return None
+    data = json.dumps([nganh_hang, khu_vuc, plan.next_page, plan.page_stop, plan.first_page], ensure_ascii=False)
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def parse_continuation(token):
+    """(nganh_hang, khu_vuc, page_start, page_end, first_page) từ continuation_token; ValueError nếu token sai.
+
+    Token cũ chưa có first_page thì first_page là page_start.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        if not isinstance(values, list) or len(values) not in (4, 5):
+            raise ValueError('sai số trường')
+        nganh_hang, khu_vuc, page_start, page_end = values[:4]
+        first_page = values[4] if len(values) == 5 else page_start
+        return nganh_hang, khu_vuc, int(page_start), int(page_end), int(first_page)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Continuation token không hợp lệ: {e}")
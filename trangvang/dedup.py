@@ -0,0 +1,201 @@
+"""Gộp công ty trùng trong kết quả crawl, kể cả khi tên viết hơi khác nhau.
+
+Cùng một công ty hay xuất hiện ở nhiều trang, nhiều truy vấn với tên có hoặc
+không có 'Công Ty TNHH', khác dấu... Để không phải so từng cặp, mỗi dòng được
+xếp vào các khối (blocking) theo số điện thoại, domain của email/website và các
+band MinHash của các từ trong tên (đã bỏ dấu và bỏ loại hình doanh nghiệp); chỉ
+các dòng chung khối mới được chấm điểm, nên thời gian gần như tuyến tính theo số
+dòng. Các dòng khớp nhau được gộp (union-find) thành một dòng.
+"""
+import random
+import re
+import zlib
+
+from .normalize import normalize_email, normalize_name, normalize_phone, normalize_website, split_phones
+
+# Loại hình doanh nghiệp và từ chung, bỏ khỏi tên trước khi so (tên đã bỏ dấu, chữ thường)
+_LEGAL_FORMS_RE = re.compile(
+    r'\b(?:cong ty|cty|ctcp|tnhh|co phan|mot thanh vien|hai thanh vien|mtv|tu nhan|dntn|doanh nghiep'
+    r'|chi nhanh|van phong dai dien|hop tac xa|tap doan|xi nghiep|thuong mai dich vu|tmdv|san xuat|sx'
+    r'|thuong mai|tm|dich vu|dv|xuat nhap khau|xnk|va|cp)\b')
+
+# Domain dùng chung cho nhiều công ty, không dùng để xếp khối
+FREE_DOMAINS = frozenset([
+    'gmail.com', 'yahoo.com', 'yahoo.com.vn', 'hotmail.com', 'outlook.com', 'live.com', 'icloud.com',
+    'facebook.com', 'fb.com', 'zalo.me', 'blogspot.com', 'trangvangvietnam.com',
+])
+
+# Tên trùng từ mức này trở lên (Jaccard trên các từ) thì coi là cùng công ty
+NAME_THRESHOLD = 0.8
+# Ngưỡng thấp hơn khi hai dòng đã cùng domain email/website riêng
+DOMAIN_NAME_THRESHOLD = 0.5
+
+# MinHash: NUM_BANDS band, mỗi band BAND_ROWS giá trị; tên có chung một band thì cùng khối.
+# Với 4 x 3, hai tên có Jaccard 0.8 cùng khối với xác suất ~94%, Jaccard 0.3 chỉ ~10%
+NUM_BANDS = 4
+BAND_ROWS = 3
+# Khối có nhiều nhóm hơn mức này là khóa quá chung (vd từ 'nhua' của cả ngành),
+# không so thêm với khối đó nữa để số lần so sánh mỗi dòng luôn có giới hạn
+MAX_BLOCK_GROUPS = 50
+_PRIME = (1 << 61) - 1
+# Hệ số cố định để khối của cùng một tên giống nhau giữa các lần chạy
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(NUM_BANDS * BAND_ROWS)]
+
+
+def name_tokens(name):
+    """Các từ của tên sau khi bỏ dấu, chữ thường và bỏ loại hình doanh nghiệp"""
+    return frozenset(_LEGAL_FORMS_RE.sub(' ', normalize_name(name)).split())
+
+
+def minhash_bands(tokens):
+    """Khóa của từng band MinHash của một tập từ"""
+    hashes = [zlib.crc32(token.encode('utf-8')) for token in tokens]
+    signature = [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+    return [(band, tuple(signature[band * BAND_ROWS:(band + 1) * BAND_ROWS])) for band in range(NUM_BANDS)]
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _domains(email, website):
+    domains = set()
+    if '@' in email:
+        domains.add(email.rsplit('@', 1)[1])
+    if website:
+        host = website.split('/', 1)[0]
+        domains.add(host)
+    return {domain for domain in domains if domain and domain not in FREE_DOMAINS}
+
+
+class _Record:
+    """Các giá trị đã chuẩn hóa của một dòng, dùng để xếp khối và chấm điểm"""
+    __slots__ = ('phones', 'email', 'website', 'domains', 'tokens')
+
+    def __init__(self, row):
+        self.phones = set(split_phones(row.get('Số điện thoại')))
+        self.email = normalize_email(row.get('Email'))
+        self.website = normalize_website(row.get('Website'))
+        self.domains = _domains(self.email, self.website)
+        self.tokens = name_tokens(row.get('Tên Khách Hàng'))
+
+    def blocks(self):
+        keys = [('phone', phone) for phone in self.phones]
+        keys.extend(('domain', domain) for domain in self.domains)
+        if self.tokens:
+            keys.extend(('name',) + band for band in minhash_bands(self.tokens))
+        return keys
+
+
+def is_match(a, b):
+    """Hai dòng (_Record) có phải cùng một công ty không"""
+    if a.phones & b.phones:
+        return True
+    if (a.email and a.email == b.email) or (a.website and a.website == b.website):
+        return True
+    similarity = jaccard(a.tokens, b.tokens)
+    if a.domains & b.domains:
+        return similarity >= DOMAIN_NAME_THRESHOLD
+    # Tên một từ quá dễ trùng giữa các công ty khác nhau
+    return similarity >= NAME_THRESHOLD and min(len(a.tokens), len(b.tokens)) >= 2
+
+
+class CompanyDeduplicator:
+    """Gộp công ty trùng theo số điện thoại, email, website hoặc tên gần giống.
+
+    Dòng gặp trước được giữ, các dòng trùng chỉ bổ sung trường còn trống và số
+    điện thoại chưa có. `label` (vd truy vấn) của mọi dòng trùng được ghi lại.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self._records = []
+        self._labels = []
+        self._parent = []
+        self._blocks = {}
+        self.comparisons = 0
+
+    def _find(self, index):
+        parent = self._parent
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    def _union(self, a, b):
+        # Dòng gặp trước làm đại diện của nhóm
+        a, b = self._find(a), self._find(b)
+        if a != b:
+            self._parent[max(a, b)] = min(a, b)
+
+    def add(self, row, label=None):
+        record = _Record(row)
+        index = len(self.rows)
+        self.rows.append(row)
+        self._records.append(record)
+        self._labels.append(label)
+        self._parent.append(index)
+        keys = record.blocks()
+        # Chỉ so với đại diện (dòng đầu) của mỗi nhóm đã có trong cùng khối
+        roots = set()
+        for key in keys:
+            members = self._blocks.get(key, ())
+            if len(members) <= MAX_BLOCK_GROUPS:
+                roots.update(self._find(member) for member in members)
+        for root in sorted(roots):
+            self.comparisons += 1
+            if is_match(record, self._records[root]):
+                self._union(root, index)
+        root = self._find(index)
+        for key in keys:
+            members = self._blocks.setdefault(key, [])
+            # Một khối chỉ cần giữ một dòng của mỗi nhóm; khối đã quá lớn thì thôi không thêm
+            if len(members) <= MAX_BLOCK_GROUPS and root not in {self._find(member) for member in members}:
+                members.append(index)
+
+    def groups(self):
+        """Chỉ số các dòng theo từng nhóm, theo thứ tự dòng đầu tiên của nhóm"""
+        groups = {}
+        for index in range(len(self.rows)):
+            groups.setdefault(self._find(index), []).append(index)
+        return list(groups.values())
+
+    def results(self, label_column=None):
+        """Mỗi nhóm một dòng; có `label_column` thì thêm cột ghi các label của nhóm"""
+        results = []
+        for members in self.groups():
+            merged = dict(self.rows[members[0]])
+            phones = [phone.strip() for phone in (merged.get('Số điện thoại') or '').split(',') if phone.strip()]
+            known = {normalize_phone(phone) for phone in phones}
+            labels = []
+            for index in members:
+                row = self.rows[index]
+                for column, value in row.items():
+                    if value and not merged.get(column):
+                        merged[column] = value
+                for phone in (row.get('Số điện thoại') or '').split(','):
+                    phone = phone.strip()
+                    if phone and normalize_phone(phone) not in known:
+                        known.add(normalize_phone(phone))
+                        phones.append(phone)
+                label = self._labels[index]
+                if label is not None and label not in labels:
+                    labels.append(label)
+            merged['Số điện thoại'] = ', '.join(phones)
+            if label_column is not None:
+                merged[label_column] = '; '.join(labels)
+            results.append(merged)
+        return results
+
+
+def dedup_rows(rows):
+    """Danh sách dòng đã gộp công ty trùng (đọc hết `rows`)"""
+    dedup = CompanyDeduplicator()
+    for row in rows:
+        dedup.add(row)
+    results = dedup.results()
+    print(f"Gộp trùng: {len(dedup.rows)} dòng còn {len(results)} công ty, {dedup.comparisons} lần so sánh")
+    return results
@@ -0,0 +1,107 @@
+"""Xuất kết quả crawl ra file.
+
+CSV và Excel đều được ghi lần lượt từng dòng từ một iterator, không dựng
+DataFrame hay cả workbook trong bộ nhớ, nên bộ nhớ không tăng theo số dòng.
+"""
+import codecs
+import csv
+import io
+import tempfile
+import time
+
+from .metrics import STAGE_SECONDS
+from .parsers import COLUMNS
+
+
+def iter_csv(rows, columns=COLUMNS, placeholder=None):
+    """Sinh nội dung CSV (utf-8-sig) theo từng dòng để trả về dạng stream.
+
+    `placeholder` là dòng được ghi khi `rows` không có dòng nào.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    def flush():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(columns)
+    yield codecs.BOM_UTF8 + flush()
+    count = 0
+    # Chỉ cộng thời gian ghi, không tính thời gian chờ `rows` crawl xong
+    spent = 0.0
+    for row in rows:
+        start = time.perf_counter()
+        writer.writerow([row.get(column, '') for column in columns])
+        chunk = flush()
+        spent += time.perf_counter() - start
+        count += 1
+        yield chunk
+    if not count and placeholder is not None:
+        writer.writerow([placeholder.get(column, '') for column in columns])
+        yield flush()
+    STAGE_SECONDS.observe(spent, stage='export')
+
+
+def write_csv(rows, fileobj, columns=COLUMNS, placeholder=None):
+    """Ghi CSV (utf-8-sig) vào file nhị phân"""
+    for chunk in iter_csv(rows, columns, placeholder):
+        fileobj.write(chunk)
+
+
+def _header_cells(sheet, columns):
+    """Dòng tiêu đề in đậm, có viền và căn giữa như file pandas xuất trước đây"""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    side = Side(style='thin')
+    cells = []
+    for column in columns:
+        cell = WriteOnlyCell(sheet, value=column)
+        cell.font = Font(bold=True)
+        cell.border = Border(left=side, right=side, top=side, bottom=side)
+        cell.alignment = Alignment(horizontal='center', vertical='top')
+        cells.append(cell)
+    return cells
+
+
+def write_excel(rows, fileobj, columns=COLUMNS, placeholder=None):
+    """Ghi file Excel (.xlsx) vào file nhị phân bằng chế độ write-only của openpyxl"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(_header_cells(sheet, columns))
+    count = 0
+    spent = 0.0
+    for row in rows:
+        start = time.perf_counter()
+        sheet.append([row.get(column, '') for column in columns])
+        spent += time.perf_counter() - start
+        count += 1
+    start = time.perf_counter()
+    if not count and placeholder is not None:
+        sheet.append([placeholder.get(column, '') for column in columns])
+    workbook.save(fileobj)
+    STAGE_SECONDS.observe(spent + time.perf_counter() - start, stage='export')
+
+
+def excel_file(rows, columns=COLUMNS, placeholder=None):
+    """Ghi Excel ra file tạm (trên đĩa khi lớn hơn 1 MB) và trả về file đã seek về đầu"""
+    output = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    write_excel(rows, output, columns, placeholder)
+    output.seek(0)
+    return output
+
+
+# Kích thước mỗi đoạn khi gửi file Excel đã ghi xong
+EXCEL_BLOCK_SIZE = 64 * 1024
+
+
+def iter_excel(rows, columns=COLUMNS, placeholder=None, block_size=EXCEL_BLOCK_SIZE):
+    """Như iter_csv cho Excel: chỉ bắt đầu ghi khi được duyệt, rồi đọc file tạm ra từng
+    đoạn `block_size` bytes, nên cả file không nằm trong bộ nhớ cùng lúc"""
+    with excel_file(rows, columns, placeholder) as output:
+        yield from iter(lambda: output.read(block_size), b'')
@@ -0,0 +1,215 @@
+"""Bộ tải trang đồng thời, có giới hạn tốc độ theo từng host."""
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from . import settings
+from .metrics import LIMITER_IN_FLIGHT, LIMITER_RATE
+
+
+class TokenBucket:
+    """Token bucket: cấp tối đa `rate` token mỗi giây, dồn được tối đa `burst` token."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Chờ tới khi lấy được một token"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostLimiter:
+    """Giới hạn request theo host: số request mỗi giây và số request đang chạy cùng lúc"""
+
+    def __init__(self, rate=2.0, max_in_flight=4, burst=1):
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.burst = burst
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = {
+                    'bucket': TokenBucket(self.rate, self.burst),
+                    'cond': threading.Condition(),
+                    'in_flight': 0,
+                }
+                self._hosts[host] = state
+            return state
+
+    @contextmanager
+    def limit(self, url):
+        """Giữ một chỗ trong giới hạn của host trong suốt thời gian request chạy"""
+        state = self._host(urlsplit(url).netloc)
+        cond = state['cond']
+        with cond:
+            while state['in_flight'] >= self.max_in_flight:
+                cond.wait()
+            state['in_flight'] += 1
+        try:
+            state['bucket'].acquire()
+            yield
+        finally:
+            with cond:
+                state['in_flight'] -= 1
+                cond.notify()
+
+    def record(self, url, status=None, latency=None, error=None):
+        """Kết quả của một request; giới hạn cố định nên không làm gì"""
+
+    def stats(self):
+        return {'rate': self.rate, 'max_in_flight': self.max_in_flight}
+
+
+class AdaptiveLimiter(HostLimiter):
+    """HostLimiter tự điều chỉnh theo AIMD từ kết quả các request.
+
+    Sau `increase_after` response khỏe liên tiếp thì tăng cộng: thêm `rate_step`
+    request/giây và một request đồng thời. Gặp 429/503/504, timeout, lỗi kết nối
+    hoặc latency tăng vọt thì giảm nhân cả hai theo `decrease_factor`; trong
+    `cooldown` giây sau một lần giảm không giảm tiếp, vì các response của cùng
+    một đợt bị chặn thường về liền nhau.
+    """
+
+    THROTTLE_STATUSES = (429, 503, 504)
+
+    def __init__(self, rate=2.0, max_in_flight=4, burst=1, rate_bounds=(0.5, 8.0), in_flight_bounds=(1, 8),
+                 increase_after=10, rate_step=0.5, decrease_factor=0.5, slow_latency=5.0, cooldown=2.0):
+        super().__init__(rate, max_in_flight, burst)
+        self.rate_bounds = rate_bounds
+        self.in_flight_bounds = in_flight_bounds
+        self.increase_after = increase_after
+        self.rate_step = rate_step
+        self.decrease_factor = decrease_factor
+        self.slow_latency = slow_latency
+        self.cooldown = cooldown
+        self._healthy = 0
+        # Latency trung bình trượt: nhanh (vài request gần nhất) và chậm (mức nền)
+        self._latency_fast = None
+        self._latency_slow = None
+        self._last_decrease = 0.0
+        self.changes = deque(maxlen=50)
+        self._publish()
+
+    def _latency_reason(self, latency):
+        if self._latency_fast is None:
+            self._latency_fast = self._latency_slow = latency
+        else:
+            self._latency_fast += 0.3 * (latency - self._latency_fast)
+            self._latency_slow += 0.05 * (latency - self._latency_slow)
+        if latency >= self.slow_latency:
+            return f'latency {latency:.1f}s'
+        if self._latency_fast > 1.0 and self._latency_fast > 2 * self._latency_slow:
+            return f'latency tăng {self._latency_slow:.2f}s -> {self._latency_fast:.2f}s'
+        return None
+
+    def record(self, url, status=None, latency=None, error=None):
+        """Cập nhật giới hạn từ kết quả một request (status + latency, hoặc lỗi)"""
+        with self._lock:
+            if error is not None:
+                reason = f'lỗi {type(error).__name__}'
+            elif status in self.THROTTLE_STATUSES:
+                reason = f'status {status}'
+            else:
+                reason = self._latency_reason(latency) if latency is not None else None
+            if reason is not None:
+                self._healthy = 0
+                now = time.monotonic()
+                if now - self._last_decrease < self.cooldown:
+                    return
+                self._last_decrease = now
+                self._apply(max(self.rate_bounds[0], self.rate * self.decrease_factor),
+                            max(self.in_flight_bounds[0], int(self.max_in_flight * self.decrease_factor)),
+                            f'giảm: {reason} ({urlsplit(url).netloc})')
+                return
+            if status is not None and status >= 500:
+                self._healthy = 0
+                return
+            self._healthy += 1
+            if self._healthy < self.increase_after:
+                return
+            self._healthy = 0
+            rate = min(self.rate_bounds[1], self.rate + self.rate_step)
+            in_flight = min(self.in_flight_bounds[1], self.max_in_flight + 1)
+            if rate != self.rate or in_flight != self.max_in_flight:
+                self._apply(rate, in_flight, f'tăng: {self.increase_after} response khỏe liên tiếp')
+
+    def _apply(self, rate, in_flight, reason):
+        """Đổi giới hạn cho mọi host (gọi khi đang giữ self._lock)"""
+        self.rate = rate
+        self.max_in_flight = in_flight
+        for state in self._hosts.values():
+            with state['bucket'].lock:
+                state['bucket'].rate = rate
+            with state['cond']:
+                state['cond'].notify_all()
+        self.changes.append((time.time(), rate, in_flight, reason))
+        self._publish()
+        print(f"Giới hạn tải: {rate:.2f} request/giây, {in_flight} request đồng thời ({reason})")
+
+    def _publish(self):
+        LIMITER_RATE.set(self.rate)
+        LIMITER_IN_FLIGHT.set(self.max_in_flight)
+
+    def stats(self):
+        with self._lock:
+            last = self.changes[-1][3] if self.changes else None
+            return {'rate': self.rate, 'max_in_flight': self.max_in_flight, 'last_change': last}
+
+
+# Dùng chung cho mọi lượt crawl để nhiều người dùng cùng lúc vẫn lịch sự với một host
+if settings.ADAPTIVE_LIMITS:
+    LIMITER = AdaptiveLimiter(rate=2.0, max_in_flight=4)
+else:
+    LIMITER = HostLimiter(rate=2.0, max_in_flight=4)
+
+
+def fetch_in_order(items, fetch, workers=4, requeue=None, max_requeues=3):
+    """Chạy fetch(item) song song và trả về (item, kết quả, lỗi) đúng thứ tự của items.
+
+    Chỉ giữ tối đa `workers * 2` việc đang chờ, nên khi người gọi dừng sớm
+    (ví dụ gặp trang rỗng) số trang bị tải thừa luôn có giới hạn.
+    Nếu `requeue(item, kết quả, lỗi)` trả về True, item được đưa lại cuối hàng
+    đợi của pool (tối đa `max_requeues` lần) thay vì trả về ngay.
+    """
+    items = iter(items)
+    window = max(workers, 1) * 2
+    pending = deque()
+    pool = ThreadPoolExecutor(max_workers=max(workers, 1))
+    try:
+        for item in itertools.islice(items, window):
+            pending.append((item, pool.submit(fetch, item), 0))
+        while pending:
+            item, future, requeues = pending.popleft()
+            for next_item in itertools.islice(items, max(window - len(pending), 0)):
+                pending.append((next_item, pool.submit(fetch, next_item), 0))
+            try:
+                result, error = future.result(), None
+            except Exception as e:
+                result, error = None, e
+            if requeue is not None and requeues < max_requeues and requeue(item, result, error):
+                pending.appendleft((item, pool.submit(fetch, item), requeues + 1))
+                continue
+            yield item, result, error
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,210 @@
+"""Crawl chạy nền: tạo job, theo dõi tiến độ và tải kết quả sau khi xong.
+
+Mọi job dùng chung một nhóm worker có giới hạn (và chung bộ giới hạn tốc độ
+theo host), nên nhiều người dùng cùng lúc không làm tăng tải lên trang nguồn.
+Trạng thái và file kết quả của job được lưu trên đĩa.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from . import settings
+from .checkpoint import get_checkpoints
+from .crawler import iter_rows
+from .dedup import dedup_rows
+from .export import write_csv, write_excel
+from .normalize import NORMALIZED_COLUMNS, normalize_rows
+from .parsers import COLUMNS, no_data_row
+from .store import get_store
+
+EXPORT_FORMATS = {
+    'csv': ('csv', write_csv),
+    'excel': ('xlsx', write_excel),
+}
+
+
+class Job:
+    """Một lượt crawl chạy nền"""
+
+    def __init__(self, job_id, params, pages_total):
+        self.id = job_id
+        self.params = params
+        self.status = 'queued'
+        self.pages_total = pages_total
+        self.plan = None
+        self.pages_done = 0
+        self.rows = 0
+        self.error = None
+        self.result_path = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def eta(self):
+        """Số giây ước tính còn lại, dựa trên tốc độ các trang đã xong"""
+        if self.status != 'running' or not self.pages_done:
+            return None
+        per_page = (time.time() - self.started_at) / self.pages_done
+        return round(per_page * max(self.pages_total - self.pages_done, 0), 1)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'params': self.params,
+            'pages_total': self.pages_total,
+            'plan': self.plan,
+            'pages_done': self.pages_done,
+            'rows': self.rows,
+            'eta_seconds': self.eta(),
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data['job_id'], data['params'], data['pages_total'])
+        for key in ('status', 'pages_done', 'rows', 'error', 'created_at', 'started_at', 'finished_at'):
+            setattr(job, key, data[key])
+        job.plan = data.get('plan')
+        return job
+
+
+class JobManager:
+    """Quản lý job crawl chạy nền trên một nhóm worker dùng chung"""
+
+    def __init__(self, directory=settings.JOBS_DIR, workers=settings.JOB_WORKERS):
+        self.directory = directory
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='crawl-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _meta_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def _result_path(self, job):
+        extension = EXPORT_FORMATS[job.params['export_type']][0]
+        return os.path.join(self.directory, f'{job.id}.{extension}')
+
+    def _load(self):
+        """Đọc lại các job đã lưu; job đang dở khi process dừng được đánh dấu thất bại"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    data = json.load(f)
+                job = Job.from_dict(data)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Không đọc được job {name}: {e}")
+                continue
+            if job.status == 'done':
+                job.result_path = self._result_path(job)
+            elif job.status in ('queued', 'running'):
+                job.status = 'failed'
+                # Các trang đã xong nằm trong checkpoint, gửi lại job sẽ chạy tiếp từ trang còn thiếu
+                job.error = 'Job bị gián đoạn khi khởi động lại, gửi lại cùng truy vấn để chạy tiếp'
+            self._jobs[job.id] = job
+
+    def _save(self, job):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = self._meta_path(job.id) + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(job.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp, self._meta_path(job.id))
+        except OSError as e:
+            print(f"Không lưu được trạng thái job {job.id}: {e}")
+
+    def submit(self, nganh_hang, khu_vuc, page_start=1, page_end=10, export_type='excel',
+               incremental=False, dedup=False, normalize=False):
+        """Tạo job mới và đưa vào hàng đợi, trả về Job; các tùy chọn giống form /crawl"""
+        if export_type not in EXPORT_FORMATS:
+            export_type = 'excel'
+        params = {
+            'nganh_hang': nganh_hang,
+            'khu_vuc': khu_vuc,
+            'page_start': page_start,
+            'page_end': page_end,
+            'export_type': export_type,
+            'incremental': incremental,
+            'dedup': dedup,
+            'normalize': normalize,
+        }
+        job = Job(uuid.uuid4().hex, params, max(page_end - page_start + 1, 0))
+        with self._lock:
+            self._jobs[job.id] = job
+        self._save(job)
+        self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        self._save(job)
+
+        def on_plan(plan):
+            job.plan = plan.to_dict()
+            job.pages_total = plan.pages_total
+            self._save(job)
+
+        def on_page(page, count):
+            job.pages_done += 1
+            job.rows += count
+
+        params = job.params
+        path = self._result_path(job)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Job lưu trước khi có các tùy chọn thì không có các khóa này
+            rows = iter_rows(params['nganh_hang'], params['khu_vuc'], params['page_start'],
+                             params['page_end'], on_page=on_page, store=get_store(),
+                             incremental=params.get('incremental', False),
+                             on_plan=on_plan, checkpoints=get_checkpoints())
+            columns = COLUMNS
+            if params.get('dedup'):
+                rows = dedup_rows(rows)
+            if params.get('normalize'):
+                rows = normalize_rows(rows)
+                columns = columns + NORMALIZED_COLUMNS
+            writer = EXPORT_FORMATS[params['export_type']][1]
+            with open(path, 'wb') as f:
+                writer(rows, f, columns, placeholder=no_data_row())
+        except Exception as e:
+            print(f"Job {job.id} thất bại: {e}")
+            job.status = 'failed'
+            job.error = str(e)
+        else:
+            job.status = 'done'
+            job.result_path = path
+            # Crawl vẫn có thể dừng sớm ở trang rỗng
+            job.pages_total = job.pages_done
+        job.finished_at = time.time()
+        self._save(job)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    """JobManager dùng chung cho cả process (tạo ở lần gọi đầu tiên)"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
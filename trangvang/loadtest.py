@@ -0,0 +1,235 @@
+"""Thử tải đầu-cuối: nhiều client cùng gọi /crawl, /batch hoặc /jobs của app trên máy chủ giả lập.
+
+Mặc định chạy máy chủ giả lập (trangvang.standin) và app (`--app`, import trong
+cùng process với TRANGVANG_BASE_URL trỏ vào máy chủ giả lập và thư mục dữ liệu
+tạm). Mỗi client gửi lần lượt `--requests` lượt crawl, mỗi lượt một ngành hàng
+khác nhau. Báo cáo throughput, độ trễ p50/p99 của mỗi lượt, RSS đỉnh, các lỗi
+mà máy chủ giả lập đã trả về và tỷ lệ dòng nhận được so với số dòng có thật
+(khả năng phục hồi sau lỗi). Các chiến lược tải được so bằng biến môi trường
+(vd TRANGVANG_ADAPTIVE=0, TRANGVANG_PARSE_WORKERS=2).
+
+    python -m trangvang.loadtest                              # app, 4 client, /crawl
+    python -m trangvang.loadtest --endpoint jobs --clients 8 --throttle-rate 0.1
+    python -m trangvang.loadtest --app api.index --pages 40 --latency 0.3
+    python -m trangvang.loadtest --url http://127.0.0.1:5000 --standin-port 8765
+
+Với `--url` app chạy riêng và phải được khởi động với
+TRANGVANG_BASE_URL=http://127.0.0.1:<standin-port>/; RSS đỉnh lấy từ /metrics.
+"""
+import argparse
+import contextlib
+import csv
+import importlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ENDPOINTS = ('crawl', 'batch', 'jobs')
+# Số truy vấn trong mỗi lượt /batch
+BATCH_QUERIES = 3
+JOB_POLL_INTERVAL = 0.2
+
+
+class AppTarget:
+    """Gọi app trong cùng process qua Flask test client"""
+
+    def __init__(self, module):
+        self.app = importlib.import_module(module).app
+        self._local = threading.local()
+
+    def request(self, method, path, **kwargs):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        resp = client.open(path, method=method, **kwargs)
+        return resp.status_code, resp.headers, resp.get_data()
+
+    def peak_rss_kb(self):
+        from .rows import peak_rss_kb
+
+        return peak_rss_kb()
+
+
+class HttpTarget:
+    """Gọi app đang chạy ở `url`"""
+
+    def __init__(self, url):
+        import requests
+
+        self.url = url.rstrip('/')
+        self._session = requests.Session()
+
+    def request(self, method, path, data=None, json=None):
+        resp = self._session.request(method, self.url + path, data=data, json=json, timeout=600)
+        return resp.status_code, resp.headers, resp.content
+
+    def peak_rss_kb(self):
+        status, headers, body = self.request('GET', '/metrics')
+        for line in body.decode('utf-8', 'replace').splitlines():
+            if line.startswith('trangvang_peak_rss_bytes '):
+                return int(float(line.split()[1])) // 1024
+        return None
+
+
+def count_rows(body):
+    """Số dòng dữ liệu trong file CSV kết quả (không tính tiêu đề và dòng 'Không tìm thấy dữ liệu')"""
+    rows = list(csv.reader(io.StringIO(body.decode('utf-8-sig', 'replace'))))[1:]
+    if len(rows) == 1 and rows[0] and rows[0][0] == 'Không tìm thấy dữ liệu':
+        return 0
+    return len(rows)
+
+
+def run_crawl(target, name, pages):
+    """Một lượt /crawl, đi tiếp theo X-Continuation-Token (api/index.py); trả về (số dòng, số lần gọi, lỗi)"""
+    form = {'nganh_hang': name, 'khu_vuc': 'ho chi minh', 'page_start': 1, 'page_end': pages, 'export_type': 'csv'}
+    rows = calls = 0
+    while True:
+        status, headers, body = target.request('POST', '/crawl', data=form)
+        calls += 1
+        if status != 200 or not headers.get('Content-Type', '').startswith('text/csv'):
+            return rows, calls, f'/crawl -> {status}'
+        rows += count_rows(body)
+        token = headers.get('X-Continuation-Token')
+        if not token:
+            return rows, calls, None
+        form = {'continuation': token, 'export_type': 'csv'}
+
+
+def run_batch(target, name, pages):
+    queries = [{'nganh_hang': f'{name}-{index}', 'khu_vuc': 'ho chi minh', 'page_end': pages}
+               for index in range(BATCH_QUERIES)]
+    status, headers, body = target.request('POST', '/batch', json={'queries': queries, 'export_type': 'csv'})
+    if status != 200:
+        return 0, 1, f'/batch -> {status}'
+    return count_rows(body), 1, None
+
+
+def run_job(target, name, pages):
+    form = {'nganh_hang': name, 'khu_vuc': 'ho chi minh', 'page_start': 1, 'page_end': pages, 'export_type': 'csv'}
+    status, headers, body = target.request('POST', '/jobs', data=form)
+    if status != 202:
+        return 0, 1, f'/jobs -> {status}'
+    job_id = json.loads(body)['job_id']
+    calls = 1
+    while True:
+        time.sleep(JOB_POLL_INTERVAL)
+        status, headers, body = target.request('GET', f'/jobs/{job_id}')
+        calls += 1
+        job_status = json.loads(body).get('status') if status == 200 else None
+        if job_status == 'done':
+            break
+        if job_status not in ('queued', 'running'):
+            return 0, calls, f'job {job_id}: {job_status or status}'
+    status, headers, body = target.request('GET', f'/jobs/{job_id}/result')
+    if status != 200:
+        return 0, calls + 1, f'/jobs/{job_id}/result -> {status}'
+    return count_rows(body), calls + 1, None
+
+
+RUNNERS = {'crawl': run_crawl, 'batch': run_batch, 'jobs': run_job}
+
+
+def percentile(values, q):
+    """Phân vị `q` (0-100) theo nearest-rank; None nếu không có giá trị"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(math.ceil(q / 100 * len(values)) - 1, 0)]
+
+
+def run(target, endpoint, clients, requests_per_client, pages, same_query=False):
+    """Chạy thử tải, trả về danh sách kết quả từng lượt và tổng thời gian"""
+    runner = RUNNERS[endpoint]
+    results = []
+    lock = threading.Lock()
+
+    def client(index):
+        for number in range(requests_per_client):
+            # Mỗi lượt một ngành hàng riêng để không trúng cache/checkpoint của lượt khác,
+            # trừ khi muốn đo cache kết quả và gộp request giống hệt (--same-query)
+            name = 'tai' if same_query else f'tai {index} {number}'
+            start = time.perf_counter()
+            try:
+                rows, calls, error = runner(target, name, pages)
+            except Exception as e:
+                rows, calls, error = 0, 1, repr(e)
+            with lock:
+                results.append({'seconds': time.perf_counter() - start, 'rows': rows, 'calls': calls,
+                                'error': error})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    return results, time.perf_counter() - start
+
+
+def report(results, elapsed, expected_rows, server_stats, peak_rss):
+    """In báo cáo; trả về True nếu mọi lượt thành công"""
+    latencies = [result['seconds'] for result in results]
+    rows = sum(result['rows'] for result in results)
+    errors = [result['error'] for result in results if result['error']]
+    print(f"Lượt crawl: {len(results)} ({len(errors)} lỗi), {sum(r['calls'] for r in results)} request tới app, "
+          f"{elapsed:.1f} giây")
+    print(f"  throughput: {len(results) / elapsed:.2f} lượt/giây, {rows / elapsed:.1f} dòng/giây")
+    if latencies:
+        print(f"  độ trễ mỗi lượt: p50 {percentile(latencies, 50):.2f} s, p99 {percentile(latencies, 99):.2f} s, "
+              f"max {max(latencies):.2f} s")
+    if peak_rss is not None:
+        print(f"  RSS đỉnh của app: {peak_rss / 1024:.1f} MB")
+    statuses = server_stats['statuses']
+    print(f"  máy chủ giả lập: {server_stats['requests']} request, theo status {statuses}, "
+          f"tối đa {server_stats['max_in_flight']} request đồng thời")
+    if expected_rows:
+        print(f"  phục hồi: nhận {rows}/{expected_rows} dòng ({rows / expected_rows:.1%})")
+    for error in sorted(set(errors))[:10]:
+        print(f"  lỗi: {error}")
+    return not errors
+
+
+def main(argv=None):
+    # settings đọc biến môi trường lúc import: đặt trước khi import module nào của trangvang
+    # để app chạy trong process này dùng thư mục dữ liệu tạm (cache, kho, checkpoint, job)
+    os.environ.setdefault('TRANGVANG_DATA_DIR', tempfile.mkdtemp(prefix='trangvang-loadtest-'))
+    from . import crawler, standin
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--endpoint', choices=ENDPOINTS, default='crawl')
+    parser.add_argument('--app', default='app', help='module app chạy trong cùng process (app, app_advanced, api.index)')
+    parser.add_argument('--url', help='gọi app đang chạy ở URL này thay vì import --app')
+    parser.add_argument('--clients', type=int, default=4, help='số client đồng thời')
+    parser.add_argument('--requests', type=int, default=2, help='số lượt crawl của mỗi client')
+    parser.add_argument('--same-query', action='store_true',
+                        help='mọi lượt crawl cùng một truy vấn (đo cache kết quả của /crawl)')
+    parser.add_argument('--standin-port', type=int, default=0, help='cổng của máy chủ giả lập (0 = cổng bất kỳ)')
+    standin.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = standin.from_arguments(args, args.standin_port)
+    server.start()
+    try:
+        if args.url:
+            target = HttpTarget(args.url)
+        else:
+            crawler.BASE_URL = server.base_url
+            target = AppTarget(args.app)
+        print(f"Thử tải /{args.endpoint}: {args.clients} client x {args.requests} lượt, {args.pages} trang mỗi truy vấn, "
+              f"máy chủ giả lập {server.base_url}")
+        # Log từng trang của app quá nhiều khi chạy nhiều client
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            results, elapsed = run(target, args.endpoint, args.clients, args.requests, args.pages, args.same_query)
+        # /batch gộp công ty trùng giữa các truy vấn nên không so được số dòng
+        expected = server.expected_rows(1, args.pages) * len(results) if args.endpoint != 'batch' else None
+        ok = report(results, elapsed, expected, server.stats(), target.peak_rss_kb())
+    finally:
+        server.stop()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
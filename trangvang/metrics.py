@@ -0,0 +1,204 @@
+"""Số liệu dạng Prometheus cho crawler: thời gian từng bước, counter và gauge.
+
+Tắt bằng TRANGVANG_METRICS=0; khi tắt, timer() trả về context rỗng dùng chung
+và các hàm inc/observe trả về ngay nên gần như không tốn gì.
+"""
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from . import settings
+
+ENABLED = settings.METRICS_ENABLED
+
+# Giây; đủ rộng cho cả bước phân tích vài ms lẫn request chậm vài chục giây
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_METRICS = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _METRICS.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(self._samples(items))
+        return lines
+
+    def _samples(self, items):
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}' for key, value in items]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _labels(self.labelnames, key, [('le', _number(bound))])
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, [("le", "+Inf")])} {count}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+STAGE_SECONDS = Histogram('trangvang_stage_seconds',
+                          'Thời gian từng bước: fetch, decode, parse, extract, export', ['stage'])
+PAGES = Counter('trangvang_pages_total', 'Số trang kết quả đã phân tích')
+LISTINGS = Counter('trangvang_listings_total', 'Số đơn vị trích xuất được')
+HTTP_RESPONSES = Counter('trangvang_http_responses_total', 'Số response HTTP theo status', ['status'])
+ERRORS = Counter('trangvang_errors_total', 'Số lỗi theo bước', ['stage'])
+CRAWLS_IN_FLIGHT = Gauge('trangvang_crawls_in_flight', 'Số lượt crawl đang chạy')
+REQUEUED = Counter('trangvang_requeued_pages_total', 'Số lần trang bị giới hạn/timeout được đưa lại hàng đợi')
+LIMITER_RATE = Gauge('trangvang_limiter_rate', 'Giới hạn request mỗi giây hiện tại cho mỗi host')
+LIMITER_IN_FLIGHT = Gauge('trangvang_limiter_max_in_flight', 'Giới hạn request đồng thời hiện tại cho mỗi host')
+RESULT_CACHE = Counter('trangvang_result_cache_total', 'Số request /crawl theo kết quả tra cache kết quả',
+                       ['outcome'])
+RESULT_CACHE_BYTES = Gauge('trangvang_result_cache_bytes', 'Dung lượng các file kết quả đang được cache')
+PEAK_RSS = Gauge('trangvang_peak_rss_bytes', 'RSS đỉnh của process sau lượt crawl gần nhất')
+
+
+class _Timer:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        captured = getattr(_captured, 'stages', None)
+        if captured is not None:
+            captured.append((self.stage, seconds))
+        else:
+            STAGE_SECONDS.observe(seconds, stage=self.stage)
+        return False
+
+
+_NULL_TIMER = nullcontext()
+_captured = threading.local()
+
+
+def timer(stage):
+    """Context đo thời gian một bước vào trangvang_stage_seconds"""
+    return _Timer(stage) if ENABLED else _NULL_TIMER
+
+
+@contextmanager
+def capture_stages():
+    """Gom thời gian các bước đo bằng timer() trong khối thành list (stage, giây) thay vì ghi ngay.
+
+    Dùng trong process con, nơi histogram không được process cha đọc tới; trả list
+    đó về cùng kết quả rồi ghi lại ở process cha bằng record_stages().
+    """
+    stages = _captured.stages = []
+    try:
+        yield stages
+    finally:
+        _captured.stages = None
+
+
+def record_stages(stages):
+    """Ghi vào trangvang_stage_seconds các bước đã gom bằng capture_stages()"""
+    for stage, seconds in stages:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def render():
+    """Toàn bộ số liệu theo định dạng text của Prometheus"""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Content-Type của định dạng text Prometheus
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
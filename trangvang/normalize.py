@@ -0,0 +1,227 @@
+"""Chuẩn hóa giá trị để so khớp công ty giữa các lần crawl."""
+import re
+import unicodedata
+
+# Số dòng mỗi khối của normalize_rows khi kết quả được stream (CSV): nhỏ hơn một trang
+# kết quả, để byte đầu tiên vẫn được gửi ngay sau trang đầu
+STREAM_CHUNK_SIZE = 20
+
+# Số giá trị normalize_rows nhớ cho mỗi cột, để lượt dài không giữ mọi giá trị đã gặp
+MEMO_SIZE = 10000
+
+_NON_DIGIT_RE = re.compile(r'\D+')
+_NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+_SCHEME_RE = re.compile(r'^[a-z][a-z0-9+.-]*://')
+
+
+def strip_accents(text):
+    """Bỏ dấu tiếng Việt (kể cả đ/Đ) như to_slug, giữ nguyên khoảng trắng"""
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFKD', text)
+    return text.encode('ascii', 'ignore').decode('ascii')
+
+
+def normalize_phone(phone):
+    """Chỉ giữ chữ số, đổi đầu số 84 thành 0; trả về '' nếu quá ngắn"""
+    digits = _NON_DIGIT_RE.sub('', phone or '')
+    if digits.startswith('84') and len(digits) >= 11:
+        digits = '0' + digits[2:]
+    return digits if len(digits) >= 8 else ''
+
+
+def split_phones(value):
+    """Tách cột 'Số điện thoại' ('a, b') thành danh sách số đã chuẩn hóa"""
+    phones = (normalize_phone(part) for part in (value or '').split(','))
+    return list(dict.fromkeys(phone for phone in phones if phone))
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def normalize_website(url):
+    """Bỏ scheme, 'www.' và '/' cuối; giữ đường dẫn vì nhiều đơn vị dùng chung một domain"""
+    url = _SCHEME_RE.sub('', (url or '').strip().lower())
+    if url.startswith('www.'):
+        url = url[4:]
+    return url.split('#', 1)[0].rstrip('/')
+
+
+def normalize_name(name):
+    """Tên không dấu, chữ thường, chỉ còn chữ và số cách nhau một khoảng trắng"""
+    return _NON_WORD_RE.sub(' ', strip_accents(name or '').lower()).strip()
+
+
+# --- Chuẩn hóa cả tập kết quả trước khi xuất -------------------------------
+
+NORMALIZED_COLUMNS = ['Điện thoại (E.164)', 'Số nhà, đường', 'Phường/Xã', 'Quận/Huyện', 'Tỉnh/Thành phố']
+
+# Mã vùng điện thoại cố định theo tỉnh/thành (từ 2017), khóa là tên không dấu
+AREA_CODES = {
+    'ha noi': '24', 'ho chi minh': '28', 'hai phong': '225', 'da nang': '236', 'can tho': '292',
+    'an giang': '296', 'ba ria vung tau': '254', 'bac lieu': '291', 'bac giang': '204', 'bac kan': '209',
+    'bac ninh': '222', 'ben tre': '275', 'binh duong': '274', 'binh dinh': '256', 'binh phuoc': '271',
+    'binh thuan': '252', 'ca mau': '290', 'cao bang': '206', 'dak lak': '262', 'dak nong': '261',
+    'dien bien': '215', 'dong nai': '251', 'dong thap': '277', 'gia lai': '269', 'ha giang': '219',
+    'ha nam': '226', 'ha tinh': '239', 'hai duong': '220', 'hau giang': '293', 'hoa binh': '218',
+    'hung yen': '221', 'khanh hoa': '258', 'kien giang': '297', 'kon tum': '260', 'lai chau': '213',
+    'lam dong': '263', 'lang son': '205', 'lao cai': '214', 'long an': '272', 'nam dinh': '228',
+    'nghe an': '238', 'ninh binh': '229', 'ninh thuan': '259', 'phu tho': '210', 'phu yen': '257',
+    'quang binh': '232', 'quang nam': '235', 'quang ngai': '255', 'quang ninh': '203', 'quang tri': '233',
+    'soc trang': '299', 'son la': '212', 'tay ninh': '276', 'thai binh': '227', 'thai nguyen': '208',
+    'thanh hoa': '237', 'thua thien hue': '234', 'tien giang': '273', 'tra vinh': '294',
+    'tuyen quang': '207', 'vinh long': '270', 'vinh phuc': '211', 'yen bai': '216',
+}
+# Tên viết tắt hay gặp của hai thành phố lớn
+PROVINCE_ALIASES = {'hcm': 'ho chi minh', 'tphcm': 'ho chi minh', 'tp hcm': 'ho chi minh', 'hn': 'ha noi'}
+# Đầu số cũ của Hà Nội và TP.HCM trước khi đổi mã vùng, ví dụ '(08) 38772042'
+_OLD_AREA_RE = re.compile(r'^\s*\(0([48])\)')
+_OLD_AREA_CODES = {'4': '24', '8': '28'}
+
+_PROVINCE_PREFIX_RE = re.compile(r'^(?:tp|tinh|thanh pho)\b\.?\s*')
+_PROVINCE_LABEL_RE = re.compile(r'^(?:TP\.|Thành phố|Tỉnh)\s*', re.IGNORECASE)
+_WARD_RE = re.compile(r'^(Phường|P\.|Xã|X\.|Thị [Tt]rấn|TT\.)\s*(.*)$', re.IGNORECASE)
+_DISTRICT_RE = re.compile(r'^(Quận|Q\.|Huyện|H\.|Thị [Xx]ã|TX\.|Thành [Pp]hố|TP\.)\s*(.*)$', re.IGNORECASE)
+# Nhãn đứng trước địa chỉ: 'VPGD:', 'Văn Phòng:', 'Trụ sở:', 'Xưởng:'...
+_ADDRESS_LABEL_RE = re.compile(r'^[^\d:,]{2,20}:\s*')
+_ADDRESS_SPLIT_RE = re.compile(r'\s*,\s*')
+_UNIT_NAMES = {
+    'p.': 'Phường', 'x.': 'Xã', 'tt.': 'Thị Trấn',
+    'q.': 'Quận', 'h.': 'Huyện', 'tx.': 'Thị Xã', 'tp.': 'Thành Phố',
+}
+
+
+def province_key(text):
+    """Tên tỉnh/thành không dấu, bỏ 'TP.'/'Tỉnh', dùng làm khóa của AREA_CODES"""
+    key = _PROVINCE_PREFIX_RE.sub('', strip_accents(text or '').lower().strip())
+    key = _NON_WORD_RE.sub(' ', key).strip()
+    return PROVINCE_ALIASES.get(key, key)
+
+
+def to_e164(phone, area_code=None):
+    """Số điện thoại Việt Nam dạng +84...; số cố định không có mã vùng dùng `area_code`.
+
+    Trả về '' với số không chuyển được (đầu số dịch vụ 1800/1900, thiếu mã vùng...).
+    """
+    old = _OLD_AREA_RE.match(phone or '')
+    digits = _NON_DIGIT_RE.sub('', phone or '')
+    if old:
+        # '(08) 38772042': bỏ đầu số cũ, thêm mã vùng mới
+        digits = '0' + _OLD_AREA_CODES[old.group(1)] + digits[2:]
+    if digits.startswith('84') and len(digits) >= 11:
+        digits = '0' + digits[2:]
+    if digits.startswith('0') and len(digits) in (10, 11):
+        return '+84' + digits[1:]
+    if area_code and not digits.startswith(('0', '1')) and len(digits) in (7, 8):
+        return '+84' + area_code + digits
+    return ''
+
+
+def _unit_name(match):
+    """'P. 16' -> 'Phường 16', 'Quận Tân Phú' giữ nguyên"""
+    label, name = match.groups()
+    return f"{_UNIT_NAMES.get(label.lower(), label)} {name.strip()}".strip()
+
+
+def split_address(address):
+    """Tách địa chỉ thành (số nhà/đường, phường/xã, quận/huyện, tỉnh/thành).
+
+    Chỉ tách khi phần cuối (bỏ 'Việt Nam') là một tỉnh/thành đã biết, ngược lại
+    trả về bốn chuỗi rỗng. 'P.', 'Q.', 'H.'... được viết đầy đủ.
+    """
+    parts = [part for part in _ADDRESS_SPLIT_RE.split((address or '').strip().rstrip(',')) if part]
+    if parts and province_key(parts[-1]) == 'viet nam':
+        parts.pop()
+    if not parts or province_key(parts[-1]) not in AREA_CODES:
+        return '', '', '', ''
+    province = _PROVINCE_LABEL_RE.sub('', parts.pop())
+    ward = district = ''
+    if parts:
+        match = _DISTRICT_RE.match(parts[-1])
+        if match:
+            district = _unit_name(match)
+            parts.pop()
+    if parts:
+        match = _WARD_RE.match(parts[-1])
+        if match:
+            ward = _unit_name(match)
+            parts.pop()
+    return _ADDRESS_LABEL_RE.sub('', ', '.join(parts)), ward, district, province
+
+
+_URL_HOST_RE = re.compile(r'^(?:[a-zA-Z][a-zA-Z0-9+.-]*://)?[^/?#]*')
+
+
+def lower_host(url):
+    """Chữ thường cho scheme và domain của URL, giữ nguyên phần đường dẫn"""
+    url = (url or '').strip()
+    return _URL_HOST_RE.sub(lambda m: m.group().lower(), url, count=1)
+
+
+def _map_unique(memo, func, values, max_size=MEMO_SIZE):
+    """func(value) cho cả cột; giá trị đã gặp (trong `memo`) không bị tính lại.
+
+    `memo` giữ tối đa `max_size` giá trị; đầy thì xóa hết và nhớ lại từ đầu (rẻ hơn
+    bỏ từng giá trị cũ nhất, vì xóa dần ở đầu dict làm lần duyệt tìm khóa đầu chậm đi).
+    """
+    results = []
+    for value in values:
+        result = memo.get(value)
+        if result is None:
+            if len(memo) >= max_size:
+                memo.clear()
+            result = memo[value] = func(value)
+        results.append(result)
+    return results
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _split_row_address(key):
+    """split_address của 'Địa chỉ'; dòng mà 'Địa chỉ' không phải địa chỉ (vd 'NGÀNH:...')
+    thì lấy địa chỉ đầu tiên trong 'Địa chỉ bổ sung'"""
+    address, extra = key
+    parts = split_address(address)
+    if not parts[3] and extra:
+        parts = split_address(extra.split('Việt Nam', 1)[0])
+    return parts
+
+
+def _phones_e164(key):
+    phones, area_code = key
+    numbers = (to_e164(phone, area_code) for phone in (phones or '').split(','))
+    return ', '.join(dict.fromkeys(number for number in numbers if number))
+
+
+def normalize_rows(rows, chunk_size=1000):
+    """Sinh lại các dòng kèm NORMALIZED_COLUMNS; email và domain của website được viết thường.
+
+    Các dòng được xử lý theo khối `chunk_size` dòng, mỗi lần một cột cho cả khối
+    (khi stream thì dùng STREAM_CHUNK_SIZE để không giữ dòng lại chờ đủ khối),
+    và giá trị trùng nhau (cùng địa chỉ, cùng số điện thoại, hay gặp khi một công
+    ty xuất hiện ở nhiều trang/truy vấn) chỉ được tính một lần; mỗi cột nhớ tối
+    đa MEMO_SIZE giá trị.
+    Số cố định thiếu mã vùng lấy mã vùng theo tỉnh/thành của địa chỉ.
+    """
+    memos = {'address': {}, 'phones': {}, 'email': {}, 'website': {}}
+    for chunk in _chunks(rows, chunk_size):
+        addresses = _map_unique(memos['address'], _split_row_address,
+                                [(row.get('Địa chỉ') or '', row.get('Địa chỉ bổ sung') or '') for row in chunk])
+        area_codes = [AREA_CODES.get(province_key(parts[3])) for parts in addresses]
+        phones = _map_unique(memos['phones'], _phones_e164,
+                             [(row.get('Số điện thoại') or '', area_code) for row, area_code in zip(chunk, area_codes)])
+        emails = _map_unique(memos['email'], normalize_email, [row.get('Email') or '' for row in chunk])
+        websites = _map_unique(memos['website'], lower_host, [row.get('Website') or '' for row in chunk])
+        for row, parts, phone, email, website in zip(chunk, addresses, phones, emails, websites):
+            row = dict(row, Email=email, Website=website)
+            row.update(zip(NORMALIZED_COLUMNS, (phone,) + parts))
+            yield row
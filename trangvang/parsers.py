@@ -0,0 +1,440 @@
+"""Bộ phân tích trang kết quả: tách danh sách đơn vị và các trường của từng đơn vị.
+
+Có hai engine cho ra cùng một kết quả:
+- `bs4`: BeautifulSoup + html.parser, dùng các hàm extract_* như trước.
+- `lxml`: phân tích thẳng từ bytes, XPath biên dịch sẵn, mỗi đơn vị chỉ duyệt cây con một lần.
+
+parse_stream(chunks, encoding) phân tích trang đang tải theo từng khúc bytes:
+engine lxml sinh dòng của mỗi đơn vị ngay khi thẻ của nó đóng, engine bs4 đọc
+hết rồi mới phân tích.
+"""
+import re
+
+from lxml import etree
+from lxml import html as lxml_html
+
+from .metrics import timer
+
+COLUMNS = ['Tên Khách Hàng', 'Số điện thoại', 'Địa chỉ', 'Địa chỉ bổ sung', 'Email', 'Website', 'Mô tả']
+
+# Link tới trang chi tiết của đơn vị (link của tên); có trong mọi dòng nhưng không xuất ra file
+DETAIL_URL = 'detail_url'
+ROW_FIELDS = COLUMNS + [DETAIL_URL]
+
+LISTING_SELECTOR = 'div.div_list_cty > div.w-100.h-auto.shadow.rounded-3.bg-white.p-2.mb-3'
+NAME_SELECTOR = 'div.listings_center h2 a, div.listings_center_khongxacthuc h2 a'
+ADDRESS_SELECTOR = 'div.logo_congty_diachi > div, div.listing_diachi_nologo > div'
+PAGING_SELECTOR = 'div#paging a'
+COUNTER_SELECTOR = 'span.ketquatimkiem_counter'
+
+# Từ khóa nhận diện một dòng là địa chỉ
+ADDRESS_KEYWORDS = ('Việt Nam', 'TP.', 'Tỉnh', 'Quận', 'Huyện', 'Phường', 'Xã', 'ấp', 'Đường', 'Khu', 'Lô', 'Số')
+
+_NUMERIC_ENTITY_RE = re.compile(r'&#\d+;')
+_NAMED_ENTITY_RE = re.compile(r'&[a-zA-Z]+;')
+_SPACES_RE = re.compile(r'\s+')
+_NON_PHONE_RE = re.compile(r'[^\d\(\)\-\s]')
+_COUNTER_RE = re.compile(r'\d[\d.,]*')
+_ADDRESS_KEYWORDS_RE = re.compile('|'.join(map(re.escape, ADDRESS_KEYWORDS)))
+
+
+def clean_text(text):
+    """Làm sạch text, loại bỏ HTML entities và ký tự đặc biệt"""
+    if not text:
+        return ''
+    # Loại bỏ HTML entities (đa số trường không có '&' nên bỏ qua hai lượt này)
+    if '&' in text:
+        text = _NUMERIC_ENTITY_RE.sub('', text)
+        text = _NAMED_ENTITY_RE.sub('', text)
+    # Loại bỏ ký tự đặc biệt không cần thiết
+    text = _SPACES_RE.sub(' ', text)
+    return text.strip()
+
+
+def is_phone(phone_text):
+    """Số điện thoại hợp lệ: ít nhất 8 ký tự sau khi bỏ ký tự không phải số và dấu ngoặc"""
+    return bool(phone_text) and len(phone_text) >= 8 and len(_NON_PHONE_RE.sub('', phone_text)) >= 8
+
+
+def is_address(txt):
+    """Lọc địa chỉ chính (có chứa từ khóa địa chỉ)"""
+    return len(txt) > 10 and _ADDRESS_KEYWORDS_RE.search(txt) is not None
+
+
+def make_row(name, phones, addresses, email, website, description, detail_url=''):
+    """Tạo một dòng kết quả từ các trường đã trích xuất"""
+    return {
+        'Tên Khách Hàng': name,
+        'Số điện thoại': ', '.join(phones) if phones else '',
+        'Địa chỉ': addresses[0] if addresses else '',
+        'Địa chỉ bổ sung': ', '.join(addresses[1:]) if len(addresses) > 1 else '',
+        'Email': email,
+        'Website': website,
+        'Mô tả': description,
+        DETAIL_URL: detail_url,
+    }
+
+
+def no_data_row():
+    """Dòng thay thế khi không tìm thấy đơn vị nào"""
+    return make_row('Không tìm thấy dữ liệu', [], [], '', '', '')
+
+
+def page_info(paging_texts, counter_text):
+    """Thông tin phân trang của một trang kết quả.
+
+    `last_page` là số lớn nhất trong các link số của khối phân trang (link 'Tiếp'
+    có thể trỏ tới trang lạ nên bỏ qua), `total_results` lấy từ dòng
+    '(1000 kết quả được tìm thấy)'. Giá trị không đọc được là None.
+    """
+    pages = [int(text) for text in (t.strip() for t in paging_texts) if text.isdigit()]
+    total = None
+    match = _COUNTER_RE.search(counter_text or '')
+    if match:
+        total = int(match.group().replace('.', '').replace(',', ''))
+    return {'last_page': max(pages) if pages else None, 'total_results': total}
+
+
+class BufferedStream:
+    """parse_stream của engine không phân tích được theo từng khúc: đọc hết rồi parse_page.
+
+    Duyệt để lấy các dòng; duyệt xong thì `info` là page_info của trang.
+    """
+
+    def __init__(self, parser, chunks, encoding='utf-8'):
+        self.parser = parser
+        self.chunks = chunks
+        self.encoding = encoding
+        self.info = None
+
+    def __iter__(self):
+        rows, self.info = self.parser.parse_page(b''.join(self.chunks), self.encoding)
+        return iter(rows)
+
+
+# --- Engine BeautifulSoup ---------------------------------------------------
+
+def extract_phones(comp):
+    """Trích xuất tất cả số điện thoại từ một đơn vị"""
+    phones = []
+
+    # Tìm tất cả thẻ a có href="tel:..." trong toàn bộ đơn vị
+    for link in comp.select('a[href^="tel:"]'):
+        phone_text = link.get_text(strip=True)
+        if is_phone(phone_text):
+            phones.append(phone_text)
+
+    # Loại bỏ số trùng lặp
+    return list(dict.fromkeys(phones))
+
+
+def extract_addresses(comp):
+    """Trích xuất tất cả địa chỉ từ một đơn vị"""
+    addresses = []
+    for div in comp.select(ADDRESS_SELECTOR):
+        txt = div.get_text(strip=True)
+        if is_address(txt):
+            addresses.append(clean_text(txt))
+    return addresses
+
+
+def extract_description(comp):
+    """Trích xuất mô tả từ một đơn vị"""
+    desc_tag = comp.select_one('div.div_textqc small.text_qc')
+    if desc_tag:
+        description = desc_tag.get_text(separator=' ', strip=True)
+        return clean_text(description)
+    return ''
+
+
+def extract_contact_info(comp):
+    """Trích xuất thông tin liên hệ (email, website)"""
+    email = ''
+    website = ''
+
+    # Tìm email
+    email_tag = comp.select_one('div.email_web_section a[href^="mailto:"]')
+    if email_tag:
+        email = email_tag.get('href', '').replace('mailto:', '').strip()
+
+    # Tìm website
+    website_tag = comp.select_one('div.email_web_section a[href^="http"]')
+    if website_tag:
+        website = website_tag.get('href', '').strip()
+
+    return email, website
+
+
+class BeautifulSoupParser:
+    """Engine cũ: BeautifulSoup(html.parser) + CSS selector cho từng trường"""
+    name = 'bs4'
+
+    def parse(self, content, encoding='utf-8'):
+        """Trả về danh sách dòng kết quả của một trang (bytes hoặc str)"""
+        return self.parse_page(content, encoding)[0]
+
+    def parse_stream(self, chunks, encoding='utf-8'):
+        """Phân tích trang từ các khúc bytes; html.parser của bs4 cần cả trang nên đọc hết trước"""
+        return BufferedStream(self, chunks, encoding)
+
+    def parse_page(self, content, encoding='utf-8'):
+        """Trả về (danh sách dòng, page_info) của một trang"""
+        from bs4 import BeautifulSoup
+
+        if isinstance(content, bytes):
+            with timer('decode'):
+                content = content.decode(encoding or 'utf-8', errors='replace')
+        with timer('parse'):
+            soup = BeautifulSoup(content, 'html.parser')
+        try:
+            return self._extract(soup)
+        finally:
+            # Cây bs4 có tham chiếu vòng (parent/children) nên chỉ được giải phóng khi GC chạy;
+            # hủy ngay để cây của mỗi trang không dồn lại trong lượt crawl dài
+            soup.decompose()
+
+    def _extract(self, soup):
+        with timer('extract'):
+            rows = []
+            for comp in soup.select(LISTING_SELECTOR):
+                name_tag = comp.select_one(NAME_SELECTOR)
+                name = clean_text(name_tag.get_text(strip=True)) if name_tag else ''
+                email, website = extract_contact_info(comp)
+                rows.append(make_row(name, extract_phones(comp), extract_addresses(comp),
+                                     email, website, extract_description(comp),
+                                     name_tag.get('href', '').strip() if name_tag else ''))
+            counter = soup.select_one(COUNTER_SELECTOR)
+            info = page_info([a.get_text() for a in soup.select(PAGING_SELECTOR)],
+                             counter.get_text() if counter else '')
+        return rows, info
+
+
+# --- Engine lxml ------------------------------------------------------------
+
+def _has_classes(*names):
+    return ' and '.join(f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')" for name in names)
+
+
+LISTINGS_XPATH = etree.XPath(
+    f"//div[{_has_classes('div_list_cty')}]"
+    f"/div[{_has_classes('w-100', 'h-auto', 'shadow', 'rounded-3', 'bg-white', 'p-2', 'mb-3')}]"
+)
+PAGING_XPATH = etree.XPath("//div[@id='paging']//a")
+COUNTER_XPATH = etree.XPath(f"(//span[{_has_classes('ketquatimkiem_counter')}])[1]")
+
+# Chuỗi trong các thẻ này không được BeautifulSoup.get_text() tính tới
+_SKIP_TEXT_TAGS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+
+# Trạng thái tổ tiên khi duyệt cây con của một đơn vị
+_IN_CENTER = 1      # trong div.listings_center / div.listings_center_khongxacthuc
+_IN_NAME_H2 = 2     # trong h2 nằm trong khối trên
+_IN_EMAIL_WEB = 4   # trong div.email_web_section
+_IN_TEXTQC = 8      # trong div.div_textqc
+
+# html.parser để nguyên '&#' khi mã ký tự không kết thúc đúng (vd '&#7920A'),
+# còn libxml2 vẫn giải mã; thoát trước các chỗ này để hai engine cho cùng text
+_TEXT_WITH_CHARREF_RE = re.compile(rb'(?<=>)[^<]*&#[^<]*<?')
+_LITERAL_CHARREF_RE = re.compile(rb'&#(?![0-9]+[^0-9a-fA-F]|[xX][0-9a-fA-F]+[^0-9a-fA-F])')
+
+_LISTING_CLASSES = frozenset(['w-100', 'h-auto', 'shadow', 'rounded-3', 'bg-white', 'p-2', 'mb-3'])
+_CENTER_CLASSES = frozenset(['listings_center', 'listings_center_khongxacthuc'])
+_ADDRESS_PARENT_CLASSES = frozenset(['logo_congty_diachi', 'listing_diachi_nologo'])
+
+
+def _escape_literal_charrefs(content):
+    if b'&#' not in content:
+        return content
+    return _TEXT_WITH_CHARREF_RE.sub(lambda m: _LITERAL_CHARREF_RE.sub(b'&amp;#', m.group()), content)
+
+
+def _strings(el):
+    """Các đoạn text trong cây con theo thứ tự tài liệu, giống BeautifulSoup"""
+    if el.text and el.tag not in _SKIP_TEXT_TAGS:
+        yield el.text
+    for child in el:
+        if isinstance(child.tag, str) and child.tag not in _SKIP_TEXT_TAGS:
+            yield from _strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def _get_text(el, separator=''):
+    """Tương đương Tag.get_text(separator, strip=True)"""
+    return separator.join(s for s in (text.strip() for text in _strings(el)) if s)
+
+
+def _classes(el):
+    value = el.get('class')
+    return value.split() if value else ()
+
+
+def _extract_listing(comp):
+    """Trích xuất mọi trường của một đơn vị trong một lần duyệt cây con"""
+    name = email = website = description = detail_url = None
+    phones = []
+    addresses = []
+    state = [0]
+    for event, el in etree.iterwalk(comp, events=('start', 'end')):
+        if event == 'end':
+            state.pop()
+            continue
+        tag = el.tag
+        if not isinstance(tag, str):
+            # Comment / processing instruction không có cây con
+            state.append(state[-1])
+            continue
+        outer = state[-1]
+        inner = outer
+        if tag == 'div':
+            classes = _classes(el)
+            if _CENTER_CLASSES.intersection(classes):
+                inner |= _IN_CENTER
+            if 'email_web_section' in classes:
+                inner |= _IN_EMAIL_WEB
+            if 'div_textqc' in classes:
+                inner |= _IN_TEXTQC
+        elif tag == 'h2' and outer & _IN_CENTER:
+            inner |= _IN_NAME_H2
+        state.append(inner)
+        if el is comp:
+            continue
+
+        if tag == 'a':
+            href = el.get('href')
+            if name is None and outer & _IN_NAME_H2:
+                name = clean_text(_get_text(el))
+                detail_url = (href or '').strip()
+            if href is None:
+                continue
+            if href.startswith('tel:'):
+                phone_text = _get_text(el)
+                if is_phone(phone_text):
+                    phones.append(phone_text)
+            if outer & _IN_EMAIL_WEB:
+                if email is None and href.startswith('mailto:'):
+                    email = href.replace('mailto:', '').strip()
+                if website is None and href.startswith('http'):
+                    website = href.strip()
+        elif tag == 'div':
+            parent = el.getparent()
+            if parent.tag == 'div' and _ADDRESS_PARENT_CLASSES.intersection(_classes(parent)):
+                txt = _get_text(el)
+                if is_address(txt):
+                    addresses.append(clean_text(txt))
+        elif tag == 'small' and description is None and outer & _IN_TEXTQC and 'text_qc' in _classes(el):
+            description = clean_text(_get_text(el, ' '))
+
+    return make_row(name or '', list(dict.fromkeys(phones)), addresses,
+                    email or '', website or '', description or '', detail_url or '')
+
+
+class LxmlStream:
+    """Phân tích một trang từ các khúc bytes (vd response đang tải) bằng parser đẩy của lxml.
+
+    Dòng của mỗi đơn vị được sinh ngay khi thẻ của đơn vị đóng, sau đó cây con
+    của nó (và các đơn vị trước) bị xóa khỏi cây nên bộ nhớ không tăng theo số
+    đơn vị. Kết quả giống LxmlParser.parse_page; duyệt xong thì `info` là page_info.
+    """
+
+    def __init__(self, chunks, encoding='utf-8'):
+        self.chunks = chunks
+        self.encoding = encoding or 'utf-8'
+        self.info = None
+        self._paging = []
+        self._counter = None
+
+    def __iter__(self):
+        # Chỉ cần sự kiện đóng thẻ của div (đơn vị, phân trang) và span (dòng đếm kết quả)
+        parser = etree.HTMLPullParser(events=('end',), tag=('div', 'span'), encoding=self.encoding)
+        pending = b''
+        for chunk in self.chunks:
+            data = pending + chunk
+            # Chỉ đưa vào parser tới hết dấu '<' cuối cùng: mỗi đoạn text khi đó nằm trọn
+            # trong một lần _escape_literal_charrefs, giống như khi thoát cả trang
+            cut = data.rfind(b'<') + 1
+            pending = data[cut:]
+            if cut:
+                yield from self._feed(parser, data[:cut])
+        yield from self._feed(parser, pending)
+        try:
+            with timer('parse'):
+                parser.close()
+        except etree.XMLSyntaxError:
+            # Trang rỗng: không có phần tử nào (parse_page trả về trang không có đơn vị)
+            pass
+        yield from self._read_events(parser)
+        self.info = page_info(self._paging, self._counter or '')
+
+    def _feed(self, parser, data):
+        if data:
+            with timer('parse'):
+                parser.feed(_escape_literal_charrefs(data))
+        return self._read_events(parser)
+
+    def _read_events(self, parser):
+        for _, el in parser.read_events():
+            classes = _classes(el)
+            if el.tag == 'span':
+                if self._counter is None and 'ketquatimkiem_counter' in classes:
+                    self._counter = _get_text(el)
+                continue
+            if el.get('id') == 'paging' and not any(div.get('id') == 'paging' for div in el.iterancestors('div')):
+                self._paging.extend(_get_text(a) for a in el.iter('a'))
+                continue
+            parent = el.getparent()
+            if (not _LISTING_CLASSES.issubset(classes) or parent is None or parent.tag != 'div'
+                    or 'div_list_cty' not in _classes(parent)):
+                continue
+            with timer('extract'):
+                row = _extract_listing(el)
+            # Cây con đã trích xong: bỏ nó và các phần tử trước nó trong danh sách
+            el.clear()
+            while el.getprevious() is not None:
+                del parent[0]
+            yield row
+
+
+class LxmlParser:
+    """Engine lxml: phân tích bytes trực tiếp, không qua resp.text"""
+    name = 'lxml'
+
+    def parse(self, content, encoding='utf-8'):
+        """Trả về danh sách dòng kết quả của một trang (bytes hoặc str)"""
+        return self.parse_page(content, encoding)[0]
+
+    def parse_stream(self, chunks, encoding='utf-8'):
+        """LxmlStream trên các khúc bytes `chunks` của một trang"""
+        return LxmlStream(chunks, encoding)
+
+    def parse_page(self, content, encoding='utf-8'):
+        """Trả về (danh sách dòng, page_info) của một trang"""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+            encoding = 'utf-8'
+        with timer('parse'):
+            parser = lxml_html.HTMLParser(encoding=encoding or 'utf-8')
+            root = etree.fromstring(_escape_literal_charrefs(content), parser)
+        if root is None:
+            return [], page_info([], '')
+        with timer('extract'):
+            rows = [_extract_listing(comp) for comp in LISTINGS_XPATH(root)]
+            counter = COUNTER_XPATH(root)
+            info = page_info([_get_text(a) for a in PAGING_XPATH(root)],
+                             _get_text(counter[0]) if counter else '')
+        return rows, info
+
+
+PARSERS = {
+    BeautifulSoupParser.name: BeautifulSoupParser,
+    LxmlParser.name: LxmlParser,
+}
+DEFAULT_PARSER = LxmlParser.name
+
+
+def get_parser(name=None):
+    """Lấy engine phân tích theo tên ('lxml' hoặc 'bs4')"""
+    try:
+        return PARSERS[name or DEFAULT_PARSER]()
+    except KeyError:
+        raise ValueError(f"Không có engine phân tích '{name}', chọn một trong: {', '.join(PARSERS)}")
+
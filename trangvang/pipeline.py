@@ -0,0 +1,86 @@
+"""Phân tích trang trên nhiều process, chạy song song với các thread tải trang.
+
+Thread tải trang đưa bytes của trang vào một ProcessPoolExecutor; mỗi process
+tự giải mã, dựng cây và trích xuất rồi trả về các dòng dạng tuple theo ROW_FIELDS
+(nhỏ hơn dict khi gửi qua pipe), kèm thời gian từng bước để process cha ghi vào
+metrics. Số trang đang chờ phân tích có giới hạn, nên
+khi process không kịp thì vòng tải cũng dừng lại chờ (backpressure) thay vì
+giữ hết trang trong bộ nhớ.
+"""
+import threading
+from collections import deque
+
+from . import settings
+from .metrics import ERRORS, LISTINGS, PAGES, capture_stages, record_stages
+from .parsers import ROW_FIELDS, get_parser
+
+# Engine đã tạo trong từng process con
+_worker_parsers = {}
+
+
+def _parse_worker(parser_name, content, encoding):
+    """Chạy trong process con: trả về (các dòng dạng tuple, page_info, thời gian từng bước)"""
+    parser = _worker_parsers.get(parser_name)
+    if parser is None:
+        parser = _worker_parsers[parser_name] = get_parser(parser_name)
+    with capture_stages() as stages:
+        rows, info = parser.parse_page(content, encoding)
+    return [tuple(row[field] for field in ROW_FIELDS) for row in rows], info, stages
+
+
+def parse_in_pool(pages, parser_name, pool, max_pending):
+    """Như crawler.parse_pages nhưng phân tích trong `pool`; giữ đúng thứ tự trang.
+
+    Tối đa `max_pending` trang được gửi đi mà chưa lấy kết quả.
+    """
+    pending = deque()
+
+    def drain():
+        item, url, future = pending.popleft()
+        try:
+            tuples, info, stages = future.result()
+        except Exception as e:
+            ERRORS.inc(stage='parse')
+            print(f"Lỗi khi crawl {url}: {e}")
+            return None
+        record_stages(stages)
+        rows = [dict(zip(ROW_FIELDS, values)) for values in tuples]
+        PAGES.inc()
+        LISTINGS.inc(len(rows))
+        return item, rows, info
+
+    try:
+        for item, url, resp in pages:
+            pending.append((item, url, pool.submit(_parse_worker, parser_name, resp.content, resp.encoding)))
+            while len(pending) >= max_pending:
+                result = drain()
+                if result is not None:
+                    yield result
+        while pending:
+            result = drain()
+            if result is not None:
+                yield result
+    finally:
+        # Người gọi dừng sớm: bỏ các trang chưa phân tích
+        for item, url, future in pending:
+            future.cancel()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers=None):
+    """ProcessPoolExecutor dùng chung cho cả process (tạo ở lần gọi đầu tiên).
+
+    Dùng 'spawn' vì process cha có nhiều thread tải trang, fork lúc đó không an toàn.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            _pool = ProcessPoolExecutor(max_workers=workers or settings.PARSE_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
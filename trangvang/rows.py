@@ -0,0 +1,133 @@
+"""Lưu kết quả của các lượt crawl dài mà bộ nhớ không tăng theo số trang.
+
+Mỗi dòng được giữ dưới dạng CompactRow: một tuple theo ROW_FIELDS thay vì dict
+có khóa là tên cột, nhưng vẫn đọc được như dict (row.get('Email'), dict(row)),
+nên các bước xuất file, gộp trùng, chuẩn hóa dùng được ngay. RowBuffer gom các
+dòng đó và khi vượt TRANGVANG_SPILL_ROWS dòng thì ghi phần cũ ra file tạm, chỉ
+giữ phần mới nhất trong bộ nhớ.
+"""
+import pickle
+import sys
+import tempfile
+
+from . import settings
+from .metrics import PEAK_RSS
+from .parsers import ROW_FIELDS
+
+_FIELD_INDEX = {field: index for index, field in enumerate(ROW_FIELDS)}
+
+
+class CompactRow(tuple):
+    """Một dòng kết quả dạng tuple theo ROW_FIELDS, đọc được như dict (chỉ đọc)"""
+    __slots__ = ()
+
+    @classmethod
+    def from_row(cls, row):
+        # str() tách chuỗi con của bs4 (NavigableString) khỏi cây của trang
+        return tuple.__new__(cls, [str(row.get(field) or '') for field in ROW_FIELDS])
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, _FIELD_INDEX[key])
+        return tuple.__getitem__(self, key)
+
+    def __contains__(self, key):
+        return key in _FIELD_INDEX
+
+    def get(self, key, default=None):
+        index = _FIELD_INDEX.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self):
+        return list(ROW_FIELDS)
+
+    def values(self):
+        return list(self)
+
+    def items(self):
+        return list(zip(ROW_FIELDS, self))
+
+    def to_dict(self):
+        return dict(zip(ROW_FIELDS, self))
+
+
+class RowBuffer:
+    """Danh sách CompactRow chỉ thêm vào; quá `spill_after` dòng thì phần cũ được ghi ra file tạm.
+
+    Duyệt lại được nhiều lần (lần lượt, không song song), theo đúng thứ tự đã
+    thêm. `spill_after` = 0 thì giữ mọi dòng trong bộ nhớ.
+    """
+
+    def __init__(self, spill_after=None):
+        self.spill_after = settings.SPILL_ROWS if spill_after is None else spill_after
+        self.spilled = 0
+        self._rows = []
+        self._file = None
+
+    def append(self, row):
+        self._rows.append(row if isinstance(row, CompactRow) else CompactRow.from_row(row))
+        if self.spill_after and len(self._rows) >= self.spill_after:
+            self._spill()
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def _spill(self):
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=settings.SPILL_DIR)
+        self._file.seek(0, 2)
+        # Ghi tuple thường, đọc lại mới bọc thành CompactRow
+        pickle.dump([tuple(row) for row in self._rows], self._file, pickle.HIGHEST_PROTOCOL)
+        self.spilled += len(self._rows)
+        self._rows = []
+
+    def __len__(self):
+        return self.spilled + len(self._rows)
+
+    def __iter__(self):
+        if self._file is not None:
+            self._file.seek(0)
+            end = self.spilled
+            read = 0
+            # Đọc từng khối đã ghi, không nạp lại cả file
+            while read < end:
+                block = pickle.load(self._file)
+                read += len(block)
+                for values in block:
+                    yield tuple.__new__(CompactRow, values)
+        yield from self._rows
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._rows = []
+        self.spilled = 0
+
+
+def peak_rss_kb():
+    """RSS đỉnh của process (KB), hoặc None nếu hệ điều hành không hỗ trợ (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss tính bằng KB trên Linux, byte trên macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def update_peak_rss():
+    """Ghi RSS đỉnh hiện tại vào /metrics, trả về giá trị đó (KB) hoặc None"""
+    peak = peak_rss_kb()
+    if peak is not None:
+        PEAK_RSS.set(peak * 1024)
+    return peak
+
+
+def report_memory(rows):
+    """In (và ghi vào /metrics) RSS đỉnh sau một lượt crawl"""
+    peak = update_peak_rss()
+    spilled = getattr(rows, 'spilled', 0)
+    if peak is not None:
+        print(f"Bộ nhớ: RSS đỉnh {peak / 1024:.1f} MB, {len(rows)} dòng ({spilled} dòng ghi tạm ra đĩa)")
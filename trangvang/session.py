@@ -0,0 +1,159 @@
+"""Lớp HTTP dùng chung: session có pool kết nối, nén gzip/br và retry có backoff."""
+import random
+import threading
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+
+from .fetcher import LIMITER
+from .metrics import HTTP_RESPONSES
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+}
+
+# Các status đáng để thử lại: bị giới hạn tốc độ hoặc lỗi tạm thời phía server
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(Exception):
+    """Request bị bỏ vì không còn kịp trước hạn của lượt crawl (HttpClient.get với expires_at)"""
+
+
+def parse_retry_after(value):
+    """Đổi header Retry-After (số giây hoặc ngày giờ HTTP) thành số giây phải chờ"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    """Session requests dùng chung giữa các thread, tái sử dụng kết nối tới từng host.
+
+    Thử lại 429/5xx và lỗi kết nối (bị reset, connect timeout) với backoff lũy thừa
+    có jitter, tôn trọng Retry-After. Đếm số lần retry và số kết nối được tái sử dụng.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=5, read_timeout=30,
+                 max_retries=3, backoff=0.5, max_backoff=30, limiter=LIMITER):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = limiter
+        # requests (kéo theo urllib3, chardet) chỉ được import khi cần gửi request,
+        # để các route không crawl như /health khởi động nhanh
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.request import ACCEPT_ENCODING
+
+        self._retry_errors = (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError)
+        self._timeout_errors = (requests.exceptions.Timeout,)
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        # urllib3 chỉ thêm br khi có thư viện Brotli để giải nén
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._lock = threading.Lock()
+        self._pools = weakref.WeakSet()
+        self._counters = {'requests': 0, 'retries': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _delay(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    def _remaining(self, url, timeout, expires_at):
+        """Timeout (connect, read) không vượt quá thời gian còn lại tới `expires_at`"""
+        if expires_at is None:
+            return timeout
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f'Hết thời gian trước khi tải {url}')
+        return tuple(min(value, remaining) for value in timeout)
+
+    def get(self, url, timeout=None, retries=None, expires_at=None, **kwargs):
+        """GET có retry; trả về response cuối cùng (kể cả khi vẫn là 429/5xx).
+
+        Có `expires_at` (theo time.monotonic()) thì timeout của mỗi lần gửi không vượt
+        quá thời gian còn lại, và thay vì chờ để thử lại quá hạn thì ném DeadlineExceeded.
+        """
+        timeout = timeout or self.timeout
+        if not isinstance(timeout, tuple):
+            timeout = (timeout, timeout)
+        retries = self.max_retries if retries is None else retries
+        attempt = 0
+        while True:
+            self._count('requests')
+            try:
+                with self.limiter.limit(url):
+                    # Thời gian chờ giới hạn tải cũng tính vào hạn
+                    request_timeout = self._remaining(url, timeout, expires_at)
+                    start = time.monotonic()
+                    resp = self.session.get(url, timeout=request_timeout, **kwargs)
+            except self._retry_errors as e:
+                self.limiter.record(url, error=e)
+                self._count('errors')
+                if attempt >= retries:
+                    raise
+                delay = self._delay(attempt)
+            except self._timeout_errors as e:
+                # Read timeout không thử lại ở đây; crawler đưa trang lại hàng đợi
+                self.limiter.record(url, error=e)
+                self._count('errors')
+                raise
+            else:
+                self.limiter.record(url, status=resp.status_code, latency=time.monotonic() - start)
+                HTTP_RESPONSES.inc(status=resp.status_code)
+                pool = getattr(resp.raw, '_pool', None)
+                if pool is not None:
+                    with self._lock:
+                        self._pools.add(pool)
+                if resp.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return resp
+                # Response bị bỏ để thử lại; với stream=True body chưa đọc nên phải đóng
+                resp.close()
+                delay = self._delay(attempt, parse_retry_after(resp.headers.get('Retry-After')))
+            if expires_at is not None and time.monotonic() + delay >= expires_at:
+                raise DeadlineExceeded(f'Không kịp thử lại {url} trước hạn (phải chờ {delay:.1f} giây)')
+            self._count('retries')
+            attempt += 1
+            time.sleep(delay)
+
+    def stats(self):
+        """Số liệu cộng dồn: request, retry, lỗi, kết nối mở mới và kết nối tái sử dụng"""
+        with self._lock:
+            stats = dict(self._counters)
+            pools = list(self._pools)
+        opened = sum(pool.num_connections for pool in pools)
+        sent = sum(pool.num_requests for pool in pools)
+        stats['connections_opened'] = opened
+        stats['connections_reused'] = max(sent - opened, 0)
+        return stats
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """HttpClient dùng chung cho cả process (tạo ở lần gọi đầu tiên)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
@@ -0,0 +1,64 @@
+"""Cấu hình dùng chung, đọc từ biến môi trường."""
+import os
+
+# Trang nguồn; đổi sang máy chủ giả lập (python -m trangvang.standin) để thử tải
+BASE_URL = os.environ.get('TRANGVANG_BASE_URL', 'https://trangvangvietnam.com').rstrip('/') + '/'
+
+# Thư mục lưu dữ liệu cục bộ (cache, ...)
+DATA_DIR = os.environ.get('TRANGVANG_DATA_DIR', os.path.join(os.getcwd(), '.trangvang'))
+
+# Cache response trên đĩa: TRANGVANG_CACHE=0 để tắt
+CACHE_ENABLED = os.environ.get('TRANGVANG_CACHE', '1') != '0'
+CACHE_DIR = os.environ.get('TRANGVANG_CACHE_DIR', os.path.join(DATA_DIR, 'cache'))
+CACHE_TTL = int(os.environ.get('TRANGVANG_CACHE_TTL', 6 * 3600))
+CACHE_MAX_BYTES = int(os.environ.get('TRANGVANG_CACHE_MAX_MB', 200)) * 1024 * 1024
+
+# Cache file kết quả của /crawl trong bộ nhớ (theo truy vấn, khoảng trang, định dạng):
+# TRANGVANG_RESULT_CACHE=0 để tắt
+RESULT_CACHE_ENABLED = os.environ.get('TRANGVANG_RESULT_CACHE', '1') != '0'
+RESULT_CACHE_TTL = int(os.environ.get('TRANGVANG_RESULT_CACHE_TTL', 600))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('TRANGVANG_RESULT_CACHE_MAX_MB', 64)) * 1024 * 1024
+# Request giống hệt chờ lần render đang chạy tối đa bao nhiêu giây, quá thì tự render
+RESULT_CACHE_WAIT = float(os.environ.get('TRANGVANG_RESULT_CACHE_WAIT', 120))
+
+# Lưu lại trang thô để debug, chỉ bật khi đặt TRANGVANG_CAPTURE_DIR
+CAPTURE_DIR = os.environ.get('TRANGVANG_CAPTURE_DIR')
+CAPTURE_MAX_PAGES = int(os.environ.get('TRANGVANG_CAPTURE_MAX_PAGES', 20))
+
+# Crawl chạy nền: số worker dùng chung cho mọi người dùng và nơi lưu kết quả
+JOBS_DIR = os.environ.get('TRANGVANG_JOBS_DIR', os.path.join(DATA_DIR, 'jobs'))
+JOB_WORKERS = int(os.environ.get('TRANGVANG_JOB_WORKERS', 2))
+
+# Kho công ty SQLite: TRANGVANG_STORE=0 để tắt
+STORE_ENABLED = os.environ.get('TRANGVANG_STORE', '1') != '0'
+STORE_PATH = os.environ.get('TRANGVANG_STORE_PATH', os.path.join(DATA_DIR, 'companies.sqlite3'))
+
+# Checkpoint từng trang để crawl dài chạy tiếp từ trang còn thiếu: TRANGVANG_CHECKPOINTS=0 để tắt
+CHECKPOINTS_ENABLED = os.environ.get('TRANGVANG_CHECKPOINTS', '1') != '0'
+CHECKPOINT_PATH = os.environ.get('TRANGVANG_CHECKPOINT_PATH', os.path.join(DATA_DIR, 'checkpoints.sqlite3'))
+# Mặc định bằng CACHE_TTL để checkpoint của lượt crawl bị ngắt không sống lâu hơn cache trang
+CHECKPOINT_TTL = int(os.environ.get('TRANGVANG_CHECKPOINT_TTL', CACHE_TTL))
+
+# Chế độ giới hạn thời gian (serverless): thời gian tối đa (giây) của một lượt crawl
+# trong api/index.py, và thời gian chừa lại cho bước xuất file
+CRAWL_DEADLINE = float(os.environ.get('TRANGVANG_DEADLINE', 8))
+EXPORT_RESERVE = float(os.environ.get('TRANGVANG_EXPORT_RESERVE', 1.5))
+
+# Tự điều chỉnh tốc độ/số request đồng thời theo phản hồi của server (AIMD):
+# TRANGVANG_ADAPTIVE=0 để giữ giới hạn cố định
+ADAPTIVE_LIMITS = os.environ.get('TRANGVANG_ADAPTIVE', '1') != '0'
+
+# Kết quả crawl() giữ trong bộ nhớ tối đa bao nhiêu dòng (dạng tuple gọn),
+# quá mức đó thì ghi ra file tạm trong TRANGVANG_SPILL_DIR; 0 = không ghi ra đĩa
+SPILL_ROWS = int(os.environ.get('TRANGVANG_SPILL_ROWS', 5000))
+SPILL_DIR = os.environ.get('TRANGVANG_SPILL_DIR') or None
+
+# Số process phân tích trang song song với thread tải; 0 = phân tích ngay trong thread crawl
+PARSE_WORKERS = int(os.environ.get('TRANGVANG_PARSE_WORKERS', 0))
+
+# TRANGVANG_STREAM_PARSE=1: tải trang theo từng khúc và phân tích ngay trong lúc tải,
+# không giữ cả trang trong bộ nhớ (khi bật thì không dùng TRANGVANG_PARSE_WORKERS)
+STREAM_PARSE = os.environ.get('TRANGVANG_STREAM_PARSE', '0') == '1'
+
+# Số liệu Prometheus ở /metrics: TRANGVANG_METRICS=0 để tắt
+METRICS_ENABLED = os.environ.get('TRANGVANG_METRICS', '1') != '0'
@@ -0,0 +1,203 @@
+"""Máy chủ giả lập Trang Vàng để chạy thử crawler mà không gọi trang thật.
+
+Phục vụ các trang mẫu có sẵn trong repo theo đúng dạng URL của trang nguồn
+(`srch/<khu_vuc>/<nganh_hang>.html?page=N`), lần lượt xoay vòng theo số trang.
+Khối phân trang và dòng '(N kết quả được tìm thấy)' được viết lại theo số trang
+đã cấu hình; trang sau trang cuối là trang rỗng như trang thật. Độ trễ, tỷ lệ
+lỗi 5xx và tỷ lệ 429 (kèm Retry-After) chỉnh được; link tới trangvangvietnam.com
+trong trang được trỏ về máy chủ này nên không có request nào ra ngoài.
+
+    python -m trangvang.standin --port 8765 --pages 50 --latency 0.2 --throttle-rate 0.05
+    TRANGVANG_BASE_URL=http://127.0.0.1:8765/ python app.py
+
+GET /__stats trả về số request đã phục vụ theo status.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .bench import load_fixtures
+from .parsers import get_parser
+
+SOURCE_URL = b'https://trangvangvietnam.com/'
+SEARCH_PATH_RE = re.compile(r'^/srch/[^/]+/[^/]+\.html$')
+_PAGING_RE = re.compile(rb'(<div id="paging">).*?(</div>)', re.DOTALL)
+_COUNTER_RE = re.compile(rb'(<span class="ketquatimkiem_counter">)[^<]*(</span>)')
+
+EMPTY_PAGE = (b'<html><head><meta charset="utf-8"></head>'
+              b'<body><div class="div_list_cty"></div></body></html>')
+
+
+class StandinServer:
+    """Máy chủ giả lập chạy trên một thread nền (start) hoặc thread hiện tại (serve_forever)"""
+
+    def __init__(self, host='127.0.0.1', port=0, pages=27, latency=0.05, jitter=0.0,
+                 error_rate=0.0, throttle_rate=0.0, retry_after=1, seed=0):
+        self.pages = pages
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._statuses = {}
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self._httpd.server_port}/"
+        fixtures = list(load_fixtures().values())
+        parser = get_parser()
+        # Số đơn vị của mỗi trang mẫu, theo thứ tự xoay vòng
+        self._counts = [len(parser.parse(content)) for content in fixtures]
+        self._bodies = self._render(fixtures)
+        self._thread = None
+
+    def _render(self, fixtures):
+        links = ''.join(f'<a href="?page={page}">{page}</a>' for page in range(1, self.pages + 1))
+        counter = f'({self.expected_rows(1, self.pages)} kết quả được tìm thấy)'
+        bodies = []
+        for content in fixtures:
+            content = _PAGING_RE.sub(lambda m: m.group(1) + links.encode('utf-8') + m.group(2), content, count=1)
+            content = _COUNTER_RE.sub(lambda m: m.group(1) + counter.encode('utf-8') + m.group(2), content, count=1)
+            bodies.append(content.replace(SOURCE_URL, self.base_url.encode('ascii')))
+        return bodies
+
+    def page_body(self, page):
+        """Nội dung trang kết quả thứ `page`; trang ngoài khoảng 1..pages là trang rỗng"""
+        if 1 <= page <= self.pages:
+            return self._bodies[(page - 1) % len(self._bodies)]
+        return EMPTY_PAGE
+
+    def expected_rows(self, page_start, page_end):
+        """Số đơn vị trên các trang page_start..page_end (trang quá `pages` không có đơn vị)"""
+        return sum(self._counts[(page - 1) % len(self._counts)]
+                   for page in range(max(page_start, 1), min(page_end, self.pages) + 1))
+
+    def _fault(self):
+        """Status lỗi được chọn ngẫu nhiên cho request này, hoặc None"""
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 503
+        return None
+
+    def _count(self, status):
+        with self._lock:
+            self._statuses[status] = self._statuses.get(status, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': sum(self._statuses.values()),
+                'statuses': {str(status): count for status, count in sorted(self._statuses.items())},
+                'max_in_flight': self._max_in_flight,
+            }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path == '/__stats':
+                    self._send(200, json.dumps(server.stats()).encode('utf-8'), 'application/json')
+                    return
+                with server._lock:
+                    server._in_flight += 1
+                    server._max_in_flight = max(server._max_in_flight, server._in_flight)
+                try:
+                    time.sleep(server.latency + (server.jitter * server._rng.random() if server.jitter else 0))
+                    if not SEARCH_PATH_RE.match(url.path):
+                        self._send(404, b'Not found', 'text/plain')
+                        return
+                    status = server._fault()
+                    if status is not None:
+                        headers = {'Retry-After': str(server.retry_after)} if status == 429 else {}
+                        self._send(status, b'', 'text/plain', headers)
+                        return
+                    try:
+                        page = int(parse_qs(url.query).get('page', ['1'])[0])
+                    except ValueError:
+                        page = 1
+                    self._send(200, server.page_body(page), 'text/html; charset=utf-8')
+                finally:
+                    with server._lock:
+                        server._in_flight -= 1
+
+            def _send(self, status, body, content_type, headers=None):
+                server._count(status)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Chạy trên thread nền, trả về base URL (dùng cho TRANGVANG_BASE_URL)"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='standin', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def add_arguments(parser):
+    """Các tham số cấu hình máy chủ giả lập, dùng chung với trangvang.loadtest"""
+    parser.add_argument('--pages', type=int, default=27, help='số trang kết quả của mỗi truy vấn')
+    parser.add_argument('--latency', type=float, default=0.05, help='độ trễ mỗi response (giây)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='độ trễ ngẫu nhiên thêm tối đa (giây)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='tỷ lệ response 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='tỷ lệ response 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After (giây) của response 429')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def from_arguments(args, port=0):
+    return StandinServer(port=port, pages=args.pages, latency=args.latency, jitter=args.jitter,
+                         error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                         retry_after=args.retry_after, seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    server = from_arguments(args, args.port)
+    print(f"Máy chủ giả lập chạy ở {server.base_url} ({args.pages} trang mỗi truy vấn)")
+    print(f"Chạy app với TRANGVANG_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Báo cáo thời gian import lúc khởi động lạnh của các entry point.
+
+Mỗi entry point được import trong một process mới với `python -X importtime`,
+rồi gọi /health. Báo cáo liệt kê thời gian import (ms) của các module chậm nhất
+mà entry point kéo vào, cùng các module nặng đã bị import sau khi gọi /health;
+có module nặng thì thoát với mã 1.
+
+    python -m trangvang.startup                 # index, api.index
+    python -m trangvang.startup api.index --top 30
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ENTRY_POINTS = ('index', 'api.index')
+
+# Các module không được import khi chỉ gọi /health
+HEAVY_MODULES = ('pandas', 'bs4', 'chardet')
+
+_PROBE = '''
+import json, sys
+# __import__ (không phải importlib.import_module) để -X importtime ghi lại chính entry point
+__import__(sys.argv[1])
+module = sys.modules[sys.argv[1]]
+status = module.app.test_client().get('/health').status_code
+print(json.dumps({'status': status, 'loaded': [name for name in sys.argv[2:] if name in sys.modules]}))
+'''
+
+
+def parse_importtime(stderr):
+    """Đọc output của -X importtime, trả về [(module, cấp lồng, self_ms, cumulative_ms)] theo thứ tự"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        name = parts[2]
+        # Module được import gián tiếp thụt vào thêm hai khoảng trắng mỗi cấp
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), depth, int(parts[0]) / 1000, int(parts[1]) / 1000))
+    return modules
+
+
+def subtree(modules, root):
+    """Các module được import khi import `root` (kể cả chính nó)"""
+    for index, (name, depth, own, cumulative) in enumerate(modules):
+        if name == root:
+            break
+    else:
+        return []
+    start = index
+    while start > 0 and modules[start - 1][1] > depth:
+        start -= 1
+    return modules[start:index + 1]
+
+
+def measure(entry_point, cwd=None):
+    """Import entry point trong process mới; trả về (các module đã import, kết quả gọi /health)"""
+    cwd = cwd or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE, entry_point, *HEAVY_MODULES],
+        cwd=cwd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Không import được {entry_point}: {proc.stderr.strip().splitlines()[-1:]}")
+    probe = json.loads(proc.stdout.strip().splitlines()[-1])
+    return subtree(parse_importtime(proc.stderr), entry_point), probe
+
+
+def report(entry_point, top=15):
+    """In báo cáo của một entry point; trả về False nếu /health kéo theo module nặng"""
+    modules, probe = measure(entry_point)
+    total = modules[-1][3] if modules else 0.0
+    print(f"== {entry_point}: {total:.1f} ms import, /health -> {probe['status']}")
+    print(f"  {'cumulative':>10}  {'self':>8}  module")
+    for name, depth, own, cumulative in sorted(modules, key=lambda item: -item[3])[:top]:
+        print(f"  {cumulative:7.1f} ms  {own:5.1f} ms  {name}")
+    if probe['loaded']:
+        print(f"  Module nặng đã bị import: {', '.join(probe['loaded'])}")
+    return not probe['loaded']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('entry_points', nargs='*', default=list(ENTRY_POINTS))
+    parser.add_argument('--top', type=int, default=15, help='số module hiển thị cho mỗi entry point')
+    args = parser.parse_args(argv)
+    ok = True
+    for entry_point in args.entry_points:
+        ok = report(entry_point, args.top) and ok
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""Kho lưu công ty trên SQLite: gộp trùng theo khóa chuẩn hóa và crawl lại tăng dần.
+
+Mỗi công ty được nhận diện bằng số điện thoại, email, website hoặc tên đã chuẩn
+hóa (bảng company_keys có index theo từng loại khóa). Crawl lại sẽ cập nhật
+dòng có sẵn và cho biết dòng nào mới, thay đổi hay giữ nguyên. Một công ty có
+thể hiện ở nhiều trang/truy vấn với nội dung thẻ hơi khác nhau, nên mọi nội dung
+đã gặp (company_hashes) đều được nhớ: gặp lại nội dung cũ là 'unchanged'.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from . import settings
+from .crawler import query_key
+from .normalize import normalize_email, normalize_name, normalize_website, split_phones
+from .parsers import COLUMNS
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS companies (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS company_keys (
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    company_id INTEGER NOT NULL,
+    PRIMARY KEY (kind, value)
+);
+CREATE INDEX IF NOT EXISTS idx_company_keys_company ON company_keys (company_id);
+CREATE TABLE IF NOT EXISTS company_hashes (
+    company_id INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (company_id, content_hash)
+);
+CREATE TABLE IF NOT EXISTS company_queries (
+    query TEXT NOT NULL,
+    company_id INTEGER NOT NULL,
+    PRIMARY KEY (query, company_id)
+);
+'''
+
+def row_keys(row):
+    """Các khóa chuẩn hóa của một dòng kết quả, theo thứ tự ưu tiên khi so khớp:
+    điện thoại, email, website rồi mới tới tên"""
+    keys = [('phone', phone) for phone in split_phones(row.get('Số điện thoại'))]
+    for kind, value in (('email', normalize_email(row.get('Email'))),
+                        ('website', normalize_website(row.get('Website'))),
+                        ('name', normalize_name(row.get('Tên Khách Hàng')))):
+        if value:
+            keys.append((kind, value))
+    return keys
+
+
+def content_hash(row):
+    # Chỉ các cột của trang kết quả: link chi tiết hay cột lấy thêm không làm dòng 'changed'
+    data = '\x1f'.join(str(row.get(column, '')) for column in sorted(COLUMNS))
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+class CompanyStore:
+    """Kho công ty dùng chung giữa các thread (một kết nối, có khóa)"""
+
+    def __init__(self, path=settings.STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _find(self, keys):
+        for kind, value in keys:
+            found = self._conn.execute(
+                'SELECT company_id FROM company_keys WHERE kind = ? AND value = ?', (kind, value)).fetchone()
+            if found:
+                return found[0]
+        return None
+
+    def upsert_many(self, rows, query=None):
+        """Ghi một trang kết quả; trả về trạng thái từng dòng: 'new', 'changed' hoặc 'unchanged'"""
+        statuses = []
+        now = time.time()
+        with self._lock, self._conn:
+            for row in rows:
+                keys = row_keys(row)
+                digest = content_hash(row)
+                company_id = self._find(keys)
+                if company_id is None:
+                    company_id = self._conn.execute(
+                        'INSERT INTO companies (data, content_hash, first_seen, last_seen, updated_at) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        (json.dumps(row, ensure_ascii=False), digest, now, now, now)).lastrowid
+                    status = 'new'
+                else:
+                    old_digest = self._conn.execute(
+                        'SELECT content_hash FROM companies WHERE id = ?', (company_id,)).fetchone()[0]
+                    seen = old_digest == digest or self._conn.execute(
+                        'SELECT 1 FROM company_hashes WHERE company_id = ? AND content_hash = ?',
+                        (company_id, digest)).fetchone() is not None
+                    if seen:
+                        # Nội dung đã gặp (có thể ở trang/truy vấn khác): giữ nguyên dòng đã lưu
+                        self._conn.execute('UPDATE companies SET last_seen = ? WHERE id = ?', (now, company_id))
+                        status = 'unchanged'
+                    else:
+                        self._conn.execute(
+                            'UPDATE companies SET data = ?, content_hash = ?, last_seen = ?, updated_at = ? '
+                            'WHERE id = ?',
+                            (json.dumps(row, ensure_ascii=False), digest, now, now, company_id))
+                        status = 'changed'
+                    if old_digest != digest:
+                        # Kho tạo trước khi có company_hashes: nhớ cả nội dung đang lưu
+                        self._conn.execute(
+                            'INSERT OR IGNORE INTO company_hashes (company_id, content_hash) VALUES (?, ?)',
+                            (company_id, old_digest))
+                self._conn.execute(
+                    'INSERT OR IGNORE INTO company_hashes (company_id, content_hash) VALUES (?, ?)',
+                    (company_id, digest))
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO company_keys (kind, value, company_id) VALUES (?, ?, ?)',
+                    [(kind, value, company_id) for kind, value in keys])
+                if query:
+                    self._conn.execute(
+                        'INSERT OR IGNORE INTO company_queries (query, company_id) VALUES (?, ?)',
+                        (query, company_id))
+                statuses.append(status)
+        return statuses
+
+    def iter_rows(self, nganh_hang=None, khu_vuc=None):
+        """Các dòng đã lưu (của một truy vấn nếu có), không cần truy cập mạng"""
+        with self._lock:
+            if nganh_hang and khu_vuc:
+                cursor = self._conn.execute(
+                    'SELECT c.data FROM companies c JOIN company_queries q ON q.company_id = c.id '
+                    'WHERE q.query = ? ORDER BY c.id', (query_key(nganh_hang, khu_vuc),))
+            else:
+                cursor = self._conn.execute('SELECT data FROM companies ORDER BY id')
+            datas = [data for data, in cursor]
+        for data in datas:
+            row = json.loads(data)
+            yield {column: row.get(column, '') for column in COLUMNS}
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM companies').fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """CompanyStore dùng chung theo cấu hình, hoặc None nếu đã tắt hay không mở được"""
+    global _store
+    if not settings.STORE_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = CompanyStore()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Không mở được kho dữ liệu {settings.STORE_PATH}: {e}")
+                return None
+        return _store